@@ -0,0 +1,261 @@
+"""End-to-end benchmark of the plan generation and live render path against the mock LLM.
+
+Spends no real tokens: a local mock_llm_server replays a plan with the configured TTFT and
+token rate. Reports end-to-end latency, TTFT, render calls/bytes/time and peak memory for a
+single session and for concurrent sessions, and saves the results as JSON so runs can be
+compared between versions.
+
+    python -m benchmarks.bench_generation --sessions 1 8 --runs 3
+    python -m benchmarks.bench_generation --compare benchmarks/results/<older>.json
+"""
+import argparse
+import glob
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+FAKE_API_KEY = "sk-mock-" + "x" * 156  # Passes the length check in generate_workout_plan
+
+BENCH_PROFILE = {
+    'name': 'Bench User', 'age': 32, 'sex': 'Male', 'height': 70, 'weight': 180, 'unit': 'Imperial',
+    'goal': 'Build muscle', 'level': 'Intermediate', 'days': 4, 'environment': 'Gym', 'diet': 'Omnivore',
+    'issues': '', 'activity': 'Moderately active', 'style': ['Bodybuilder (hypertrophy)'], 'dislikes': '',
+    'medical': '', 'add_cardio': 'No', 'add_abs': 'Yes'
+}
+
+
+class RecordingPlaceholder:
+    """Stands in for st.empty()/st.container(): counts render calls, bytes and time spent rendering."""
+
+    def __init__(self, counters=None):
+        self.counters = counters if counters is not None else {'calls': 0, 'bytes': 0, 'seconds': 0.0}
+
+    def _record(self, text):
+        started = time.perf_counter()
+        # Streamlit serializes every element update to a protobuf delta; JSON is a fair proxy
+        json.dumps({'markdown': text})
+        self.counters['calls'] += 1
+        self.counters['bytes'] += len(text.encode("utf-8"))
+        self.counters['seconds'] += time.perf_counter() - started
+
+    def markdown(self, text, **kwargs):
+        self._record(text)
+
+    def info(self, text, **kwargs):
+        self._record(text)
+
+    def empty(self):
+        return RecordingPlaceholder(self.counters)
+
+    def container(self, **kwargs):
+        return RecordingPlaceholder(self.counters)
+
+
+def run_session(generate_workout_plan, StreamStats, session_index, run_index, parallel, render):
+    user_data = dict(BENCH_PROFILE, name=f"Bench User {run_index}-{session_index}")  # Unique - never a cache hit
+    placeholder = RecordingPlaceholder() if render else None
+    stats = StreamStats()
+    started = time.perf_counter()
+    plan = generate_workout_plan(user_data, FAKE_API_KEY, placeholder, stats=stats, parallel=parallel)
+    result = {
+        'latency_s': time.perf_counter() - started,
+        'ttft_s': stats.ttft,
+        'tokens_per_s': stats.tokens_per_second,
+        'plan_chars': len(plan),
+        'ok': not plan.startswith("❌") and not plan.startswith("Error")
+    }
+    if placeholder:
+        result.update({
+            'render_calls': placeholder.counters['calls'],
+            'render_bytes': placeholder.counters['bytes'],
+            'render_s': placeholder.counters['seconds']
+        })
+    return result
+
+
+def summarize_list(values):
+    return {'mean': round(statistics.mean(values), 4), 'max': round(max(values), 4)}
+
+
+def run_scenario(sessions, runs, parallel, render):
+    from plan_cache import get_plan_cache
+    from plan_generator import generate_workout_plan
+    from streaming import StreamStats
+
+    results = []
+    peak_bytes = 0
+    wall_times = []
+    for run_index in range(runs):
+        get_plan_cache().clear()
+        tracemalloc.start()
+        run_results = [None] * sessions
+
+        def worker(i):
+            run_results[i] = run_session(generate_workout_plan, StreamStats, i, run_index, parallel, render)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_times.append(time.perf_counter() - started)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        results.extend(run_results)
+
+    def summarize(key):
+        values = sorted(r[key] for r in results if key in r)
+        if not values:
+            return None
+        return {
+            'mean': round(statistics.mean(values), 4),
+            'p50': round(values[len(values) // 2], 4),
+            'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+            'max': round(values[-1], 4)
+        }
+
+    summary = {
+        'sessions': sessions,
+        'runs': runs,
+        'parallel': parallel,
+        'render': render,
+        'errors': sum(1 for r in results if not r['ok']),
+        'wall_s': summarize_list(wall_times),
+        'plans_per_minute': round(sessions * runs / sum(wall_times) * 60, 1),
+        'peak_memory_mb': round(peak_bytes / 1024 / 1024, 2)
+    }
+    for key in ('latency_s', 'ttft_s', 'tokens_per_s', 'render_calls', 'render_bytes', 'render_s'):
+        value = summarize(key)
+        if value is not None:
+            summary[key] = value
+    return summary
+
+
+def start_mock_server(args):
+    """Launch mock_llm_server.py in a subprocess and wait until it accepts connections."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command = [sys.executable, os.path.join(REPO_ROOT, "mock_llm_server.py"),
+               "--port", str(port), "--ttft", str(args.ttft), "--tokens-per-second", str(args.tokens_per_second),
+               "--error-rate", str(args.error_rate), "--seed", "1"]
+    if args.plans_dir:
+        command += ["--plans-dir", args.plans_dir]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server, f"http://127.0.0.1:{port}/v1"
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("Mock LLM server did not start")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=REPO_ROOT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, inner, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(current, baseline):
+    """Print metric deltas between this run and a saved baseline."""
+    print(f"\nComparison against {baseline['revision']} ({baseline['timestamp']}):")
+    baseline_scenarios = {s['name']: s for s in baseline['scenarios']}
+    for scenario in current['scenarios']:
+        old = baseline_scenarios.get(scenario['name'])
+        if not old:
+            continue
+        print(f"  {scenario['name']}:")
+        new_metrics = flatten("", scenario, {})
+        old_metrics = flatten("", old, {})
+        for key, new_value in new_metrics.items():
+            old_value = old_metrics.get(key)
+            if old_value in (None, 0) or key in ('sessions', 'runs'):
+                continue
+            change = (new_value - old_value) / old_value * 100
+            print(f"    {key:<28} {old_value:>12} -> {new_value:<12} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plan generation against the mock LLM")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8], help="Concurrent session counts to run")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions per scenario")
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--plans-dir", help="Recorded plans for the mock to replay")
+    parser.add_argument("--parallel", action="store_true", help="Also benchmark parallel section generation")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", help="Baseline results file, or 'latest' for the most recent saved run")
+    args = parser.parse_args()
+
+    # Run the mock in its own process so it doesn't compete with the app code for the GIL
+    server, base_url = start_mock_server(args)
+    os.environ["OPENAI_BASE_URL"] = base_url  # Read by the OpenAI client when the pool builds it
+    os.environ.setdefault("OPENAI_WARMUP_CONNECTIONS", "0")
+
+    modes = [False, True] if args.parallel else [False]
+    scenarios = []
+    for parallel in modes:
+        for sessions in args.sessions:
+            for render in (False, True):
+                name = f"{'parallel' if parallel else 'single'}-{sessions}x-{'render' if render else 'headless'}"
+                print(f"Running {name}...", flush=True)
+                summary = run_scenario(sessions, args.runs, parallel, render)
+                summary['name'] = name
+                scenarios.append(summary)
+                print(json.dumps(summary, indent=2))
+    server.terminate()
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'revision': git_revision(),
+        'mock': {'ttft': args.ttft, 'tokens_per_second': args.tokens_per_second, 'error_rate': args.error_rate},
+        'scenarios': scenarios
+    }
+
+    baseline_path = args.compare
+    if baseline_path == "latest":
+        saved = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+        baseline_path = saved[-1] if saved else None
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{results['revision']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark the vectorized batch nutrition engine against the scalar calculation.
+
+Generates random intake profiles, checks that calculate_macros_batch matches
+calculate_target_calories_and_macros value for value, and reports the speedup.
+
+    python -m benchmarks.bench_nutrition --profiles 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from nutrition import (  # noqa: E402
+    calculate_target_calories_and_macros, calculate_macros_batch, MACRO_FIELDS,
+    ACTIVITY_MULTIPLIERS, GOAL_ADJUSTMENTS
+)
+
+DIETS = ["Omnivore", "Vegetarian", "Vegan", "Keto", "None"]
+
+
+def random_profiles(count, seed):
+    rng = random.Random(seed)
+    profiles = []
+    for _ in range(count):
+        unit = rng.choice(["Imperial", "Metric"])
+        profiles.append({
+            'weight': rng.randint(50, 500) if unit == "Imperial" else rng.randint(30, 200),
+            'height': rng.randint(36, 107) if unit == "Imperial" else rng.randint(120, 250),
+            'age': rng.randint(13, 80),
+            'sex': rng.choice(["Male", "Female", "Other"]),
+            'unit': unit,
+            'activity': rng.choice(list(ACTIVITY_MULTIPLIERS)),
+            'days': rng.randint(2, 7),
+            'goal': rng.choice(list(GOAL_ADJUSTMENTS)),
+            'diet': rng.choice(DIETS)
+        })
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalar vs batch nutrition calculation")
+    parser.add_argument("--profiles", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    profiles = random_profiles(args.profiles, args.seed)
+    fields = list(profiles[0])
+    columns = {field: [p[field] for p in profiles] for field in fields}
+    arrays = {field: np.asarray(values) for field, values in columns.items()}
+
+    started = time.perf_counter()
+    scalar = [calculate_target_calories_and_macros(p) for p in profiles]
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from_lists = calculate_macros_batch(**columns)
+    lists_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from_arrays = calculate_macros_batch(**arrays)
+    arrays_s = time.perf_counter() - started
+
+    mismatches = 0
+    for field in MACRO_FIELDS:
+        expected = np.array([row[field] for row in scalar], dtype=np.int64)
+        mismatches += int((from_lists[field] != expected).sum() + (from_arrays[field] != expected).sum())
+
+    print(f"Profiles:            {args.profiles:,}")
+    print(f"Scalar:              {scalar_s:.3f}s")
+    print(f"Batch (list input):  {lists_s:.3f}s  ({scalar_s / lists_s:.1f}x)")
+    print(f"Batch (array input): {arrays_s:.3f}s  ({scalar_s / arrays_s:.1f}x)")
+    print(f"Mismatches:          {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
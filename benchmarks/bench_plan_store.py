@@ -0,0 +1,93 @@
+"""Benchmark plan blob storage: compression ratio, dedup savings and decode time.
+
+Builds plan variants from the mock server's synthetic plan (personalised workout and
+nutrition sections, shared boilerplate sections, like real plans) and stores them as
+plain zlib, zlib with the built-in dictionary, and through PlanStore (section dedup plus
+a dictionary trained on the first plans).
+
+    python -m benchmarks.bench_plan_store --plans 200
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm_server import synthetic_plan  # noqa: E402
+from plan_store import PlanStore, encode_blob, decode_blob, BUILTIN_DICTIONARY_ID  # noqa: E402
+
+EXERCISES = ["Goblet Squat", "Incline Dumbbell Press", "Cable Row", "Arnold Press", "Hip Thrust", "Dead Bug",
+             "Bulgarian Split Squat", "Push-ups", "Lat Pulldown", "Face Pull", "Leg Press", "Hanging Knee Raise"]
+FOODS = ["turkey mince", "quinoa", "spinach", "tofu", "salmon", "sweet potato", "lentils", "cottage cheese"]
+
+
+def plan_variant(base: str, rng: random.Random) -> str:
+    """Personalise the workout and nutrition sections; leave the boilerplate sections shared."""
+    head, _, tail = base.partition("\n## 3.")
+    head = re.sub(r"\| (Back Squat|Bench Press|Barbell Row|Overhead Press|Romanian Deadlift|Plank) \| 3 x 8-10 \| 90",
+                  lambda m: f"| {rng.choice(EXERCISES)} | {rng.randint(2, 5)} x {rng.randint(5, 15)} | {rng.choice([60, 90, 120])}",
+                  head)
+    head = re.sub(r"150g chicken breast, 200g rice, 100g broccoli \(~520 kcal, 45g protein, 60g carbs, 9g fat\)",
+                  lambda m: (f"{rng.randint(100, 250)}g {rng.choice(FOODS)}, {rng.randint(50, 250)}g {rng.choice(FOODS)} "
+                             f"(~{rng.randint(250, 800)} kcal, {rng.randint(15, 60)}g protein, "
+                             f"{rng.randint(10, 90)}g carbs, {rng.randint(5, 30)}g fat)"),
+                  head)
+    head = head.replace("# Welcome to your FitKit plan!", f"# Welcome to your FitKit plan, user {rng.randint(1, 10 ** 6)}!")
+    return head + "\n## 3." + tail
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan blob storage: ratio, dedup and decode time")
+    parser.add_argument("--plans", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base = synthetic_plan()
+    plans = [plan_variant(base, rng) for _ in range(args.plans)]
+    raw_bytes = sum(len(plan.encode("utf-8")) for plan in plans)
+
+    zlib_bytes = sum(len(zlib.compress(plan.encode("utf-8"), 9)) for plan in plans)
+    dict_blobs = [encode_blob(plan, "zlib", BUILTIN_DICTIONARY_ID) for plan in plans]
+    dict_bytes = sum(len(blob) for blob in dict_blobs)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Train the dictionary where the store's background trainer would, but outside the timed puts
+        store = PlanStore(os.path.join(directory, "plans.db"), train_after=0, sweep_interval=0)
+        train_at = min(50, max(1, args.plans // 4))
+        started = time.perf_counter()
+        plan_ids = [store.put(plan) for plan in plans[:train_at]]
+        put_s = time.perf_counter() - started
+        store.train_dictionary()
+        started = time.perf_counter()
+        plan_ids += [store.put(plan) for plan in plans[train_at:]]
+        put_s += time.perf_counter() - started
+
+        started = time.perf_counter()
+        for plan_id, plan in zip(plan_ids, plans):
+            assert store.get(plan_id) == plan, "plan store round-trip mismatch"
+        get_s = time.perf_counter() - started
+        stats = store.stats()
+
+    started = time.perf_counter()
+    for blob in dict_blobs:
+        decode_blob(blob)
+    blob_decode_s = time.perf_counter() - started
+
+    print(f"{args.plans} plans, {raw_bytes / 1024:.0f} KB raw ({raw_bytes / len(plans) / 1024:.1f} KB each)")
+    print(f"  zlib (no dictionary):     {zlib_bytes / 1024:8.0f} KB  ratio {raw_bytes / zlib_bytes:5.1f}x")
+    print(f"  zlib + built-in dict:     {dict_bytes / 1024:8.0f} KB  ratio {raw_bytes / dict_bytes:5.1f}x  "
+          f"decode {blob_decode_s / len(plans) * 1000:.3f} ms/plan")
+    print(f"  PlanStore ({stats['codec']}, dedup): {stats['stored_bytes'] / 1024:8.0f} KB  ratio {stats['overall_ratio']:5.1f}x  "
+          f"decode {get_s / len(plans) * 1000:.3f} ms/plan, store {put_s / len(plans) * 1000:.3f} ms/plan")
+    print(f"  sections: {stats['sections_written']} stored, {stats['sections_deduplicated']} deduplicated; "
+          f"dictionary id {stats['dictionary_id']}")
+
+
+if __name__ == "__main__":
+    main()
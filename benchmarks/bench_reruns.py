@@ -0,0 +1,91 @@
+"""Server CPU per interaction: full script reruns vs fragment reruns.
+
+Drives streamlit_app.py headlessly with Streamlit's AppTest against the mock LLM: fills
+in and submits the intake form, opens and submits the review popup, switches units. The
+app's run timer (run_timing.py) records thread CPU for every full script run and for each
+fragment body. In the browser each of these interactions reruns only its fragment, so the
+fragment's CPU is what an interaction costs now; the full-run CPU is what every interaction
+cost when the whole script re-executed. (AppTest itself always reruns the whole script, so
+both are measured in the same runs.)
+
+    python -m benchmarks.bench_reruns --rounds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from mock_llm_server import MockLLMConfig, start_in_background  # noqa: E402
+
+FAKE_API_KEY = "sk-mock-" + "x" * 156  # Passes the length check in generate_workout_plan
+
+# Which fragment reruns in the browser for each interaction
+INTERACTIONS = [
+    ("Change units", 'intake_form'),
+    ("Open review popup", 'plan_viewer'),
+    ("Submit review", 'review_popup')
+]
+
+
+def run_round(app_test_class) -> None:
+    at = app_test_class.from_file(os.path.join(REPO_ROOT, "streamlit_app.py"), default_timeout=60)
+    at.secrets["OPENAI_API_KEY"] = FAKE_API_KEY
+    at.run()
+    at.radio[0].set_value("Metric").run()
+    at.text_input[0].input("Bench User")
+    ages, heights, weights = at.number_input[0], at.number_input[1], at.number_input[2]
+    ages.set_value(32)
+    heights.set_value(178)
+    weights.set_value(80)
+    at.checkbox[0].check()
+    at.button[0].click().run()  # Generate, then one full rerun to show the plan
+    at.button(key="review_button").click().run()
+    at.text_area[-1].input("Benchmark review")
+    next(button for button in at.button if "Submit" in button.label).click().run()
+    at.radio[0].set_value("Imperial").run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server CPU per interaction: full script vs fragment reruns")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    server, base_url = start_in_background(MockLLMConfig(ttft=0.05, tokens_per_second=20000))
+    data_dir = tempfile.mkdtemp(prefix="fitkit-bench-")
+    os.environ.update({
+        'OPENAI_BASE_URL': base_url,
+        'FITKIT_SESSION_DB': os.path.join(data_dir, "sessions.db"),
+        'FITKIT_PLAN_STORE_DB': os.path.join(data_dir, "plans.db"),
+        'FITKIT_EMAIL_OUTBOX_DB': os.path.join(data_dir, "outbox.db"),
+        'FITKIT_REVIEW_LOG_DIR': os.path.join(data_dir, "reviews"),
+        'FITKIT_EMAIL_SENDER': "local",
+        'FITKIT_EMAIL_LOCAL_PATH': os.path.join(data_dir, "sent.jsonl")
+    })
+    from streamlit.testing.v1 import AppTest
+    from run_timing import get_run_timer
+
+    run_round(AppTest)  # Warm-up: imports, caches and the first plan generation
+    timer = get_run_timer()
+    timer.reset()
+    for _ in range(args.rounds):
+        run_round(AppTest)
+    server.shutdown()
+
+    stats = timer.stats()
+    full = stats['app']
+    print(f"{args.rounds} rounds; full script run: CPU p50 {full['cpu_ms_p50']:.1f} ms, "
+          f"p95 {full['cpu_ms_p95']:.1f} ms over {full['runs']} runs")
+    print(f"  {'interaction':20s} {'fragment':14s} {'CPU p50':>9s} {'vs full run':>12s}")
+    for interaction, scope in INTERACTIONS:
+        fragment = stats.get(scope)
+        if not fragment:
+            continue
+        saved = 1 - fragment['cpu_ms_p50'] / full['cpu_ms_p50'] if full['cpu_ms_p50'] else 0.0
+        print(f"  {interaction:20s} {scope:14s} {fragment['cpu_ms_p50']:7.1f} ms {saved:11.0%} less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Check that every prompt kind shares its static prefix byte for byte across users.
+
+Builds the full-plan, per-section, skeleton and personalization prompts for two very
+different intakes and compares them up to where the per-user part starts (the USER
+PROFILE or TEMPLATE PLAN block). Everything before that point must be identical for the
+provider's prompt cache to reuse it, and must not contain either user's details. The
+check works on the built prompts only, not on the prefix constants they are made from.
+
+    python -m benchmarks.check_prompt_prefix
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_buckets import profile_bucket, portion_factor  # noqa: E402
+from prompts import (SYSTEM_PROMPT, create_workout_prompt, create_section_prompts, create_skeleton_prompt,  # noqa: E402
+                     create_personalization_prompt)
+
+# Where the per-user part of a prompt begins
+USER_BLOCK_PATTERN = re.compile(r"^\s*(USER PROFILE|TEMPLATE PLAN)\b[^\n]*:$", re.MULTILINE)
+PERSONAL_FIELDS = ('name', 'issues', 'dislikes', 'medical')
+
+SAMPLE_PROFILES = [
+    {'name': 'Alex Example', 'age': 29, 'sex': 'Female', 'height': 165, 'weight': 61, 'unit': 'Metric',
+     'goal': 'Lose fat', 'level': 'Beginner', 'days': 3, 'environment': 'Home', 'diet': 'Vegan',
+     'issues': 'Left knee pain', 'activity': 'Sedentary', 'style': [], 'dislikes': 'Mushrooms',
+     'medical': 'Asthma inhaler', 'add_cardio': 'Yes', 'add_abs': 'No'},
+    {'name': 'Sam Sample', 'age': 51, 'sex': 'Male', 'height': 72, 'weight': 210, 'unit': 'Imperial',
+     'goal': 'Build muscle', 'level': 'Advanced', 'days': 6, 'environment': 'Gym', 'diet': 'Keto',
+     'issues': '', 'activity': 'Very active', 'style': ['Powerlifter (strength)', 'Endurance / hybrid'],
+     'dislikes': 'Liver', 'medical': '', 'add_cardio': 'No', 'add_abs': 'Yes'}
+]
+
+
+def build_prompts(user_data):
+    """Every prompt kind for one intake, by name."""
+    bucket = profile_bucket(user_data)
+    prompts = {
+        'full': create_workout_prompt(user_data),
+        'skeleton': create_skeleton_prompt(bucket),
+        'personalization': create_personalization_prompt(user_data, bucket, portion_factor(user_data, bucket))
+    }
+    prompts.update({f"section:{key}": prompt for key, _, _, prompt in create_section_prompts(user_data)})
+    return prompts
+
+
+def static_part(prompt: str) -> str:
+    """The prompt up to the start of its per-user block."""
+    match = USER_BLOCK_PATTERN.search(prompt)
+    return prompt[:match.start()] if match else prompt
+
+
+def check(profiles):
+    """Compare every prompt kind across the profiles; returns (problems, static chars per kind)."""
+    built = [build_prompts(user_data) for user_data in profiles]
+    problems, sizes = [], {}
+    for kind, first in built[0].items():
+        static = static_part(first)
+        sizes[kind] = len(static)
+        if static == first:
+            problems.append(f"{kind}: no USER PROFILE or TEMPLATE PLAN block found")
+            continue
+        for user_data, prompts in zip(profiles[1:], built[1:]):
+            other = static_part(prompts[kind])
+            if other != static:
+                differs_at = next((i for i, (a, b) in enumerate(zip(static, other)) if a != b),
+                                  min(len(static), len(other)))
+                problems.append(f"{kind}: static part differs for {user_data['name']!r} at char {differs_at} "
+                                f"({static[differs_at:differs_at + 40]!r} vs {other[differs_at:differs_at + 40]!r})")
+        for user_data in profiles:
+            for field in PERSONAL_FIELDS:
+                value = str(user_data.get(field) or "")
+                if len(value) > 3 and value in static:
+                    problems.append(f"{kind}: {field} {value!r} appears before the per-user block")
+    return problems, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check prompts share a byte-identical static prefix across users")
+    parser.parse_args()
+
+    problems, sizes = check(SAMPLE_PROFILES)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print(f"OK: {len(sizes)} prompt kinds share their static part across {len(SAMPLE_PROFILES)} intakes")
+        for kind, chars in sizes.items():
+            chars += len(SYSTEM_PROMPT)
+            print(f"  {kind:22s} {chars:6d} chars (~{chars // 4} tokens) incl. the system message")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Generate plans for a whole group of members from an intake file, without the Streamlit UI.
+
+Reads intake profiles from JSONL (one user_data dict per line) or CSV (one column per
+user_data field, style separated by ';') and generates a plan for each with a bounded pool
+of async workers. Every request goes through the app's admission scheduler (OpenAI RPM/TPM
+limits), and --per-minute caps how fast this job starts new plans on top of that.
+
+Results are appended to the output JSONL as each plan finishes, one line per profile. The
+output doubles as the checkpoint: on restart, profiles that already have an 'ok' line are
+skipped, so a crashed or interrupted run resumes where it stopped (failed profiles are
+retried). A profile's ID is its 'id' field if present, otherwise its line/row number.
+
+    OPENAI_API_KEY=... python bulk_generate.py members.csv plans.jsonl --workers 4 --per-minute 30
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from plan_generator import generate_workout_plan, ERROR_PREFIXES
+from plan_schema import parse_plan
+from rate_limiter import TokenBucket
+from streaming import StreamStats
+
+# Every field the intake form collects - profiles missing one are reported, not generated
+INTAKE_FIELDS = ('name', 'age', 'sex', 'height', 'weight', 'unit', 'goal', 'level', 'days', 'environment', 'diet',
+                 'issues', 'activity', 'style', 'dislikes', 'medical', 'add_cardio', 'add_abs')
+OPTIONAL_FIELDS = ('issues', 'dislikes', 'medical', 'style')
+NUMERIC_FIELDS = {'age': int, 'days': int, 'height': float, 'weight': float}
+NUMERIC_RANGES = {'age': (13, 80), 'days': (2, 7)}
+# Choices the intake form offers (streamlit_app.intake_form) - matched case-insensitively
+CHOICE_FIELDS = {
+    'sex': ("Male", "Female", "Other"),
+    'unit': ("Imperial", "Metric"),
+    'goal': ("Lose fat", "Build muscle", "Re-comp", "General health"),
+    'level': ("Beginner", "Intermediate", "Advanced"),
+    'activity': ("Sedentary", "Lightly active", "Moderately active", "Very active"),
+    'environment': ("Gym", "Home", "Both"),
+    'diet': ("Omnivore", "Vegetarian", "Vegan", "Keto", "None"),
+    'add_cardio': ("No", "Yes"),
+    'add_abs': ("No", "Yes")
+}
+STYLE_CHOICES = ("Bodybuilder (hypertrophy)", "Powerlifter (strength)", "CrossFit / functional fitness",
+                 "Science-based / periodized", "Calisthenics / street workout", "Endurance / hybrid", "Other")
+
+
+def _choice(value: Any, choices: Tuple[str, ...]) -> Optional[str]:
+    """The form's spelling of value if it is one of choices (ignoring case and spaces), else None."""
+    wanted = str(value).strip().casefold()
+    return next((choice for choice in choices if choice.casefold() == wanted), None)
+
+
+def parse_profile(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn one input record into user_data, coercing CSV strings.
+
+    Numbers may be written as floats ("30.0"); single-choice fields must be one of the intake
+    form's options.
+    Raises ValueError listing every missing or invalid field.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"not an intake object: {str(record)[:80]!r}")
+    problems = [f"missing {field}" for field in INTAKE_FIELDS
+                if field not in OPTIONAL_FIELDS and record.get(field) in (None, "")]
+    if problems:
+        raise ValueError(", ".join(problems))
+    user_data = {}
+    for field in INTAKE_FIELDS:
+        value = record.get(field)
+        if field in NUMERIC_FIELDS:
+            try:
+                number = float(str(value).strip())
+            except ValueError:
+                number = float("nan")
+            if not math.isfinite(number):  # "inf" and "nan" parse, but aren't measurements
+                problems.append(f"{field} {value!r} is not a number")
+                continue
+            value = int(number) if NUMERIC_FIELDS[field] is int else number
+            low, high = NUMERIC_RANGES.get(field, (0, float("inf")))
+            if value <= 0 or not low <= value <= high:
+                problems.append(f"{field} {value} is out of range")
+        elif field in CHOICE_FIELDS:
+            choice = _choice(value, CHOICE_FIELDS[field])
+            if choice is None:
+                problems.append(f"{field} {value!r} is not one of {', '.join(CHOICE_FIELDS[field])}")
+            value = choice
+        elif field == 'style':
+            if isinstance(value, str):
+                value = value.split(";")
+            # Free text is allowed (the prompt takes any style); the form's choices get its spelling
+            value = [_choice(style, STYLE_CHOICES) or str(style).strip() for style in value or [] if str(style).strip()]
+        elif value is None:
+            value = ""
+        user_data[field] = value
+    if problems:
+        raise ValueError(", ".join(problems))
+    return user_data
+
+
+def read_profiles(path: str) -> List[Tuple[str, Any]]:
+    """Return (profile_id, record) for every record in a JSONL or CSV intake file.
+
+    A JSONL line that isn't valid JSON is kept as its raw text, so parse_profile reports it
+    as a failed profile instead of the whole run stopping.
+    """
+    records = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                records.append((str(row.get('id') or number), row))
+        else:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = line.strip()
+                profile_id = record.get('id') if isinstance(record, dict) else None
+                records.append((str(profile_id or number), record))
+    return records
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """IDs with an 'ok' result in an existing output file (a torn last line is ignored)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get('status') == 'ok':
+                done.add(str(result['id']))
+    return done
+
+
+def _open_output(output_path: str):
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # A crash mid-write can leave a line without its newline - start on a fresh line
+    torn = False
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+    output = open(output_path, "a", encoding="utf-8")
+    if torn:
+        output.write("\n")
+    return output
+
+
+async def run_batch(profiles: List[Tuple[str, Dict[str, Any]]], output_path: str, api_key: str, workers: int,
+                    per_minute: Optional[float] = None, structured: bool = False, on_result=None) -> Dict[str, Any]:
+    """Generate plans for profiles with a pool of async workers, appending results to output_path.
+
+    Each plan is generated in a worker thread (generate_workout_plan is blocking); results
+    are written and flushed from the event loop one line at a time. on_result(result, summary)
+    is called after each line is written.
+    """
+    queue = asyncio.Queue()
+    for item in profiles:
+        queue.put_nowait(item)
+    bucket = TokenBucket(per_minute, capacity=1) if per_minute else None
+    pace_lock = asyncio.Lock()
+    summary = {'ok': 0, 'failed': 0, 'completion_tokens': 0, 'started_at': time.perf_counter()}
+
+    async def wait_for_slot():
+        if bucket is None:
+            return
+        async with pace_lock:
+            wait = bucket.wait_time(1, time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            bucket.take(1, time.monotonic())
+
+    with _open_output(output_path) as output:
+        async def worker():
+            while True:
+                try:
+                    profile_id, record = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = {'id': profile_id, 'generated_at': datetime.now().isoformat()}
+                try:
+                    user_data = parse_profile(record)
+                    result['user_data'] = user_data
+                    await wait_for_slot()
+                    stats = StreamStats()
+                    plan = await asyncio.to_thread(generate_workout_plan, user_data, api_key, None, stats)
+                    if not plan or plan.lstrip().startswith(ERROR_PREFIXES):
+                        raise RuntimeError(plan.strip() if plan else "empty plan")
+                    result.update(status='ok', plan=plan, stats=stats.as_dict())
+                    if structured:
+                        result['structured_plan'] = parse_plan(plan).as_dict()
+                    summary['ok'] += 1
+                    summary['completion_tokens'] += stats.completion_tokens or 0
+                except Exception as e:
+                    result.update(status='failed', error=str(e))
+                    summary['failed'] += 1
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                os.fsync(output.fileno())  # Each finished plan survives a crash of the run
+                if on_result:
+                    on_result(result, summary)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+
+    summary['elapsed_seconds'] = round(time.perf_counter() - summary.pop('started_at'), 2)
+    minutes = summary['elapsed_seconds'] / 60
+    summary['plans_per_minute'] = round(summary['ok'] / minutes, 2) if minutes else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate plans for every profile in a JSONL/CSV intake file")
+    parser.add_argument("input", help="Intake profiles (.jsonl or .csv) in the shape of user_data")
+    parser.add_argument("output", help="Output JSONL; also the checkpoint a rerun resumes from")
+    parser.add_argument("--workers", type=int, default=4, help="Plans generated at the same time")
+    parser.add_argument("--per-minute", type=float, help="Start at most this many plans per minute")
+    parser.add_argument("--structured", action="store_true", help="Also write the parsed days, exercises and meals")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("OPENAI_API_KEY is not set")
+
+    profiles = read_profiles(args.input)
+    done = completed_ids(args.output)
+    pending = [(profile_id, record) for profile_id, record in profiles if profile_id not in done]
+    print(f"{len(profiles)} profiles, {len(profiles) - len(pending)} already done, {len(pending)} to generate")
+    if not pending:
+        return
+
+    started = time.perf_counter()
+
+    def report(result, summary):
+        finished = summary['ok'] + summary['failed']
+        rate = summary['ok'] / ((time.perf_counter() - started) / 60)
+        outcome = "ok" if result['status'] == 'ok' else f"FAILED: {result['error'][:120]}"
+        print(f"[{finished}/{len(pending)}] {result['id']}: {outcome} ({rate:.1f} plans/min)")
+
+    summary = asyncio.run(run_batch(pending, args.output, api_key, args.workers, args.per_minute,
+                                    args.structured, report))
+    print(f"Done in {summary['elapsed_seconds']:.1f}s: {summary['ok']} plans, {summary['failed']} failed, "
+          f"{summary['plans_per_minute']:.1f} plans/minute, {summary['completion_tokens']} completion tokens"
+          + (" - run again to retry the failures" if summary['failed'] else ""))
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
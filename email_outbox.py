@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from rate_limiter import TokenBucket
+
+# Email outbox settings - override with environment variables
+OUTBOX_DB_PATH = os.getenv("FITKIT_EMAIL_OUTBOX_DB", os.path.join(".fitkit", "outbox.db"))
+BATCH_SIZE = int(os.getenv("FITKIT_EMAIL_BATCH_SIZE", "50"))
+POLL_INTERVAL_SECONDS = float(os.getenv("FITKIT_EMAIL_POLL_INTERVAL", "2"))
+MAX_ATTEMPTS = int(os.getenv("FITKIT_EMAIL_MAX_ATTEMPTS", "5"))
+REQUESTS_PER_MINUTE = int(os.getenv("FITKIT_EMAIL_REQUESTS_PER_MINUTE", "10"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("FITKIT_EMAIL_TIMEOUT", "15"))
+EMAIL_SENDER = os.getenv("FITKIT_EMAIL_SENDER", "mailersend")  # 'mailersend' or 'local'
+LOCAL_SENT_PATH = os.getenv("FITKIT_EMAIL_LOCAL_PATH", os.path.join(".fitkit", "sent_emails.jsonl"))
+
+MAILERSEND_BULK_URL = "https://api.mailersend.com/v1/bulk-email"
+ERROR_BACKOFF_MAX_SECONDS = 60.0  # Longest pause after repeated dispatcher errors
+# A claimed batch is taken over by another dispatcher only after this long - well past any send
+# (requests applies the timeout to the connect and to each read separately)
+CLAIM_LEASE_SECONDS = max(60.0, SEND_TIMEOUT_SECONDS * 4)
+
+logger = logging.getLogger(__name__)
+
+
+class SendError(Exception):
+    """A batch could not be sent; retry_after (seconds) is set when the server asked us to wait."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+class MailerSendBulkSender:
+    """Sends a batch of messages with one call to MailerSend's bulk-email endpoint."""
+
+    def __init__(self, api_key: str, url: str = MAILERSEND_BULK_URL, timeout: float = SEND_TIMEOUT_SECONDS):
+        self.url = url
+        self.timeout = timeout
+        import requests  # Only needed once a real sender is configured
+
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json', 'Authorization': f"Bearer {api_key}"})
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Send messages (MailerSend email objects); returns the bulk request ID."""
+        import requests
+
+        try:
+            response = self.session.post(self.url, json=messages, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise SendError(f"MailerSend request failed: {e}")
+        if response.status_code == 202:
+            return response.json().get('bulk_email_id')
+        retry_after = None
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get('retry-after', ''))
+            except ValueError:
+                pass
+        # 4xx other than 429 means the messages themselves were rejected - retrying won't help
+        permanent = 400 <= response.status_code < 500 and response.status_code != 429
+        raise SendError(f"MailerSend returned {response.status_code}: {response.text[:200]}", retry_after, permanent)
+
+
+class LocalSender:
+    """Stand-in sender for development and tests: records messages instead of emailing them.
+
+    Sent messages are kept in .sent and, if path is given, appended to it as JSON lines.
+    Set fail_next to make the next N batches fail (to exercise retries).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.sent = []
+        self.batches = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise SendError("Injected failure (local sender)")
+            self.batches += 1
+            self.sent.extend(messages)
+            if self.path:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for message in messages:
+                        f.write(json.dumps(message, ensure_ascii=False) + "\n")
+            return f"local-{self.batches}"
+
+
+class EmailOutbox:
+    """Durable email outbox: messages are stored in SQLite and sent by a background dispatcher.
+
+    enqueue() only inserts a row, so callers never wait on the email provider. The
+    dispatcher claims due messages in batches of up to batch_size, sends each batch with
+    one sender call (paced by a requests-per-minute token bucket) and retries failures
+    with jittered exponential backoff up to max_attempts. A claim is a lease: messages
+    left 'sending' by a crash are claimed again once lease_seconds have passed, by this
+    or any other process, so delivery is at-least-once.
+    """
+
+    def __init__(self, path: str = OUTBOX_DB_PATH, sender=None, batch_size: int = BATCH_SIZE,
+                 poll_interval: float = POLL_INTERVAL_SECONDS, max_attempts: int = MAX_ATTEMPTS,
+                 requests_per_minute: int = REQUESTS_PER_MINUTE, lease_seconds: float = CLAIM_LEASE_SECONDS):
+        self.path = path
+        self.sender = sender  # sender.send_batch(messages) -> batch id; raises SendError
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._bucket = TokenBucket(requests_per_minute, capacity=1)
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._dispatcher = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()  # Guards _errors (written by the dispatcher, read by stats())
+        self._errors = {'dispatch_errors': 0, 'last_dispatch_error': None}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " created_at REAL NOT NULL,"
+                " message TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending',"  # pending, sending, sent, failed
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " sent_at REAL,"
+                " batch_id TEXT,"
+                " last_error TEXT,"
+                " claimed_at REAL)"  # When the batch went 'sending'
+            )
+            if 'claimed_at' not in [column[1] for column in conn.execute("PRAGMA table_info(outbox)")]:
+                conn.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")  # Rows from before the lease
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def set_sender(self, sender) -> None:
+        """Set the sender and make sure the dispatcher is running."""
+        self.sender = sender
+        self.start()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="email-outbox", daemon=True)
+                self._dispatcher.start()
+        self._wakeup.set()
+
+    def enqueue(self, message: Dict[str, Any]) -> int:
+        """Store a fully rendered message for delivery; returns its outbox ID."""
+        now = time.time()
+        with self._connection() as conn:
+            message_id = conn.execute(
+                "INSERT INTO outbox (created_at, message, next_attempt_at) VALUES (?, ?, ?)",
+                (now, json.dumps(message, ensure_ascii=False), now)
+            ).lastrowid
+        self._wakeup.set()
+        return message_id
+
+    def status(self, message_id: int) -> Optional[str]:
+        row = self._connection().execute("SELECT status FROM outbox WHERE id = ?", (message_id,)).fetchone()
+        return row[0] if row else None
+
+    def _dispatch_loop(self) -> None:
+        failures = 0
+        while True:
+            if failures:
+                # Back off after errors; new messages don't cut the pause short
+                time.sleep(min(ERROR_BACKOFF_MAX_SECONDS, self.poll_interval * 2 ** failures))
+            else:
+                self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                while self.sender and self.dispatch_once():
+                    pass
+                failures = 0
+            except Exception as e:
+                # Database busy, a bad row, a sender bug... - the thread must survive all of them
+                failures += 1
+                with self._lock:
+                    self._errors['dispatch_errors'] += 1
+                    self._errors['last_dispatch_error'] = f"{type(e).__name__}: {e}"
+                logger.exception("Email outbox dispatch failed (%d in a row)", failures)
+
+    def dispatch_once(self) -> int:
+        """Claim and send one batch of due messages; returns how many were claimed."""
+        # Pace sends through the token bucket (one token per bulk request)
+        now = time.monotonic()
+        wait = self._bucket.wait_time(1, now)
+        if wait > 0:
+            time.sleep(wait)
+        conn = self._connection()
+        claimed_at = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")  # Another dispatcher can't claim the same rows between the read and the update
+            # Due messages, plus batches whose dispatcher died mid-send (its lease ran out)
+            rows = conn.execute(
+                "SELECT id, message, attempts FROM outbox"
+                " WHERE (status = 'pending' AND next_attempt_at <= ?)"
+                " OR (status = 'sending' AND (claimed_at IS NULL OR claimed_at <= ?))"
+                " ORDER BY id LIMIT ?", (claimed_at, claimed_at - self.lease_seconds, self.batch_size)
+            ).fetchall()
+            if not rows:
+                return 0
+            conn.executemany("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                             [(claimed_at, row[0]) for row in rows])
+        self._bucket.take(1, time.monotonic())
+
+        try:
+            batch_id = self.sender.send_batch([json.loads(row[1]) for row in rows])
+        except Exception as e:
+            self._reschedule(rows, e)
+            return len(rows)
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ?, batch_id = ? WHERE id = ?",
+                [(time.time(), batch_id, row[0]) for row in rows]
+            )
+        return len(rows)
+
+    def _reschedule(self, rows, error: Exception) -> None:
+        retry_after = getattr(error, 'retry_after', None)
+        permanent = getattr(error, 'permanent', False)
+        updates = []
+        for message_id, _, attempts in rows:
+            attempts += 1
+            if permanent or attempts >= self.max_attempts:
+                updates.append(('failed', attempts, time.time(), str(error), message_id))
+            else:
+                delay = retry_after if retry_after is not None else min(300.0, 2 ** attempts) * (0.5 + random.random() / 2)
+                updates.append(('pending', attempts, time.time() + delay, str(error), message_id))
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?", updates
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Message counts by status, the age of the oldest pending message and dispatcher errors."""
+        conn = self._connection()
+        stats = {status: count for status, count in
+                 conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()}
+        oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+        stats['oldest_pending_seconds'] = round(time.time() - oldest, 1) if oldest else 0.0
+        with self._lock:
+            stats.update(self._errors)
+        return stats
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_email_outbox() -> EmailOutbox:
+    """Return the process-wide email outbox, creating it on first use.
+
+    With FITKIT_EMAIL_SENDER=local the outbox delivers to a LocalSender straight away;
+    otherwise the app sets a MailerSendBulkSender once it has the API key.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox()
+            if EMAIL_SENDER == "local":
+                _outbox.set_sender(LocalSender(LOCAL_SENT_PATH))
+        return _outbox
@@ -0,0 +1,198 @@
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+
+if TYPE_CHECKING:
+    import requests  # Imported for real with the first client
+
+# JSONBin connection settings - override with environment variables
+JSONBIN_BASE_URL = os.getenv("JSONBIN_BASE_URL", "https://api.jsonbin.io/v3")
+POOL_SIZE = int(os.getenv("JSONBIN_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("JSONBIN_CONNECT_TIMEOUT", "3"))
+DEADLINE_SECONDS = float(os.getenv("JSONBIN_DEADLINE_SECONDS", "10"))  # Per call, across all retries
+MAX_ATTEMPTS = int(os.getenv("JSONBIN_MAX_ATTEMPTS", "3"))
+BODY_CHUNK_BYTES = 4096  # Deadline checked after each chunk; a chunk waits until it is full
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class JSONBinError(Exception):
+    """A JSONBin call failed; status is the last HTTP status (None for network errors)."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class JSONBinClient:
+    """JSONBin API client on a shared keep-alive requests.Session.
+
+    Every call has an overall deadline; transient failures (network errors, 429, 5xx) are
+    retried with jittered exponential backoff while time remains, honouring retry-after.
+    Creating a bin isn't idempotent, so POSTs are only retried when the request never
+    reached the server (connect timeout, connection refused, DNS failure) or the server
+    refused it (429/503).
+    """
+
+    def __init__(self, master_key: str, base_url: str = JSONBIN_BASE_URL, pool_size: int = POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        # requests is imported on first use so importing this module stays cheap at app start
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({'Content-Type': 'application/json', 'X-Master-Key': master_key})
+
+    def create_bin(self, data: Any, name: Optional[str] = None, collection_id: Optional[str] = None,
+                   deadline: float = DEADLINE_SECONDS) -> Optional[str]:
+        """Create a bin holding data and return its ID."""
+        headers = {}
+        if name:
+            headers['X-Bin-Name'] = name
+        if collection_id:
+            headers['X-Collection-Id'] = collection_id
+        response = self._request('create', 'POST', '/b', deadline, idempotent=False, headers=headers, json=data)
+        return response.json().get('metadata', {}).get('id')
+
+    def read_bin(self, bin_id: str, deadline: float = DEADLINE_SECONDS) -> Any:
+        """Return the latest record stored in a bin."""
+        response = self._request('read', 'GET', f'/b/{bin_id}/latest', deadline)
+        return response.json().get('record')
+
+    def update_bin(self, bin_id: str, data: Any, deadline: float = DEADLINE_SECONDS) -> None:
+        """Replace a bin's record with data."""
+        self._request('update', 'PUT', f'/b/{bin_id}', deadline, headers={'X-Bin-Meta': 'false'}, json=data)
+
+    def _request(self, operation: str, method: str, path: str, deadline: float,
+                 idempotent: bool = True, **kwargs) -> "requests.Response":
+        import requests
+
+        url = self.base_url + path
+        give_up_at = time.monotonic() + deadline
+        last_error, last_status = "deadline exceeded", None
+        for attempt in range(MAX_ATTEMPTS):
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                break
+            retry_after = None
+            started = time.monotonic()
+            try:
+                # The read timeout bounds each socket read, not the whole body, so the body is
+                # read here in chunks with the deadline checked between them
+                response = self.session.request(method, url, timeout=(min(CONNECT_TIMEOUT, remaining), remaining),
+                                                stream=True, **kwargs)
+                _read_body(response, give_up_at)
+            except requests.ConnectionError as e:
+                _record(operation, None, time.monotonic() - started)
+                last_error, last_status = f"connection error: {e}", None
+                if not idempotent and not _never_sent(e):
+                    break  # The connection dropped after the request went out - the bin may exist
+            except requests.Timeout as e:
+                _record(operation, None, time.monotonic() - started)
+                last_error, last_status = f"timed out: {e}", None
+                if not idempotent:
+                    break  # The bin may have been created - don't risk a duplicate
+            else:
+                _record(operation, response.status_code, time.monotonic() - started)
+                if response.status_code == 200:
+                    return response
+                last_error, last_status = f"JSONBin returned {response.status_code}: {response.text[:200]}", response.status_code
+                if response.status_code not in RETRYABLE_STATUSES or (not idempotent and response.status_code not in (429, 503)):
+                    break
+                try:
+                    retry_after = float(response.headers.get('retry-after', ''))
+                except ValueError:
+                    pass
+
+            if attempt + 1 < MAX_ATTEMPTS:
+                delay = retry_after if retry_after is not None else min(4.0, 0.25 * 2 ** attempt) * (0.5 + random.random() / 2)
+                if time.monotonic() + delay >= give_up_at:
+                    break
+                _count_retry()
+                time.sleep(delay)
+        raise JSONBinError(f"{operation} failed: {last_error}", last_status)
+
+
+def _read_body(response: "requests.Response", give_up_at: float) -> None:
+    """Read a streamed response body, raising Timeout if the deadline passes between chunks.
+
+    A single stalled read can still take up to the read timeout (the time that was left
+    when the request started) before the check runs.
+    """
+    import requests
+
+    chunks = []
+    for chunk in response.iter_content(BODY_CHUNK_BYTES):
+        chunks.append(chunk)
+        if time.monotonic() >= give_up_at:
+            response.close()
+            raise requests.Timeout("deadline exceeded while reading the response")
+    response._content = b"".join(chunks)  # So .json() and .text work on the consumed stream
+
+
+def _never_sent(error: BaseException) -> bool:
+    """True if the request certainly never reached JSONBin: a connect timeout, or no connection was made."""
+    import requests
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, NewConnectionError) or isinstance(getattr(error, 'reason', None), NewConnectionError):
+            return True
+        wrapped = error.args[0] if error.args and isinstance(error.args[0], BaseException) else None
+        error = error.__cause__ or error.__context__ or wrapped
+    return False
+
+
+_clients = {}  # master key -> JSONBinClient
+_lock = threading.Lock()
+_stats = {'calls': 0, 'retries': 0, 'status_codes': {}, 'latency_ms': {}}
+
+
+def _record(operation: str, status: Optional[int], seconds: float) -> None:
+    bucket = bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+    label = f"<={LATENCY_BUCKETS_MS[bucket]}" if bucket < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]}"
+    with _lock:
+        _stats['calls'] += 1
+        codes = _stats['status_codes']
+        codes[str(status or 'error')] = codes.get(str(status or 'error'), 0) + 1
+        histogram = _stats['latency_ms'].setdefault(operation, {})
+        histogram[label] = histogram.get(label, 0) + 1
+
+
+def _count_retry() -> None:
+    with _lock:
+        _stats['retries'] += 1
+
+
+def get_jsonbin_client(master_key: str) -> JSONBinClient:
+    """Return the shared client for this master key, creating it on first use."""
+    with _lock:
+        client = _clients.get(master_key)
+        if client is None:
+            client = JSONBinClient(master_key)
+            _clients[master_key] = client
+        return client
+
+
+def jsonbin_stats() -> Dict[str, Any]:
+    """Call/retry counts, status-code counts and per-operation latency histograms (ms buckets)."""
+    with _lock:
+        return {
+            'clients': len(_clients),
+            'calls': _stats['calls'],
+            'retries': _stats['retries'],
+            'status_codes': dict(_stats['status_codes']),
+            'latency_ms': {op: dict(h) for op, h in _stats['latency_ms'].items()}
+        }
@@ -0,0 +1,246 @@
+"""Local stand-in for the OpenAI chat-completions API, for benchmarks and offline testing.
+
+Speaks the streaming (SSE) and non-streaming chat-completions protocol and replays recorded
+plans from a directory (or a synthetic plan) with configurable time-to-first-token, token
+rate and error injection. Point the app at it with:
+
+    python mock_llm_server.py --port 8765 --ttft 0.5 --tokens-per-second 80
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run streamlit_app.py
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+# Roughly one token per word or punctuation run, keeping the whitespace that follows it
+TOKEN_PATTERN = re.compile(r"\s*\S+\s*|\s+")
+
+
+def synthetic_plan(days: int = 7) -> str:
+    """Build a plan-shaped markdown document (~10 KB, about 1,900 tokens, for 7 days)."""
+    parts = ["# Welcome to your FitKit plan!\n\nThis plan was created specifically for you.\n"]
+    parts.append("\n## 1. Complete 7-Day Workout Plan\n")
+    for day in range(1, days + 1):
+        parts.append(f"\n### Day {day}: Full Body Strength\n\n**Warm-up (8 minutes):** jumping jacks, hip circles, arm swings.\n\n")
+        parts.append("| Exercise | Sets x Reps | Rest |\n|---|---|---|\n")
+        for exercise in ("Back Squat", "Bench Press", "Barbell Row", "Overhead Press", "Romanian Deadlift", "Plank"):
+            parts.append(f"| {exercise} | 3 x 8-10 | 90 seconds |\n")
+        parts.append("\n**Cool-down:** 5-10 minutes of stretching for hips, hamstrings and shoulders.\n")
+    parts.append("\n## 2. Complete 7-Day Nutrition Plan\n")
+    for day in range(1, 8):
+        parts.append(f"\n### Day {day}\n")
+        for meal in ("Breakfast", "Mid-morning snack", "Lunch", "Afternoon snack", "Dinner"):
+            parts.append(f"- **{meal}:** 150g chicken breast, 200g rice, 100g broccoli "
+                         "(~520 kcal, 45g protein, 60g carbs, 9g fat)\n")
+    for title in ("3. Comprehensive Progression System", "4. Complete Lifestyle Optimization",
+                  "5. Psychological Mastery & Mindset", "6. Safety & Modifications"):
+        parts.append(f"\n## {title}\n\n")
+        for week in range(1, 5):
+            parts.append(f"- **Week {week}:** increase load by 2.5-5% when all sets hit the top of the rep range; "
+                         "sleep 7-9 hours, manage stress with daily breathing work and track your progress.\n")
+    return "".join(parts)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text)
+
+
+class MockLLMConfig:
+    """Latency, throughput and failure knobs for the mock server."""
+
+    def __init__(self, ttft: float = 0.5, tokens_per_second: float = 100.0, error_rate: float = 0.0,
+                 error_status: int = 429, retry_after: float = 1.0, plans_dir: Optional[str] = None,
+                 seed: Optional[int] = None):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.plans = self._load_plans(plans_dir)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'streamed': 0, 'errors': 0, 'tokens_sent': 0}
+
+    @staticmethod
+    def _load_plans(plans_dir: Optional[str]) -> List[str]:
+        plans = []
+        if plans_dir:
+            for path in sorted(glob.glob(os.path.join(plans_dir, "*.md")) + glob.glob(os.path.join(plans_dir, "*.txt"))):
+                with open(path, "r", encoding="utf-8") as f:
+                    plans.append(f.read())
+        return plans or [synthetic_plan()]
+
+    def pick_plan(self) -> str:
+        with self.lock:
+            return self.random.choice(self.plans)
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.lock:
+            self.stats[key] += amount
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    config = None  # Set by make_server
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model', 'owned_by': 'mock'}]})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+        config.count('requests')
+
+        if config.should_fail():
+            config.count('errors')
+            headers = {'retry-after': str(config.retry_after)} if config.error_status == 429 else {}
+            self._send_json(config.error_status, {'error': {
+                'message': 'Rate limit reached (mock)' if config.error_status == 429 else 'Server error (mock)',
+                'type': 'rate_limit_exceeded' if config.error_status == 429 else 'server_error'
+            }}, headers)
+            return
+
+        tokens = tokenize(config.pick_plan())
+        max_tokens = body.get('max_completion_tokens') or body.get('max_tokens')
+        finish_reason = 'stop'
+        if max_tokens and len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = 'length'  # Cut off at the token limit, like the real API
+        prompt_tokens = sum(len(m.get('content') or "") for m in body.get('messages', [])) // 4
+        model = body.get('model', 'mock-model')
+
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+            self._stream(tokens, model, prompt_tokens, include_usage, finish_reason)
+        else:
+            time.sleep(config.ttft + len(tokens) / config.tokens_per_second)
+            config.count('tokens_sent', len(tokens))
+            self._send_json(200, {
+                'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': "".join(tokens)},
+                             'finish_reason': finish_reason}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                          'total_tokens': prompt_tokens + len(tokens)}
+            })
+
+    def _stream(self, tokens: List[str], model: str, prompt_tokens: int, include_usage: bool,
+                finish_reason: str = 'stop') -> None:
+        config = self.config
+        config.count('streamed')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(choices, usage=None):
+            payload = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                       'model': model, 'choices': choices}
+            if include_usage:
+                payload['usage'] = usage
+            self._write_event(json.dumps(payload))
+
+        try:
+            time.sleep(config.ttft)
+            chunk([{'index': 0, 'delta': {'role': 'assistant', 'content': ""}, 'finish_reason': None}])
+            started = time.perf_counter()
+            for i, token in enumerate(tokens):
+                # Pace against the wall clock so per-token sleep overhead doesn't slow the rate down
+                delay = started + i / config.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                chunk([{'index': 0, 'delta': {'content': token}, 'finish_reason': None}])
+            chunk([{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+            if include_usage:
+                chunk([], {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                           'total_tokens': prompt_tokens + len(tokens)})
+            self._write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            config.count('tokens_sent', len(tokens))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away mid-stream
+
+    def _write_event(self, data: str) -> None:
+        event = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(event):X}\r\n".encode("ascii") + event + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(config: MockLLMConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Create (but don't start) a mock server; port 0 picks a free port."""
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(config: MockLLMConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start a mock server on a daemon thread. Returns (server, base_url)."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status for injected errors")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after seconds sent with 429s")
+    parser.add_argument("--plans-dir", help="Directory of recorded plans (*.md / *.txt) to replay")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = MockLLMConfig(args.ttft, args.tokens_per_second, args.error_rate, args.error_status,
+                           args.retry_after, args.plans_dir, args.seed)
+    server = make_server(config, args.host, args.port)
+    print(f"Mock LLM listening on http://{args.host}:{args.port}/v1 ({len(config.plans)} plan(s))")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
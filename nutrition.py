@@ -0,0 +1,214 @@
+from functools import lru_cache
+from typing import Dict, Any, Sequence, Tuple
+
+# Lookup tables shared by the scalar and batch calculations
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary": 1.2,
+    "Lightly active": 1.375,
+    "Moderately active": 1.55,
+    "Very active": 1.725
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.375
+
+GOAL_ADJUSTMENTS = {
+    "Lose fat": -500,        # 500 calorie deficit
+    "Build muscle": 300,     # 300 calorie surplus
+    "Re-comp": 0,           # Maintenance
+    "General health": -100   # Slight deficit for health
+}
+
+# (protein, fat, carb) ratios - diet style overrides goal
+GOAL_MACRO_RATIOS = {
+    "Build muscle": (0.30, 0.25, 0.45),
+    "Lose fat": (0.35, 0.30, 0.35)
+}
+DEFAULT_MACRO_RATIOS = (0.25, 0.30, 0.45)  # Re-comp or General health
+DIET_MACRO_RATIOS = {
+    "Keto": (0.25, 0.70, 0.05),
+    "Vegan": (0.20, 0.25, 0.55)
+}
+
+MACRO_FIELDS = ['bmr', 'tdee', 'target_calories', 'protein_grams', 'fat_grams', 'carb_grams',
+                'protein_calories', 'fat_calories', 'carb_calories']
+
+def calculate_bmr(weight: float, height: float, age: int, sex: str, unit: str) -> float:
+    """Calculate Basal Metabolic Rate using Mifflin-St Jeor Equation."""
+    # Convert to metric if needed
+    if unit == "Imperial":
+        weight_kg = weight * 0.453592  # lbs to kg
+        height_cm = height * 2.54     # inches to cm
+    else:
+        weight_kg = weight
+        height_cm = height
+    
+    if sex == "Male":
+        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + 5
+    else:  # Female or Other
+        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
+    
+    return bmr
+
+def calculate_tdee(bmr: float, activity_level: str, training_days: int) -> float:
+    """Calculate Total Daily Energy Expenditure."""
+    base_multiplier = ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER)
+    
+    # Adjust for training frequency
+    training_adjustment = 1 + (training_days * 0.05)  # 5% per training day
+    
+    return bmr * base_multiplier * training_adjustment
+
+def calculate_target_calories_and_macros(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Calculate target calories and macronutrients based on goals."""
+    bmr = calculate_bmr(
+        user_data['weight'], 
+        user_data['height'], 
+        user_data['age'], 
+        user_data['sex'], 
+        user_data['unit']
+    )
+    
+    tdee = calculate_tdee(bmr, user_data['activity'], user_data['days'])
+    
+    # Adjust calories based on goal
+    target_calories = tdee + GOAL_ADJUSTMENTS.get(user_data['goal'], 0)
+    
+    # Calculate macros based on goal, then adjust for diet style
+    protein_ratio, fat_ratio, carb_ratio = DIET_MACRO_RATIOS.get(
+        user_data['diet'], GOAL_MACRO_RATIOS.get(user_data['goal'], DEFAULT_MACRO_RATIOS)
+    )
+    
+    protein_calories = target_calories * protein_ratio
+    fat_calories = target_calories * fat_ratio
+    carb_calories = target_calories * carb_ratio
+    
+    # Convert to grams (protein: 4 cal/g, fat: 9 cal/g, carbs: 4 cal/g)
+    protein_grams = protein_calories / 4
+    fat_grams = fat_calories / 9
+    carb_grams = carb_calories / 4
+    
+    return {
+        'bmr': round(bmr),
+        'tdee': round(tdee),
+        'target_calories': round(target_calories),
+        'protein_grams': round(protein_grams),
+        'fat_grams': round(fat_grams),
+        'carb_grams': round(carb_grams),
+        'protein_calories': round(protein_calories),
+        'fat_calories': round(fat_calories),
+        'carb_calories': round(carb_calories)
+    }
+
+# Intake fields the nutrition targets depend on - the memoization key
+NUTRITION_INPUT_FIELDS = ('weight', 'height', 'age', 'sex', 'unit', 'activity', 'days', 'goal', 'diet')
+
+class NutritionProfile:
+    """Immutable nutrition targets for one intake, computed once and shared.
+    
+    Supports dict-style access (profile['bmr']) so it can stand in wherever the
+    calculate_target_calories_and_macros dict was used; as_dict() gives a plain,
+    JSON-serializable copy for session storage.
+    """
+    __slots__ = tuple(MACRO_FIELDS)
+    
+    def __init__(self, **values: int):
+        for field in MACRO_FIELDS:
+            object.__setattr__(self, field, values[field])
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("NutritionProfile is immutable")
+    
+    def __delattr__(self, name):
+        raise AttributeError("NutritionProfile is immutable")
+    
+    def __getitem__(self, field: str) -> int:
+        if field not in MACRO_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+    
+    def as_dict(self) -> Dict[str, int]:
+        return {field: getattr(self, field) for field in MACRO_FIELDS}
+    
+    def __eq__(self, other):
+        return isinstance(other, NutritionProfile) and self.as_dict() == other.as_dict()
+    
+    def __hash__(self):
+        return hash(tuple(getattr(self, field) for field in MACRO_FIELDS))
+    
+    def __repr__(self):
+        values = ", ".join(f"{field}={getattr(self, field)}" for field in MACRO_FIELDS)
+        return f"NutritionProfile({values})"
+
+@lru_cache(maxsize=4096)
+def _nutrition_profile_for(inputs: Tuple) -> NutritionProfile:
+    return NutritionProfile(**calculate_target_calories_and_macros(dict(zip(NUTRITION_INPUT_FIELDS, inputs))))
+
+def get_nutrition_profile(user_data: Dict[str, Any]) -> NutritionProfile:
+    """Return the NutritionProfile for this intake, memoized on the fields it depends on.
+    
+    The prompt builder, metric tabs, email and session persistence all call this, so BMR,
+    TDEE and macros are computed once per submission.
+    """
+    return _nutrition_profile_for(tuple(user_data[field] for field in NUTRITION_INPUT_FIELDS))
+
+def _lookup(np, values, mapping: Dict[str, Any], default):
+    """Map a column of category strings through mapping with one vectorized compare per key."""
+    result = np.full(values.shape, default, dtype=np.asarray(list(mapping.values()) + [default]).dtype)
+    for category, mapped in mapping.items():
+        result[values == category] = mapped
+    return result
+
+def calculate_macros_batch(weight: Sequence[float], height: Sequence[float], age: Sequence[int],
+                           sex: Sequence[str], unit: Sequence[str], activity: Sequence[str],
+                           days: Sequence[int], goal: Sequence[str], diet: Sequence[str]) -> Dict[str, Any]:
+    """Vectorized calculate_target_calories_and_macros over columns of profiles.
+    
+    Takes one array (or list) per intake field and returns a dict of integer NumPy arrays
+    with the same keys as the scalar function. Every operation runs in the same order as
+    the scalar code, so results are identical value for value.
+    """
+    import numpy as np  # Only needed for bulk recalculations
+    
+    weight = np.asarray(weight, dtype=np.float64)
+    height = np.asarray(height, dtype=np.float64)
+    age = np.asarray(age, dtype=np.float64)
+    days = np.asarray(days, dtype=np.float64)
+    sex, unit, activity, goal, diet = (np.asarray(column, dtype=str) for column in (sex, unit, activity, goal, diet))
+    
+    # BMR (Mifflin-St Jeor), converting imperial rows to metric
+    imperial = unit == "Imperial"
+    weight_kg = np.where(imperial, weight * 0.453592, weight)
+    height_cm = np.where(imperial, height * 2.54, height)
+    male = sex == "Male"
+    bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + np.where(male, 5, -161)
+    
+    # TDEE
+    base_multiplier = _lookup(np, activity, ACTIVITY_MULTIPLIERS, DEFAULT_ACTIVITY_MULTIPLIER)
+    tdee = bmr * base_multiplier * (1 + (days * 0.05))
+    
+    # Target calories and macro ratios
+    target_calories = tdee + _lookup(np, goal, GOAL_ADJUSTMENTS, 0)
+    goal_index = _lookup(np, goal, {g: i for i, g in enumerate(GOAL_MACRO_RATIOS)}, len(GOAL_MACRO_RATIOS))
+    ratio_table = np.array(list(GOAL_MACRO_RATIOS.values()) + [DEFAULT_MACRO_RATIOS])[goal_index]
+    diet_index = _lookup(np, diet, {d: i for i, d in enumerate(DIET_MACRO_RATIOS)}, -1)
+    has_diet_override = diet_index >= 0
+    if has_diet_override.any():
+        diet_table = np.array(list(DIET_MACRO_RATIOS.values()))
+        ratio_table[has_diet_override] = diet_table[diet_index[has_diet_override]]
+    
+    protein_calories = target_calories * ratio_table[:, 0]
+    fat_calories = target_calories * ratio_table[:, 1]
+    carb_calories = target_calories * ratio_table[:, 2]
+    
+    # np.rint rounds half to even, exactly like Python's round()
+    columns = {
+        'bmr': bmr,
+        'tdee': tdee,
+        'target_calories': target_calories,
+        'protein_grams': protein_calories / 4,
+        'fat_grams': fat_calories / 9,
+        'carb_grams': carb_calories / 4,
+        'protein_calories': protein_calories,
+        'fat_calories': fat_calories,
+        'carb_calories': carb_calories
+    }
+    return {field: np.rint(values).astype(np.int64) for field, values in columns.items()}
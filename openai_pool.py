@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Any
+
+if TYPE_CHECKING:
+    from openai import OpenAI  # Imported for real with the first client
+
+# Connection pool and timeout settings - override with environment variables
+POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "120"))
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "120"))  # Long plans stream for a while
+WARMUP_CONNECTIONS = int(os.getenv("OPENAI_WARMUP_CONNECTIONS", "2"))  # 0 disables warm-up
+
+_clients = {}   # api_key -> OpenAI client
+_warmed = set()  # api keys that have been (or are being) warmed up
+_lock = threading.Lock()
+_stats = {
+    'clients_created': 0,
+    'lookups': 0,
+    'warmups': 0,
+    'warmup_seconds': 0.0,
+    'warmup_errors': 0
+}
+
+
+def _build_client(api_key: str) -> "OpenAI":
+    """Create an OpenAI client backed by a keep-alive connection pool."""
+    # openai and httpx take ~0.6s to import - load them with the first client, not at app start
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_SIZE,
+            keepalive_expiry=KEEPALIVE_SECONDS
+        ),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+    return OpenAI(api_key=api_key, http_client=http_client)
+
+
+def get_openai_client(api_key: str) -> "OpenAI":
+    """Return the shared client for this API key, creating it on first use.
+
+    Clients live for the whole process, so connections (DNS, TLS) are reused across
+    Streamlit reruns and across users.
+    """
+    api_key = api_key.strip()  # Strip any whitespace
+    with _lock:
+        _stats['lookups'] += 1
+        client = _clients.get(api_key)
+        if client is None:
+            client = _build_client(api_key)
+            _clients[api_key] = client
+            _stats['clients_created'] += 1
+        return client
+
+
+def warm_up(api_key: str, connections: int = WARMUP_CONNECTIONS) -> bool:
+    """Open pooled connections ahead of the first real request.
+
+    Fires a few concurrent cheap requests (list models) so the pool holds that many
+    live TLS connections. Returns False if any warm-up request failed.
+    """
+    if connections <= 0:
+        return True
+    client = get_openai_client(api_key)
+    errors = []
+
+    def _ping():
+        try:
+            client.models.list()
+        except Exception as e:
+            errors.append(e)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_ping, daemon=True) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=CONNECT_TIMEOUT + 10)
+
+    with _lock:
+        _stats['warmups'] += 1
+        _stats['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        _stats['warmup_errors'] += len(errors)
+    return not errors
+
+
+def warm_up_in_background(api_key: str, connections: int = WARMUP_CONNECTIONS) -> bool:
+    """Warm up the pool for this key once per process without blocking the caller.
+
+    Returns True if a warm-up was started, False if one already ran for this key.
+    """
+    if not api_key or connections <= 0:
+        return False
+    api_key = api_key.strip()
+    with _lock:
+        if api_key in _warmed:
+            return False
+        _warmed.add(api_key)
+    threading.Thread(target=warm_up, args=(api_key, connections), daemon=True).start()
+    return True
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Return client registry and warm-up counters."""
+    with _lock:
+        stats = dict(_stats)
+        stats['clients'] = len(_clients)
+    stats['pool_size'] = POOL_SIZE
+    return stats
@@ -0,0 +1,208 @@
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable
+
+from jsonbin_client import JSONBinError
+from session_store import JSONBinSessionStore, SESSION_COLLECTION_ID
+
+# Write-behind settings - override with environment variables
+QUEUE_SIZE = int(os.getenv("FITKIT_PERSIST_QUEUE_SIZE", "500"))
+WORKERS = int(os.getenv("FITKIT_PERSIST_WORKERS", "4"))
+BATCH_SIZE = int(os.getenv("FITKIT_PERSIST_BATCH_SIZE", "20"))
+BATCH_WINDOW_SECONDS = float(os.getenv("FITKIT_PERSIST_BATCH_WINDOW", "0.2"))
+WRITE_TIMEOUT_SECONDS = float(os.getenv("FITKIT_PERSIST_TIMEOUT", "10"))
+MAX_ATTEMPTS = int(os.getenv("FITKIT_PERSIST_MAX_ATTEMPTS", "3"))
+
+# Keep this many recent write latencies for percentiles
+LATENCY_WINDOW = 500
+
+
+class WriteHandle:
+    """Pollable result of a queued write.
+
+    status is one of 'queued', 'writing', 'done', 'failed', 'rejected' or 'superseded'
+    (a newer write for the same key replaced this one before it ran).
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.status = 'queued'
+        self.value = None
+        self.error = None
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self._done = threading.Event()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def ok(self) -> bool:
+        return self.status == 'done'
+
+    def result(self, timeout: Optional[float] = None):
+        """Wait up to timeout seconds and return the writer's result (None if not finished or failed)."""
+        self._done.wait(timeout)
+        return self.value
+
+    def _finish(self, status: str, value=None, error: Optional[str] = None) -> None:
+        self.status = status
+        self.value = value
+        self.error = error
+        self._done.set()
+
+
+class WriteBehindQueue:
+    """Bounded write-behind queue drained in batches by a thread pool.
+
+    Callers enqueue (key, payload) and get a WriteHandle back immediately. A dispatcher
+    thread collects up to BATCH_SIZE items (waiting at most BATCH_WINDOW_SECONDS), drops
+    all but the newest write per key, and hands the batch to the pool. Each write gets a
+    timeout and jittered-backoff retries; a writer that isn't idempotent passes retryable to
+    say which failures are safe to repeat (the default retries every failure).
+    """
+
+    def __init__(self, writer: Callable[[Any, float], Any], queue_size: int = QUEUE_SIZE,
+                 workers: int = WORKERS, batch_size: int = BATCH_SIZE,
+                 batch_window: float = BATCH_WINDOW_SECONDS, timeout: float = WRITE_TIMEOUT_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS, name: str = "persistence",
+                 retryable: Callable[[Exception], bool] = lambda error: True):
+        self.writer = writer  # writer(payload, timeout) -> result; raises on failure
+        self.retryable = retryable
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'rejected': 0,
+            'superseded': 0,
+            'retries': 0,
+            'batches': 0
+        }
+        threading.Thread(target=self._dispatch, name=f"{name}-dispatcher", daemon=True).start()
+
+    def submit(self, key: str, payload: Any) -> WriteHandle:
+        """Queue a write without blocking. If the queue is full the handle is 'rejected'."""
+        handle = WriteHandle(key)
+        try:
+            self._queue.put_nowait((handle, payload))
+        except queue.Full:
+            handle._finish('rejected', error="Write queue is full")
+            with self._lock:
+                self._stats['rejected'] += 1
+            return handle
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return handle
+
+    def _dispatch(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Coalesce: only the newest write per key needs to reach storage
+            latest = {}
+            for handle, payload in batch:
+                previous = latest.get(handle.key)
+                if previous:
+                    previous[0]._finish('superseded')
+                    with self._lock:
+                        self._stats['superseded'] += 1
+                latest[handle.key] = (handle, payload)
+
+            with self._lock:
+                self._stats['batches'] += 1
+            for handle, payload in latest.values():
+                self._pool.submit(self._write, handle, payload)
+
+    def _write(self, handle: WriteHandle, payload: Any) -> None:
+        handle.status = 'writing'
+        last_error = None
+        for attempt in range(self.max_attempts):
+            handle.attempts = attempt + 1
+            started = time.monotonic()
+            try:
+                value = self.writer(payload, self.timeout)
+            except Exception as e:
+                last_error = str(e)
+                if not self.retryable(e):
+                    break
+                if attempt + 1 < self.max_attempts:
+                    with self._lock:
+                        self._stats['retries'] += 1
+                    time.sleep(min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2))
+                continue
+            self._record_latency(time.monotonic() - started)
+            with self._lock:
+                self._stats['written'] += 1
+            handle._finish('done', value)
+            return
+        with self._lock:
+            self._stats['failed'] += 1
+        handle._finish('failed', error=last_error)
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            if len(self._latencies) > LATENCY_WINDOW:
+                del self._latencies[:len(self._latencies) - LATENCY_WINDOW]
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, outcome counters and write latency percentiles (ms)."""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        stats['queue_depth'] = self._queue.qsize()
+        if latencies:
+            stats['write_p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 1)
+            stats['write_p95_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+            stats['write_max_ms'] = round(latencies[-1] * 1000, 1)
+        return stats
+
+
+def write_session_to_jsonbin(payload: Dict[str, Any], timeout: float) -> Optional[str]:
+    """Create a JSONBin bin holding one saved session; returns the new bin ID."""
+    store = JSONBinSessionStore(payload['master_key'], deadline=timeout,
+                                collection_id=payload.get('collection_id', SESSION_COLLECTION_ID))
+    return store.save(payload['session_data'])
+
+
+def session_write_retryable(error: Exception) -> bool:
+    """Whether a failed session save can be repeated without risking a duplicate bin.
+
+    Only when JSONBin answered that it didn't take the request (429, 503). A status of None
+    means the outcome is unknown - the bin may exist - so the write is not repeated.
+    """
+    return isinstance(error, JSONBinError) and error.status in (429, 503)
+
+
+_session_writer = None
+_session_writer_lock = threading.Lock()
+
+
+def get_session_writer() -> WriteBehindQueue:
+    """Return the process-wide write-behind queue for saved sessions."""
+    global _session_writer
+    with _session_writer_lock:
+        if _session_writer is None:
+            _session_writer = WriteBehindQueue(write_session_to_jsonbin, name="session-writer",
+                                               retryable=session_write_retryable)
+        return _session_writer
@@ -0,0 +1,142 @@
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+from nutrition import get_nutrition_profile, DIET_MACRO_RATIOS, GOAL_MACRO_RATIOS, DEFAULT_MACRO_RATIOS
+from plan_cache import PlanCache, make_cache_key
+from plan_schema import parse_plan
+
+# Profile bucketing settings - override with environment variables
+WEIGHT_BAND_KG = int(os.getenv("FITKIT_BUCKET_WEIGHT_KG", "10"))
+CALORIE_STEP = int(os.getenv("FITKIT_BUCKET_CALORIE_STEP", "200"))
+MACRO_STEP_GRAMS = 5
+SKELETON_CACHE_SIZE = int(os.getenv("FITKIT_SKELETON_CACHE_SIZE", "512"))
+SKELETON_CACHE_TTL = int(os.getenv("FITKIT_SKELETON_CACHE_TTL", str(7 * 24 * 60 * 60)))
+SKELETON_CACHE_DIR = os.getenv("FITKIT_SKELETON_CACHE_DIR")  # Disk tier is off unless set
+
+# (lowest age, label) - an age falls in the last band whose lowest age it reaches
+AGE_BANDS = [(0, "under 18"), (18, "18-24"), (25, "25-34"), (35, "35-44"), (45, "45-54"), (55, "55-64"), (65, "65+")]
+
+# Intake fields copied into the bucket unchanged - users must match on all of them to share a skeleton
+BUCKET_FIELDS = ('sex', 'goal', 'level', 'days', 'activity', 'environment', 'style', 'diet', 'add_cardio', 'add_abs')
+
+
+def age_band(age: int) -> str:
+    label = AGE_BANDS[0][1]
+    for lowest, band in AGE_BANDS:
+        if age >= lowest:
+            label = band
+    return label
+
+
+def weight_band(weight: float, unit: str) -> str:
+    weight_kg = weight * 0.453592 if unit == "Imperial" else weight
+    low = int(weight_kg // WEIGHT_BAND_KG) * WEIGHT_BAND_KG
+    return f"{low}-{low + WEIGHT_BAND_KG} kg"
+
+
+def _round_to(value: float, step: int) -> int:
+    return int(round(value / step) * step)
+
+
+def profile_bucket(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Quantize an intake into its profile bucket.
+
+    Categorical answers are kept as they are; age and weight become bands and the calorie
+    target is rounded to CALORIE_STEP, with macros recomputed from the rounded calories so
+    every user in the bucket gets the same numbers. Name, height, injuries, dislikes and
+    medical notes are left out - the personalization pass covers them.
+    """
+    bucket = {field: user_data[field] for field in BUCKET_FIELDS}
+    bucket['style'] = sorted(user_data['style'])
+    bucket['age_band'] = age_band(user_data['age'])
+    bucket['weight_band'] = weight_band(user_data['weight'], user_data['unit'])
+
+    target_calories = _round_to(get_nutrition_profile(user_data)['target_calories'], CALORIE_STEP)
+    protein_ratio, fat_ratio, carb_ratio = DIET_MACRO_RATIOS.get(
+        user_data['diet'], GOAL_MACRO_RATIOS.get(user_data['goal'], DEFAULT_MACRO_RATIOS)
+    )
+    bucket['target_calories'] = target_calories
+    bucket['protein_grams'] = _round_to(target_calories * protein_ratio / 4, MACRO_STEP_GRAMS)
+    bucket['carb_grams'] = _round_to(target_calories * carb_ratio / 4, MACRO_STEP_GRAMS)
+    bucket['fat_grams'] = _round_to(target_calories * fat_ratio / 9, MACRO_STEP_GRAMS)
+    return bucket
+
+
+def bucket_label(bucket: Dict[str, Any]) -> str:
+    """Short human-readable bucket name for stats, e.g. 'Build muscle/Beginner/4d/Gym/Omnivore/Male/25-34/70-80 kg/2400 kcal'."""
+    return "/".join([bucket['goal'], bucket['level'], f"{bucket['days']}d", bucket['environment'], bucket['diet'],
+                     bucket['sex'], bucket['age_band'], bucket['weight_band'], f"{bucket['target_calories']} kcal"])
+
+
+def skeleton_cache_key(bucket: Dict[str, Any], template_version: str, model: str) -> str:
+    return make_cache_key(bucket, template_version + "-skeleton", model)
+
+
+def portion_factor(user_data: Dict[str, Any], bucket: Dict[str, Any]) -> float:
+    """How much to scale the skeleton's meal portions to hit this user's exact calorie target."""
+    return get_nutrition_profile(user_data)['target_calories'] / bucket['target_calories']
+
+
+def skeleton_from_plan(plan: str) -> str:
+    """Drop any greeting the model wrote before the first section so the skeleton stays generic."""
+    return "".join(section.text for section in parse_plan(plan).sections if section.key != 'greeting').strip("\n")
+
+
+def skeleton_exercises(skeleton: str, limit: int = 40) -> List[str]:
+    """Distinct exercise names in a skeleton, in order of first appearance."""
+    names = []
+    for day in parse_plan(skeleton).workout_days:
+        for exercise in day.exercises:
+            if exercise.name not in names:
+                names.append(exercise.name)
+    return names[:limit]
+
+
+class BucketStats:
+    """Skeleton cache hits and misses per profile bucket."""
+
+    def __init__(self):
+        self._buckets = {}  # label -> [hits, misses]
+        self._lock = threading.Lock()
+
+    def record(self, label: str, hit: bool) -> None:
+        with self._lock:
+            counts = self._buckets.setdefault(label, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def stats(self, top: Optional[int] = 20) -> Dict[str, Any]:
+        """Overall hit rate plus per-bucket counts, busiest buckets first."""
+        with self._lock:
+            buckets = [(label, hits, misses) for label, (hits, misses) in self._buckets.items()]
+        buckets.sort(key=lambda item: item[1] + item[2], reverse=True)
+        hits = sum(item[1] for item in buckets)
+        lookups = hits + sum(item[2] for item in buckets)
+        return {
+            'buckets': len(buckets),
+            'lookups': lookups,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'per_bucket': [
+                {'bucket': label, 'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3)}
+                for label, hits, misses in buckets[:top]
+            ]
+        }
+
+
+# Process-wide skeleton cache and bucket counters shared by every Streamlit session
+_skeleton_cache = None
+_bucket_stats = BucketStats()
+_skeleton_cache_lock = threading.Lock()
+
+
+def get_skeleton_cache() -> PlanCache:
+    """Return the shared skeleton cache, creating it on first use."""
+    global _skeleton_cache
+    with _skeleton_cache_lock:
+        if _skeleton_cache is None:
+            _skeleton_cache = PlanCache(SKELETON_CACHE_SIZE, SKELETON_CACHE_TTL, SKELETON_CACHE_DIR)
+        return _skeleton_cache
+
+
+def get_bucket_stats() -> BucketStats:
+    return _bucket_stats
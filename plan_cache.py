@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# Defaults can be overridden with environment variables
+DEFAULT_MAX_ENTRIES = int(os.getenv("FITKIT_PLAN_CACHE_SIZE", "256"))
+DEFAULT_TTL_SECONDS = int(os.getenv("FITKIT_PLAN_CACHE_TTL", str(24 * 60 * 60)))
+DEFAULT_DISK_DIR = os.getenv("FITKIT_PLAN_CACHE_DIR")  # Disk tier is off unless set
+
+
+def normalize_user_data(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize intake values so equivalent profiles produce the same cache key."""
+    normalized = {}
+    for field, value in user_data.items():
+        if isinstance(value, str):
+            value = " ".join(value.split())  # Collapse stray whitespace
+        elif isinstance(value, (list, tuple)):
+            value = sorted(" ".join(str(item).split()) for item in value)
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)  # 70.0 and 70 are the same weight
+        normalized[field] = value
+    return normalized
+
+
+def make_cache_key(user_data: Dict[str, Any], template_version: str, model: str) -> str:
+    """Build a content-addressed key from the profile, prompt template version and model."""
+    payload = {
+        'template_version': template_version,
+        'model': model,
+        'user_data': normalize_user_data(user_data)
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """In-memory LRU cache with TTL and an optional on-disk tier for generated plans."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 disk_dir: Optional[str] = DEFAULT_DISK_DIR):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (expires_at, plan)
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'writes': 0
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached plan for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, plan = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return plan
+                # Stale entry - drop it and fall through to the disk tier
+                del self._entries[key]
+                self._stats['expirations'] += 1
+
+        disk_entry = self._read_disk(key, now)
+        with self._lock:
+            if disk_entry is not None:
+                expires_at, plan = disk_entry
+                self._store_memory(key, expires_at, plan)
+                self._stats['disk_hits'] += 1
+                return plan
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key: str, plan: str) -> None:
+        """Store a plan in memory and, if configured, on disk."""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store_memory(key, expires_at, plan)
+            self._stats['writes'] += 1
+        self._write_disk(key, expires_at, plan)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters plus current size for cache sizing."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _store_memory(self, key: str, expires_at: float, plan: str) -> None:
+        # Caller must hold the lock
+        self._entries[key] = (expires_at, plan)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('expires_at', 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return record['expires_at'], record['plan']
+
+    def _write_disk(self, key: str, expires_at: float, plan: str) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({'expires_at': expires_at, 'plan': plan}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)  # Atomic so readers never see half a file
+        except OSError:
+            pass
+
+
+# Process-wide cache shared by every Streamlit session (modules survive script reruns)
+_plan_cache = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    """Return the shared plan cache, creating it on first use."""
+    global _plan_cache
+    with _plan_cache_lock:
+        if _plan_cache is None:
+            _plan_cache = PlanCache()
+        return _plan_cache
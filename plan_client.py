@@ -0,0 +1,86 @@
+import json
+import os
+import urllib.error
+import urllib.request
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from plan_schema import PlanStreamParser
+from streaming import StreamRenderer, StreamStats
+
+# Plan service settings - override with environment variables
+PLAN_SERVICE_URL = os.getenv("FITKIT_PLAN_SERVICE_URL")  # e.g. http://127.0.0.1:8080 - generate in-process unless set
+SERVICE_TOKEN = os.getenv("FITKIT_SERVICE_TOKEN")
+SERVICE_TIMEOUT_SECONDS = float(os.getenv("FITKIT_PLAN_SERVICE_TIMEOUT", "120"))  # Longest gap between events
+
+
+def iter_events(response) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (event, data) from a Server-Sent Events response with JSON data lines."""
+    event, data = "message", []
+    for raw_line in response:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def generate_via_service(user_data: Dict[str, Any], streaming_placeholder=None, stats: Optional[StreamStats] = None,
+                         plan_parser: Optional[PlanStreamParser] = None,
+                         service_url: Optional[str] = None) -> str:
+    """Generate a plan through the plan service (plan_service.py), streaming it like generate_workout_plan.
+
+    Same contract as generate_workout_plan: returns the plan, or user-facing text starting
+    with "❌" on failure; stats and plan_parser are filled in the same way.
+    """
+    if stats is None:
+        stats = StreamStats()
+    service_url = (service_url or PLAN_SERVICE_URL or "").rstrip("/")
+    headers = {'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+    if SERVICE_TOKEN:
+        headers['Authorization'] = f"Bearer {SERVICE_TOKEN}"
+    request = urllib.request.Request(f"{service_url}/v1/plans", data=json.dumps(user_data).encode("utf-8"),
+                                     headers=headers, method="POST")
+
+    renderer = StreamRenderer(streaming_placeholder) if streaming_placeholder else None
+    plan = None
+    stats.start()
+    try:
+        with urllib.request.urlopen(request, timeout=SERVICE_TIMEOUT_SECONDS) as response:
+            for event, data in iter_events(response):
+                if event == 'delta':
+                    stats.record_chunk(data['text'])
+                    if plan_parser:
+                        plan_parser.feed(data['text'])
+                    if renderer:
+                        renderer.feed(data['text'])
+                elif event == 'queued' and streaming_placeholder and not stats.chunks:
+                    eta = data['eta_seconds']
+                    eta_text = f" (about {int(eta) + 1}s)" if eta > 0 else ""
+                    streaming_placeholder.info(f"⏳ Lots of people are building plans right now - "
+                                               f"you're #{data['position']} in line{eta_text}...")
+                elif event == 'done':
+                    plan = data['plan']
+                    stats.cached = data['stats'].get('cached', False)
+                    stats.finish(data['stats'].get('tokens'), data['stats'].get('cached_prompt_tokens'))
+                elif event == 'error':
+                    return data['error']
+    except urllib.error.HTTPError as e:
+        try:
+            detail = json.loads(e.read()).get('error', e.reason)
+        except ValueError:
+            detail = e.reason
+        return f"❌ The plan service rejected the request ({e.code}): {detail}"
+    except (urllib.error.URLError, OSError) as e:
+        return f"❌ Couldn't reach the plan service at {service_url}: {getattr(e, 'reason', e)}"
+
+    if plan is None:
+        return "❌ The plan service closed the stream before the plan was finished. Please try again."
+    if renderer:
+        stats.render = renderer.finish()
+    if plan_parser:
+        plan_parser.finish()
+    return plan
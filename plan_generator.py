@@ -0,0 +1,337 @@
+import asyncio
+import os
+from typing import Dict, Any, Callable, Optional
+
+from plan_cache import get_plan_cache, make_cache_key
+from streaming import StreamRenderer, ChunkBuffer, StreamStats, merge_streams_in_order
+from rate_limiter import get_scheduler, retry_after_seconds, QueueFullError, MAX_RATE_LIMIT_RETRIES
+from openai_pool import get_openai_client
+from plan_schema import PlanStreamParser
+from plan_buckets import (profile_bucket, bucket_label, skeleton_cache_key, portion_factor, skeleton_from_plan,
+                          skeleton_exercises, get_skeleton_cache, get_bucket_stats)
+from token_budget import (ADAPTIVE_BUDGETS, PLAN_SECTION_KEYS, SKELETON_SECTION_KEYS, PERSONALIZATION_SECTION_KEYS,
+                          request_budget, get_token_usage_log)
+from prompts import (PROMPT_TEMPLATE_VERSION, SYSTEM_PROMPT, create_workout_prompt, create_section_prompts,
+                     create_skeleton_prompt, create_personalization_prompt)
+
+MODEL_NAME = "o3-mini-2025-01-31"
+
+# "single" asks one completion for the whole plan; "parallel" generates sections concurrently
+GENERATION_MODE = os.getenv("FITKIT_GENERATION_MODE", "single")
+
+# Reuse one plan skeleton per profile bucket and only generate the personal parts (plan_buckets.py)
+REUSE_SKELETONS = os.getenv("FITKIT_REUSE_SKELETONS", "0") == "1"
+PERSONALIZATION_MAX_TOKENS = 1500  # The personal pass's limit - its adaptive budget can only be smaller
+
+# generate_workout_plan reports failures as user-facing text starting with one of these
+ERROR_PREFIXES = ("❌", "🚫", "Error generating workout plan")
+
+def _stream_completion(openai_client, prompt: str, max_tokens: int, usages: list, finish_reasons: list = None):
+    """Yield text deltas of one streamed completion; appends its usage block to usages (and its
+    finish reason to finish_reasons - 'length' means it was cut off at max_tokens)."""
+    stream = openai_client.chat.completions.create(
+        model=MODEL_NAME,  # Using o3-mini for faster streaming completions
+        messages=[
+            {
+                "role": "system", 
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ],
+        max_completion_tokens=max_tokens,
+        temperature=1,
+        stream=True,
+        stream_options={"include_usage": True}  # Final chunk carries exact token usage
+    )
+    
+    for chunk in stream:
+        if chunk.usage is not None:
+            usages.append(chunk.usage)
+        if chunk.choices and chunk.choices[0].finish_reason and finish_reasons is not None:
+            finish_reasons.append(chunk.choices[0].finish_reason)
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            yield chunk.choices[0].delta.content
+
+def _completion_tokens(usages: list) -> int:
+    return sum(usage.completion_tokens for usage in usages)
+
+def _cached_prompt_tokens(usages: list) -> int:
+    """Prompt tokens served from the provider's prefix cache (0 if not reported)."""
+    return sum(getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None) or 0 for usage in usages)
+
+def _reasoning_tokens(usages: list) -> int:
+    """Hidden reasoning tokens, counted in completion_tokens and max_completion_tokens (0 if not reported)."""
+    return sum(getattr(getattr(usage, 'completion_tokens_details', None), 'reasoning_tokens', None) or 0 for usage in usages)
+
+def _record_usage(mode: str, data: Dict[str, Any], sections: tuple, budget: int, text: str, usages: list,
+                  finish_reasons: list) -> None:
+    """Log actual vs estimated tokens per section for one request (skipped if usage wasn't reported)."""
+    if usages and sections:
+        get_token_usage_log().record(mode, data, sections, budget, text, _completion_tokens(usages),
+                                     _reasoning_tokens(usages), 'length' in finish_reasons)
+
+def warm_skeleton(user_data: Dict[str, Any], api_key: str, skeleton_cache=None) -> bool:
+    """Generate and cache the plan skeleton for user_data's profile bucket (cache pre-warming).
+    
+    Returns False without calling OpenAI if the bucket already has a skeleton. Requests go
+    through the shared admission scheduler, like interactive generations.
+    """
+    from openai import RateLimitError
+    
+    if skeleton_cache is None:
+        skeleton_cache = get_skeleton_cache()
+    bucket = profile_bucket(user_data)
+    skeleton_key = skeleton_cache_key(bucket, PROMPT_TEMPLATE_VERSION, MODEL_NAME)
+    if skeleton_cache.get(skeleton_key) is not None:
+        return False
+    
+    openai_client = get_openai_client(api_key)
+    prompt = create_skeleton_prompt(bucket)
+    prompt_tokens = len(prompt) // 4  # ~4 chars per token
+    max_tokens = request_budget(bucket, SKELETON_SECTION_KEYS)
+    scheduler = get_scheduler()
+    attempt = 0
+    while True:
+        admission = scheduler.acquire(prompt_tokens + max_tokens, 1)
+        response_buffer = ChunkBuffer()
+        usages = []
+        finish_reasons = []
+        try:
+            for content in _stream_completion(openai_client, prompt, max_tokens, usages, finish_reasons):
+                response_buffer.append(content)
+            break
+        except RateLimitError as e:
+            if attempt >= MAX_RATE_LIMIT_RETRIES:
+                raise
+            scheduler.backoff(retry_after_seconds(e, attempt))
+            attempt += 1
+        finally:
+            admission.release(prompt_tokens + _completion_tokens(usages) if usages else None)
+    
+    _record_usage('skeleton', bucket, SKELETON_SECTION_KEYS, max_tokens, response_buffer.text(), usages, finish_reasons)
+    if 'length' in finish_reasons:
+        raise ValueError(f"Skeleton for bucket {bucket_label(bucket)} was cut off at {max_tokens} tokens - not cached")
+    skeleton = skeleton_from_plan(response_buffer.text())
+    if not skeleton:
+        raise ValueError(f"Empty skeleton generated for bucket {bucket_label(bucket)}")
+    skeleton_cache.set(skeleton_key, skeleton)
+    return True
+
+def generate_workout_plan(user_data: Dict[str, Any], api_key: str, streaming_placeholder=None,
+                          stats: Optional[StreamStats] = None, parallel: Optional[bool] = None,
+                          plan_parser: Optional[PlanStreamParser] = None, reuse: Optional[bool] = None,
+                          on_delta: Optional[Callable[[str], None]] = None,
+                          on_queue: Optional[Callable[[int, float], None]] = None) -> str:
+    """Generate workout plan using OpenAI API with optional streaming display.
+    
+    If a StreamStats is passed it is filled with TTFT, token rate, chunk gaps and render counters.
+    If a PlanStreamParser is passed it is fed the plan as it streams (days and sections are
+    emitted as they complete) and finished at the end; parser.plan holds the structured plan.
+    With parallel=True (default from FITKIT_GENERATION_MODE) each plan section is generated
+    concurrently and streamed in document order, so latency tracks the longest section.
+    With reuse=True (default from FITKIT_REUSE_SKELETONS) the plan is a short personalization
+    pass (greeting, exact macros, injuries) placed above a skeleton shared by the user's profile
+    bucket; the skeleton is generated alongside the personal pass on a bucket miss and cached.
+    on_delta(text) receives the plan text as it streams (a cached plan arrives in one piece) and
+    on_queue(position, eta_seconds) the queue position while waiting for admission, for callers
+    that are not Streamlit pages. Failures are returned as text starting with ERROR_PREFIXES.
+    """
+    from openai import RateLimitError  # Deferred so the intake form doesn't wait on importing openai
+    
+    if stats is None:
+        stats = StreamStats()
+    if parallel is None:
+        parallel = GENERATION_MODE == "parallel"
+    if reuse is None:
+        reuse = REUSE_SKELETONS
+    try:
+        # Validate API key before using
+        if not api_key:
+            return "❌ No API key provided to generation function"
+        
+        if len(api_key) < 50:  # Basic length check
+            return f"❌ API key too short: {len(api_key)} characters (expected ~164)"
+        
+        # Serve repeat profiles straight from the plan cache - no API round-trip
+        plan_cache = get_plan_cache()
+        template_version = PROMPT_TEMPLATE_VERSION + ("-reuse" if reuse else "-sections" if parallel else "")
+        cache_key = make_cache_key(user_data, template_version, MODEL_NAME)
+        cached_plan = plan_cache.get(cache_key)
+        if cached_plan is not None:
+            stats.cached = True
+            if on_delta:
+                on_delta(cached_plan)
+            if plan_parser:
+                plan_parser.feed(cached_plan)
+                plan_parser.finish()
+            return cached_plan
+        
+        # Reuse the process-wide pooled client for this API key (keeps connections warm)
+        openai_client = get_openai_client(api_key)
+        
+        # Build the request(s) up front as (prompt, max_tokens, sections written) so the scheduler knows
+        # what they will cost; max_tokens is the adaptive budget for those sections (token_budget.py)
+        skeleton = None
+        if reuse:
+            bucket = profile_bucket(user_data)
+            skeleton_key = skeleton_cache_key(bucket, PROMPT_TEMPLATE_VERSION, MODEL_NAME)
+            skeleton_cache = get_skeleton_cache()
+            skeleton = skeleton_cache.get(skeleton_key)
+            get_bucket_stats().record(bucket_label(bucket), skeleton is not None)
+            personal_prompt = create_personalization_prompt(
+                user_data, bucket, portion_factor(user_data, bucket), skeleton_exercises(skeleton) if skeleton else None
+            )
+            personal_budget = (min(PERSONALIZATION_MAX_TOKENS, request_budget(user_data, PERSONALIZATION_SECTION_KEYS))
+                               if ADAPTIVE_BUDGETS else PERSONALIZATION_MAX_TOKENS)
+            jobs = [(personal_prompt, personal_budget, PERSONALIZATION_SECTION_KEYS)]
+            if skeleton is None:
+                # Generated once per bucket
+                jobs.append((create_skeleton_prompt(bucket), request_budget(bucket, SKELETON_SECTION_KEYS),
+                             SKELETON_SECTION_KEYS))
+        elif parallel:
+            jobs = [(prompt, max_tokens, (key,)) for key, _, max_tokens, prompt in create_section_prompts(user_data)]
+        else:
+            jobs = [(create_workout_prompt(user_data), request_budget(user_data), PLAN_SECTION_KEYS)]
+        requests_needed = len(jobs)
+        prompt_tokens = sum(len(prompt) // 4 for prompt, _, _ in jobs)  # ~4 chars per token
+        estimated_tokens = prompt_tokens + sum(max_tokens for _, max_tokens, _ in jobs)
+        
+        # Show queue position instead of failing when we are at the rate limit
+        def show_queue_position(position, eta):
+            if on_queue:
+                on_queue(position, eta)
+            if streaming_placeholder:
+                eta_text = f" (about {int(eta) + 1}s)" if eta > 0 else ""
+                streaming_placeholder.info(f"⏳ Lots of people are building plans right now - you're #{position} in line{eta_text}...")
+        
+        scheduler = get_scheduler()
+        attempt = 0
+        while True:
+            admission = scheduler.acquire(estimated_tokens, requests_needed, on_wait=show_queue_position)
+            
+            # Batch deltas on a frame budget and only re-send the unfinished tail
+            renderer = StreamRenderer(streaming_placeholder) if streaming_placeholder else None
+            
+            # Collect chunks in a buffer and join once at the end
+            response_buffer = ChunkBuffer()
+            job_usages = [[] for _ in jobs]
+            job_finish_reasons = [[] for _ in jobs]
+            
+            sources = [
+                (lambda prompt=prompt, max_tokens=max_tokens, index=index:
+                    _stream_completion(openai_client, prompt, max_tokens, job_usages[index], job_finish_reasons[index]))
+                for index, (prompt, max_tokens, _) in enumerate(jobs)
+            ]
+            if skeleton is not None:
+                sources.append(lambda: iter([skeleton]))
+            source_buffers = [ChunkBuffer() for _ in sources]
+            
+            def emit(content):
+                response_buffer.append(content)
+                stats.record_chunk(content)
+                if on_delta:
+                    on_delta(content)
+                if plan_parser:
+                    plan_parser.feed(content)
+                
+                # Update the streaming placeholder if provided
+                if renderer:
+                    renderer.feed(content)
+            
+            # Stream the response for faster user experience
+            stats.start()
+            try:
+                if len(sources) > 1:
+                    # Sections (or personal pass + skeleton) run concurrently and are merged back in document order
+                    last_section = [0]
+                    
+                    def emit_section(index, content):
+                        source_buffers[index].append(content)
+                        if index != last_section[0]:
+                            last_section[0] = index
+                            content = "\n\n" + content  # Keep sections apart when they are joined
+                        emit(content)
+                    
+                    asyncio.run(merge_streams_in_order(sources, emit_section))
+                else:
+                    for content in sources[0]():
+                        source_buffers[0].append(content)
+                        emit(content)
+                break
+            except RateLimitError as e:
+                # Retry only if nothing was shown yet - otherwise the user would see duplicate text
+                if response_buffer or attempt >= MAX_RATE_LIMIT_RETRIES:
+                    raise
+                scheduler.backoff(retry_after_seconds(e, attempt))
+                attempt += 1
+            finally:
+                # Refund the unused part of the reservation once real usage is known
+                usages = [usage for job in job_usages for usage in job]
+                admission.release(prompt_tokens + _completion_tokens(usages) if usages else None)
+        
+        if usages:
+            stats.finish(_completion_tokens(usages), _cached_prompt_tokens(usages))
+        else:
+            stats.finish()
+        if renderer:
+            stats.render = renderer.finish()
+        
+        full_response = response_buffer.text()
+        if plan_parser:
+            plan_parser.finish()
+        
+        mode = "reuse" if reuse else "sections" if parallel else "single"
+        for index, (_, max_tokens, sections) in enumerate(jobs):
+            # A skeleton is sized from the bucket, everything else from the user's own intake
+            _record_usage(mode, bucket if sections == SKELETON_SECTION_KEYS else user_data, sections, max_tokens,
+                          source_buffers[index].text(), job_usages[index], job_finish_reasons[index])
+        
+        # Only cache complete plans so a failed or cut-off stream is retried next time
+        truncated = ['length' in reasons for reasons in job_finish_reasons]
+        if full_response:
+            if not any(truncated):
+                plan_cache.set(cache_key, full_response)
+            if reuse and skeleton is None and not truncated[1]:
+                new_skeleton = skeleton_from_plan(source_buffers[1].text())
+                if new_skeleton:
+                    skeleton_cache.set(skeleton_key, new_skeleton)
+        
+        return full_response
+        
+    except QueueFullError:
+        return "❌ We're at capacity right now - too many plans are being generated at once. Please try again in a minute."
+    except RateLimitError as e:
+        return f"❌ OpenAI is rate limiting us right now ({str(e)}). Please try again in a minute."
+    except Exception as e:
+        error_msg = str(e)
+        
+        # Enhanced error handling with specific guidance
+        if "401" in error_msg or "invalid_api_key" in error_msg:
+            return f"""
+            🚫 **API Key Error Detected!**
+            
+            **Error Details:** {error_msg}
+            
+            **Common Solutions:**
+            1. **Check your API key format** in Streamlit Cloud secrets:
+               - Should be: `OPENAI_API_KEY = "sk-proj-your-full-key-here"`
+               - No extra spaces, quotes, or line breaks
+            
+            2. **Verify your API key is active:**
+               - Go to https://platform.openai.com/api-keys
+               - Make sure your key hasn't expired
+               - Check if you have billing set up
+            
+            3. **Copy the key carefully:**
+               - Select the entire key (they're very long!)
+               - Don't include any extra characters
+            
+            4. **Restart your Streamlit app** after updating secrets
+            
+            Need help? The key should start with `sk-proj-` and be about 164 characters long.
+            """
+        else:
+            return f"Error generating workout plan: {error_msg}\n\nPlease check your OpenAI API key and try again."
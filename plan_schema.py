@@ -0,0 +1,327 @@
+"""Structured plan schema and a streaming parser for the markdown the model writes.
+
+The plan prompt asks for a fixed markdown layout (see OUTPUT_FORMAT in prompts.py):
+"## N. Title" per section, "### Day N: Focus" per day, one exercise or meal per line.
+PlanStreamParser turns that text into typed objects as the chunks arrive, so callers can
+work with one day or one meal at a time instead of re-scanning the whole plan:
+
+    parser = PlanStreamParser(on_item=lambda item: print(item.kind, item.title))
+    for delta in stream:
+        parser.feed(delta)
+    plan = parser.finish()
+"""
+import re
+from typing import Dict, Any, List, Optional, Callable
+
+SCHEMA_VERSION = 1
+
+# Section keys (same as prompts.PLAN_SECTIONS) and the header words that identify them
+SECTION_KEYWORDS = [
+    ('workout', ('workout',)),
+    ('nutrition', ('nutrition', 'meal plan')),
+    ('progression', ('progression',)),
+    ('lifestyle', ('lifestyle',)),
+    ('psychology', ('psycholog', 'mindset')),
+    ('safety', ('safety', 'modification'))
+]
+
+SECTION_HEADER = re.compile(r"^#{1,2}\s+(.+?)\s*#*\s*$")
+DAY_HEADER = re.compile(r"^(?:#{2,4}\s*|\*\*)\s*Day\s+(\d+)\b\**\s*[:.\-–—]?\s*(.*?)\**\s*$", re.IGNORECASE)
+BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+(.*)$")
+SETS_REPS = re.compile(r"(\d+)\s*(?:sets?\s*)?(?:[x×]|sets?\s+of)\s*(\d+(?:\s*[-–]\s*\d+)?|AMRAP|max|failure)(?:\s*reps?)?",
+                       re.IGNORECASE)
+REST = re.compile(r"(\d+(?:\s*[-–]\s*\d+)?\s*(?:seconds?|secs?|s|minutes?|mins?))\b", re.IGNORECASE)
+CALORIES = re.compile(r"(\d[\d,]*)\s*(?:kcal|calories|cals?)\b", re.IGNORECASE)
+MACROS = {
+    'protein_grams': re.compile(r"(\d+)\s*g\s*(?:of\s*)?protein|protein[:\s]+(\d+)\s*g", re.IGNORECASE),
+    'carb_grams': re.compile(r"(\d+)\s*g\s*(?:of\s*)?carb(?:ohydrate)?s?|carb(?:ohydrate)?s?[:\s]+(\d+)\s*g", re.IGNORECASE),
+    'fat_grams': re.compile(r"(\d+)\s*g\s*(?:of\s*)?fats?|fats?[:\s]+(\d+)\s*g", re.IGNORECASE)
+}
+MEAL_NAMES = re.compile(r"breakfast|lunch|dinner|snack|supper|brunch|pre-?workout|post-?workout|meal\s*\d", re.IGNORECASE)
+LABELLED_LINE = re.compile(r"^\**\s*([^:*|]{1,60}?)\s*\**\s*:\s*\**\s*(.*)$")
+
+
+def _strip_markup(text: str) -> str:
+    return text.replace("**", "").replace("__", "").strip(" *_`")
+
+
+def _first_number(pattern, text: str) -> Optional[int]:
+    match = pattern.search(text)
+    if not match:
+        return None
+    value = next(group for group in match.groups() if group is not None)
+    return int(value.replace(",", ""))
+
+
+class Exercise:
+    """One exercise prescription: name, sets, reps (e.g. '8-10' or 'AMRAP') and rest."""
+
+    kind = 'exercise'
+
+    def __init__(self, name: str, sets: Optional[int], reps: Optional[str], rest: Optional[str], notes: str = ""):
+        self.name = name
+        self.sets = sets
+        self.reps = reps
+        self.rest = rest
+        self.notes = notes
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'sets': self.sets, 'reps': self.reps, 'rest': self.rest, 'notes': self.notes}
+
+    def __repr__(self):
+        return f"Exercise({self.name!r}, {self.sets} x {self.reps}, rest={self.rest!r})"
+
+
+class Meal:
+    """One meal: name, foods/portions and the macros stated for it (None when not given)."""
+
+    kind = 'meal'
+
+    def __init__(self, name: str, description: str, calories: Optional[int] = None,
+                 protein_grams: Optional[int] = None, carb_grams: Optional[int] = None,
+                 fat_grams: Optional[int] = None):
+        self.name = name
+        self.description = description
+        self.calories = calories
+        self.protein_grams = protein_grams
+        self.carb_grams = carb_grams
+        self.fat_grams = fat_grams
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'description': self.description, 'calories': self.calories,
+                'protein_grams': self.protein_grams, 'carb_grams': self.carb_grams, 'fat_grams': self.fat_grams}
+
+    def __repr__(self):
+        return f"Meal({self.name!r}, calories={self.calories})"
+
+
+class PlanDay:
+    """One day of the workout plan (exercises) or nutrition plan (meals), with its raw markdown."""
+
+    def __init__(self, kind: str, day: int, title: str):
+        self.kind = kind  # 'workout_day' or 'nutrition_day'
+        self.day = day
+        self.title = title
+        self.exercises = []
+        self.meals = []
+        self.warmup = ""
+        self.cooldown = ""
+        self.text = ""
+
+    @property
+    def total_calories(self) -> Optional[int]:
+        calories = [meal.calories for meal in self.meals if meal.calories is not None]
+        return sum(calories) if calories else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        result = {'kind': self.kind, 'day': self.day, 'title': self.title, 'text': self.text}
+        if self.kind == 'workout_day':
+            result.update(exercises=[e.as_dict() for e in self.exercises], warmup=self.warmup, cooldown=self.cooldown)
+        else:
+            result.update(meals=[m.as_dict() for m in self.meals], total_calories=self.total_calories)
+        return result
+
+    def __repr__(self):
+        items = len(self.exercises) if self.kind == 'workout_day' else len(self.meals)
+        return f"PlanDay({self.kind}, day={self.day}, title={self.title!r}, items={items})"
+
+
+class PlanSection:
+    """One top-level section of the plan (key from prompts.PLAN_SECTIONS) with its days and raw markdown."""
+
+    kind = 'section'
+
+    def __init__(self, key: str, title: str):
+        self.key = key
+        self.title = title
+        self.days = []
+        self.text = ""
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'key': self.key, 'title': self.title, 'text': self.text,
+                'days': [day.as_dict() for day in self.days]}
+
+    def __repr__(self):
+        return f"PlanSection({self.key!r}, {self.title!r}, days={len(self.days)})"
+
+
+class StructuredPlan:
+    """All parsed sections of a plan in document order."""
+
+    def __init__(self, sections: Optional[List[PlanSection]] = None):
+        self.sections = sections or []
+
+    def section(self, key: str) -> Optional[PlanSection]:
+        return next((section for section in self.sections if section.key == key), None)
+
+    @property
+    def workout_days(self) -> List[PlanDay]:
+        return [day for section in self.sections for day in section.days if day.kind == 'workout_day']
+
+    @property
+    def nutrition_days(self) -> List[PlanDay]:
+        return [day for section in self.sections for day in section.days if day.kind == 'nutrition_day']
+
+    def to_markdown(self) -> str:
+        """The original plan text (parsing is lossless)."""
+        return "".join(section.text for section in self.sections)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'schema_version': SCHEMA_VERSION, 'sections': [section.as_dict() for section in self.sections]}
+
+
+class PlanStreamParser:
+    """Incremental line-based parser: feed() text deltas, get typed objects as they complete.
+
+    on_item is called with each PlanDay as soon as the next day or section starts, and with
+    each PlanSection once it is finished - so a day is available while later days are still
+    streaming. Partial lines are buffered until their newline arrives.
+    """
+
+    def __init__(self, on_item: Optional[Callable[[Any], None]] = None):
+        self.on_item = on_item
+        self.plan = StructuredPlan()
+        self._partial = ""
+        self._section = None
+        self._day = None
+        self._day_lines = []
+        self._section_lines = []
+
+    def feed(self, text: str) -> None:
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line + "\n")
+
+    def finish(self) -> StructuredPlan:
+        """Parse any buffered partial line, close open items and return the plan."""
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ""
+        self._close_section()
+        return self.plan
+
+    def _emit(self, item) -> None:
+        if self.on_item:
+            self.on_item(item)
+
+    def _line(self, line: str) -> None:
+        stripped = line.strip()
+
+        day_match = DAY_HEADER.match(stripped)
+        if day_match and self._section is not None and self._section.key in ('workout', 'nutrition'):
+            self._close_day()
+            kind = 'workout_day' if self._section.key == 'workout' else 'nutrition_day'
+            self._day = PlanDay(kind, int(day_match.group(1)), _strip_markup(day_match.group(2)))
+            self._day_lines = [line]
+            self._section_lines.append(line)
+            return
+
+        header_match = SECTION_HEADER.match(stripped)
+        key = self._section_key(header_match.group(1)) if header_match else None
+        if key or self._section is None:
+            if key:
+                self._close_section()
+                self._section = PlanSection(key, _strip_markup(re.sub(r"^\d+[.)]\s*", "", header_match.group(1))))
+            else:
+                # Anything before the first recognised section header is the greeting
+                self._section = PlanSection('greeting', 'Welcome')
+            self._section_lines = []
+
+        self._section_lines.append(line)
+        if self._day is not None:
+            self._day_lines.append(line)
+            self._parse_day_line(stripped)
+
+    def _section_key(self, header: str) -> Optional[str]:
+        lowered = header.lower()
+        for key, keywords in SECTION_KEYWORDS:
+            if any(keyword in lowered for keyword in keywords):
+                # Headers inside a section (e.g. "### Post-workout nutrition") are level 3+ and never get here
+                return key if not (self._section and self._section.key == key) else None
+        return None
+
+    def _parse_day_line(self, stripped: str) -> None:
+        day = self._day
+        if not stripped:
+            return
+        lowered = _strip_markup(stripped).lower()
+        if day.kind == 'workout_day':
+            if lowered.startswith(("warm-up", "warm up", "warmup")):
+                day.warmup = _strip_markup(stripped.split(":", 1)[-1])
+                return
+            if lowered.startswith(("cool-down", "cool down", "cooldown")):
+                day.cooldown = _strip_markup(stripped.split(":", 1)[-1])
+                return
+            exercise = self._parse_exercise(stripped)
+            if exercise:
+                day.exercises.append(exercise)
+        else:
+            meal = self._parse_meal(stripped)
+            if meal:
+                day.meals.append(meal)
+
+    @staticmethod
+    def _parse_exercise(stripped: str) -> Optional[Exercise]:
+        if stripped.startswith("|"):
+            cells = [_strip_markup(cell) for cell in stripped.strip("|").split("|")]
+            if not cells or set(cells[0]) <= set("-: ") or cells[0].lower() in ('exercise', 'exercises', 'movement'):
+                return None  # Separator or header row
+            row = " | ".join(cells[1:])
+            sets_reps = SETS_REPS.search(row)
+            if not sets_reps:
+                return None
+            rest = REST.search(row[sets_reps.end():])
+            return Exercise(cells[0], int(sets_reps.group(1)), sets_reps.group(2).replace(" ", ""),
+                            rest.group(1) if rest else None)
+
+        bullet = BULLET.match(stripped)
+        body = bullet.group(1) if bullet else stripped
+        sets_reps = SETS_REPS.search(body)
+        if not sets_reps:
+            return None
+        name = re.split(r"\s*[:–—]\s*|\s+-\s+", _strip_markup(body[:sets_reps.start()]).rstrip(" :-–—,"), maxsplit=1)[0]
+        if not name:
+            return None
+        tail = body[sets_reps.end():]
+        rest = REST.search(tail)
+        notes = _strip_markup(tail[rest.end():] if rest else tail).strip(" ,;.()-")
+        return Exercise(name, int(sets_reps.group(1)), sets_reps.group(2).replace(" ", ""),
+                        rest.group(1) if rest else None, notes)
+
+    @staticmethod
+    def _parse_meal(stripped: str) -> Optional[Meal]:
+        bullet = BULLET.match(stripped)
+        labelled = LABELLED_LINE.match(bullet.group(1) if bullet else stripped)
+        if not labelled:
+            return None
+        name, description = _strip_markup(labelled.group(1)), labelled.group(2)
+        has_macros = CALORIES.search(description) is not None
+        if not (MEAL_NAMES.search(name) or (bullet and has_macros)):
+            return None
+        return Meal(name, _strip_markup(description), _first_number(CALORIES, description),
+                    *(_first_number(MACROS[field], description) for field in ('protein_grams', 'carb_grams', 'fat_grams')))
+
+    def _close_day(self) -> None:
+        if self._day is not None:
+            self._day.text = "".join(self._day_lines)
+            self._section.days.append(self._day)
+            self._emit(self._day)
+            self._day = None
+            self._day_lines = []
+
+    def _close_section(self) -> None:
+        if self._section is not None:
+            self._close_day()
+            self._section.text = "".join(self._section_lines)
+            self.plan.sections.append(self._section)
+            self._emit(self._section)
+            self._section = None
+            self._section_lines = []
+
+
+def parse_plan(text: str) -> StructuredPlan:
+    """Parse a complete plan in one go (e.g. one served from the plan cache)."""
+    parser = PlanStreamParser()
+    parser.feed(text)
+    return parser.finish()
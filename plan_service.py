@@ -0,0 +1,274 @@
+"""Headless plan-generation service: JSON intake in, plan streamed out as Server-Sent Events.
+
+The same generation path as the Streamlit app (nutrition targets, prompt, admission
+scheduler, plan cache) behind a stdlib HTTP server, for the mobile app and partner
+integrations. Endpoints:
+
+  POST /v1/plans       intake JSON (the user_data fields, see bulk_generate.INTAKE_FIELDS)
+                       -> text/event-stream, or one JSON response with ?stream=0
+  POST /v1/nutrition   intake JSON -> nutrition targets only (no LLM call)
+  GET  /v1/stats       scheduler, cache and client-pool stats of the worker that answers
+  GET  /health         liveness check
+
+Plan events, in order: 'nutrition' (targets), 'queued' (position, eta_seconds - only while
+waiting for admission), 'delta' (text), 'item' (each day or section once it is complete),
+then 'done' (plan, structured_plan, stats) or 'error' (error). Every data line is JSON.
+
+Several worker processes (pre-forked, sharing one listening socket) serve requests; the
+OpenAI RPM/TPM limits are split evenly between them. If FITKIT_SERVICE_TOKEN is set,
+requests need "Authorization: Bearer <token>". Try it against the mock LLM:
+
+    python mock_llm_server.py --port 8765 &
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-... python plan_service.py --workers 4
+    curl -N -X POST http://127.0.0.1:8080/v1/plans -d @intake.json
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit, parse_qs
+
+from bulk_generate import parse_profile
+from nutrition import calculate_target_calories_and_macros
+from openai_pool import pool_stats
+from plan_cache import get_plan_cache
+from plan_generator import generate_workout_plan, ERROR_PREFIXES
+from plan_schema import PlanStreamParser
+from rate_limiter import AdmissionScheduler, get_scheduler, set_scheduler, RPM_LIMIT, TPM_LIMIT
+from streaming import StreamStats
+
+# Service settings - override with environment variables
+SERVICE_HOST = os.getenv("FITKIT_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("FITKIT_SERVICE_PORT", "8080"))
+SERVICE_WORKERS = int(os.getenv("FITKIT_SERVICE_WORKERS", "2"))
+SERVICE_TOKEN = os.getenv("FITKIT_SERVICE_TOKEN")  # Unauthenticated unless set
+MAX_BODY_BYTES = 64 * 1024
+
+
+class PlanServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api_key = None  # Set by make_server
+    _client_gone = False  # Set once a streamed write fails
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"[worker {os.getpid()}] {self.address_string()} {format % args}\n")
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/health":
+            self._send_json(200, {'status': 'ok', 'worker': os.getpid()})
+        elif not self._authorized():
+            return
+        elif path == "/v1/stats":
+            self._send_json(200, {'worker': os.getpid(), 'scheduler': get_scheduler().stats(),
+                                  'plan_cache': get_plan_cache().stats(), 'openai_pool': pool_stats()})
+        else:
+            self._send_json(404, {'error': "Not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        if path not in ("/v1/plans", "/v1/nutrition"):
+            self.close_connection = True  # The body is never read, so the connection can't be reused
+            self._send_json(404, {'error': "Not found"})
+            return
+        if not self._authorized():
+            self.close_connection = True
+            return
+        user_data = self._read_intake()
+        if user_data is None:
+            return
+        nutrition = calculate_target_calories_and_macros(user_data)
+        if path == "/v1/nutrition":
+            self._send_json(200, nutrition)
+        elif parse_qs(url.query).get('stream', ["1"])[0] in ("0", "false"):
+            self._generate_json(user_data, nutrition)
+        else:
+            self._generate_stream(user_data, nutrition)
+
+    def _authorized(self) -> bool:
+        if SERVICE_TOKEN and self.headers.get('Authorization') != f"Bearer {SERVICE_TOKEN}":
+            self._send_json(401, {'error': "Missing or invalid bearer token"})
+            return False
+        return True
+
+    def _read_intake(self) -> Optional[Dict[str, Any]]:
+        """Parse and validate the request body; sends a 4xx and returns None if it is not a usable intake."""
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length < 0:
+                raise ValueError("negative Content-Length")
+        except ValueError as e:
+            self.close_connection = True  # Without a usable length the body can't be skipped
+            self._send_json(400, {'error': f"Invalid Content-Length: {e}"})
+            return None
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True  # The body is left unread
+            self._send_json(413, {'error': f"Intake larger than {MAX_BODY_BYTES} bytes"})
+            return None
+        try:
+            record = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            return parse_profile(record.get('user_data', record))
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': f"Invalid intake: {e}"})
+            return None
+
+    def _generate_json(self, user_data: Dict[str, Any], nutrition: Dict[str, Any]) -> None:
+        stats = StreamStats()
+        plan_parser = PlanStreamParser()
+        plan = generate_workout_plan(user_data, self.api_key, stats=stats, plan_parser=plan_parser)
+        if not plan or plan.lstrip().startswith(ERROR_PREFIXES):
+            self._send_json(502, {'error': plan.strip() if plan else "No plan was generated"})
+            return
+        self._send_json(200, {'plan': plan, 'nutrition': nutrition, 'structured_plan': plan_parser.plan.as_dict(),
+                              'stats': stats.as_dict()})
+
+    def _generate_stream(self, user_data: Dict[str, Any], nutrition: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')  # Don't let a reverse proxy hold events back
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        # If the client goes away, the first failed write raises inside on_delta (or on_queue), which
+        # stops the upstream stream and frees the admission slot. generate_workout_plan turns that
+        # into an error string like any other failure; _client_gone tells the two apart
+        self._client_gone = False
+        stats = StreamStats()
+        plan_parser = PlanStreamParser(on_item=lambda item: self._write_event('item', item.as_dict()))
+        try:
+            self._write_event('nutrition', nutrition)
+            plan = generate_workout_plan(
+                user_data, self.api_key, stats=stats, plan_parser=plan_parser,
+                on_delta=lambda text: self._write_event('delta', {'text': text}),
+                on_queue=lambda position, eta: self._write_event('queued', {'position': position,
+                                                                            'eta_seconds': round(eta, 1)})
+            )
+            if self._client_gone:
+                return
+            if not plan or plan.lstrip().startswith(ERROR_PREFIXES):
+                self._write_event('error', {'error': plan.strip() if plan else "No plan was generated"})
+            else:
+                self._write_event('done', {'plan': plan, 'structured_plan': plan_parser.plan.as_dict(),
+                                           'stats': stats.as_dict()})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except OSError:
+            self._client_gone = True
+        finally:
+            if self._client_gone:
+                self.close_connection = True
+
+    def _write_event(self, event: str, data: Dict[str, Any]) -> None:
+        """Send one SSE event as an HTTP chunk; raises OSError (and remembers it) once the client is gone."""
+        if self._client_gone:
+            raise ConnectionAbortedError("Client disconnected")
+        payload = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+        try:
+            self.wfile.write(f"{len(payload):X}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+        except OSError:
+            self._client_gone = True
+            raise
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')  # Tell keep-alive clients not to reuse the socket
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(api_key: str, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> ThreadingHTTPServer:
+    """Create (but don't start) a service bound to host:port; port 0 picks a free port."""
+    handler = type("ConfiguredPlanServiceHandler", (PlanServiceHandler,), {'api_key': api_key})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def _run_worker(server: ThreadingHTTPServer, workers: int) -> None:
+    """Serve requests in a forked worker until told to stop; never returns."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent stops the workers on Ctrl-C
+    # The OpenAI limits are per account - each worker admits its share of them
+    set_scheduler(AdmissionScheduler(rpm=max(1, RPM_LIMIT // workers), tpm=max(1, TPM_LIMIT // workers)))
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def serve(api_key: str, host: str = SERVICE_HOST, port: int = SERVICE_PORT, workers: int = SERVICE_WORKERS) -> None:
+    """Bind once and serve with workers pre-forked processes (one in-process server if workers <= 1).
+
+    Workers that die are replaced. SIGTERM or Ctrl-C stops the workers and returns.
+    """
+    server = make_server(api_key, host, port)
+    print(f"Plan service listening on http://{host}:{server.server_address[1]} "
+          f"({max(1, workers)} worker{'s' if workers > 1 else ''})", flush=True)
+    if workers <= 1 or not hasattr(os, "fork"):
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server, workers)
+        children.add(pid)
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited (status {status}) - starting a replacement", flush=True)
+            spawn()
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan-generation HTTP service with SSE streaming")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Worker processes")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("OPENAI_API_KEY is not set")
+    serve(api_key, args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
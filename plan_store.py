@@ -0,0 +1,369 @@
+import base64
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from plan_schema import parse_plan
+
+try:
+    import zstandard  # Optional: better ratio and faster decode than zlib
+except ImportError:
+    zstandard = None
+
+# Plan blob store settings - override with environment variables
+PLAN_STORE_DB_PATH = os.getenv("FITKIT_PLAN_STORE_DB", os.path.join(".fitkit", "plans.db"))
+PLAN_CODEC = os.getenv("FITKIT_PLAN_CODEC", "zstd" if zstandard else "zlib")
+TRAIN_AFTER_PLANS = int(os.getenv("FITKIT_PLAN_DICT_TRAIN_AFTER", "50"))  # 0 disables dictionary training
+# Plans outlive the sessions that point at them (FITKIT_SESSION_TTL_HOURS); saving a plan again renews it
+PLAN_RETENTION_HOURS = float(os.getenv("FITKIT_PLAN_RETENTION_HOURS", "48"))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("FITKIT_PLAN_SWEEP_INTERVAL", "3600"))  # 0 disables the sweeper
+DICTIONARY_SIZE = 32 * 1024  # zlib uses at most the last 32 KB of a preset dictionary
+COMPRESSION_LEVEL = 9
+
+# Blob header: magic, codec byte, dictionary id (0 = none)
+BLOB_MAGIC = b"FK"
+BLOB_HEADER = struct.Struct(">2scI")
+CODECS = {b"r": "raw", b"z": "zlib", b"s": "zstd"}
+CODEC_BYTES = {name: byte for byte, name in CODECS.items()}
+
+# Dictionary 1 ships with the code, so blobs that leave this machine (e.g. the JSONBin copy
+# of a session) can be decoded anywhere. Phrases every plan repeats - the most common go last,
+# because zlib finds matches closer to the end of the dictionary with shorter codes.
+BUILTIN_DICTIONARY_ID = 1
+BUILTIN_DICTIONARY = "\n".join([
+    "## 6. Safety & Modifications", "## 5. Psychological Mastery & Mindset", "## 4. Complete Lifestyle Optimization",
+    "## 3. Comprehensive Progression System", "Deload week", "Progressive overload", "Week 1-2: Foundation phase",
+    "Week 3-4: Intensification phase", "Sleep optimization", "Stress management", "Recovery protocols",
+    "Hydration guidelines", "Supplement recommendations", "Meal prep tips", "Grocery list",
+    "Warning signs to watch for", "Injury prevention", "consult with a healthcare provider",
+    "Romanian Deadlift", "Overhead Press", "Barbell Row", "Bench Press", "Back Squat", "Pull-ups", "Push-ups",
+    "Lunges", "Plank", "Bicycle Crunches", "Leg Raises", "Mountain Climbers", "Lat Pulldown", "Dumbbell",
+    "**Warm-up (5-10 minutes):** ", "**Cool-down (5-10 minutes):** stretching for hips, hamstrings and shoulders",
+    "## 2. Complete 7-Day Nutrition Plan", "## 1. Complete 7-Day Workout Plan",
+    "- **Breakfast:** ", "- **Mid-morning snack:** ", "- **Lunch:** ", "- **Afternoon snack:** ", "- **Dinner:** ",
+    "chicken breast, brown rice, broccoli, sweet potato, Greek yogurt, oats, eggs, salmon, almonds, banana",
+    "| Exercise | Sets x Reps | Rest |\n|---|---|---|\n", " seconds rest\n", " x 8-10, 90 seconds rest\n",
+    " kcal, ", "g protein, ", "g carbs, ", "g fat)\n", "### Day "
+]).encode("utf-8")
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def train_zlib_dictionary(samples: List[str], size: int = DICTIONARY_SIZE) -> bytes:
+    """Build a zlib preset dictionary from the lines that recur most across sample plans."""
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line for line in sample.splitlines(keepends=True) if len(line.strip()) > 8))
+    # Lines worth keeping: seen in more than one plan, weighted by the bytes they would save
+    ranked = sorted((line for line, count in counts.items() if count > 1),
+                    key=lambda line: counts[line] * len(line), reverse=True)
+    chosen, total = [], 0
+    for line in ranked:  # Best first, until the dictionary is full
+        encoded = line.encode("utf-8")
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(chosen))  # Best last - closest to the data being compressed
+
+
+class PlanStore:
+    """Compressed, deduplicated plan storage (SQLite).
+
+    A plan is split into its sections (plan_schema.parse_plan); each section is compressed
+    and stored once under the SHA-256 of its text, and the plan itself is just a manifest of
+    section hashes. Identical sections shared by many plans (safety notes, lifestyle guides,
+    a re-generated plan) cost nothing extra. Sections are compressed with zstd when available,
+    otherwise zlib, using a preset dictionary - the built-in one until enough plans have been
+    stored to train a better one from them.
+
+    Plans expire retention_hours after they were last saved. Each section counts the plan
+    manifests that reference it, so a daemon thread can drop expired plans every
+    sweep_interval seconds and, with them, the sections no remaining plan uses.
+    """
+
+    def __init__(self, path: str = PLAN_STORE_DB_PATH, codec: str = PLAN_CODEC,
+                 train_after: int = TRAIN_AFTER_PLANS, retention_hours: float = PLAN_RETENTION_HOURS,
+                 sweep_interval: float = SWEEP_INTERVAL_SECONDS):
+        if codec == "zstd" and zstandard is None:
+            codec = "zlib"
+        self.path = path
+        self.codec = codec
+        self.train_after = train_after
+        self.retention_hours = retention_hours
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._dictionaries = {BUILTIN_DICTIONARY_ID: BUILTIN_DICTIONARY}
+        self._decode_times = []
+        self._stats = {'plans_written': 0, 'sections_written': 0, 'sections_deduplicated': 0,
+                       'bytes_in': 0, 'bytes_written': 0, 'plans_read': 0, 'plans_expired': 0,
+                       'sections_swept': 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # Schema and the refs migration happen once, whichever process is first
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, raw_size INTEGER NOT NULL,"
+                         " data BLOB NOT NULL, refs INTEGER NOT NULL DEFAULT 0)")
+            conn.execute("CREATE TABLE IF NOT EXISTS plans (plan_id TEXT PRIMARY KEY, created_at REAL NOT NULL,"
+                         " raw_size INTEGER NOT NULL, manifest TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_plans_created_at ON plans (created_at)")
+            if 'refs' not in [column[1] for column in conn.execute("PRAGMA table_info(blobs)")]:
+                # Stores from before retention: count every section's references from the manifests
+                conn.execute("ALTER TABLE blobs ADD COLUMN refs INTEGER NOT NULL DEFAULT 0")
+                refs = Counter()
+                for (manifest,) in conn.execute("SELECT manifest FROM plans"):
+                    refs.update(manifest.split(",") if manifest else [])
+                conn.executemany("UPDATE blobs SET refs = ? WHERE hash = ?",
+                                 [(count, section_hash) for section_hash, count in refs.items()])
+            conn.execute("CREATE TABLE IF NOT EXISTS dictionaries (dict_id INTEGER PRIMARY KEY, codec TEXT NOT NULL,"
+                         " created_at REAL NOT NULL, data BLOB NOT NULL)")
+        self._active_dictionary = BUILTIN_DICTIONARY_ID
+        for dict_id, codec, data in self._connection().execute(
+                "SELECT dict_id, codec, data FROM dictionaries ORDER BY dict_id"):
+            self._dictionaries[dict_id] = data
+            if codec == self.codec:
+                self._active_dictionary = dict_id
+        if sweep_interval > 0 and retention_hours > 0:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), name="plan-store-sweeper",
+                             daemon=True).start()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def encode(self, text: str) -> bytes:
+        """Compress text into a self-describing blob with the active dictionary."""
+        dict_id = self._active_dictionary
+        return encode_blob(text, self.codec, dict_id, self._dictionaries[dict_id])
+
+    def decode(self, blob: bytes) -> str:
+        started = time.perf_counter()
+        dict_id = BLOB_HEADER.unpack_from(blob)[2]
+        if dict_id and dict_id not in self._dictionaries:
+            self._load_dictionary(dict_id)
+        text = decode_blob(blob, self._dictionaries)
+        with self._lock:
+            self._decode_times.append(time.perf_counter() - started)
+            del self._decode_times[:-500]
+        return text
+
+    def put(self, plan: str) -> str:
+        """Store a plan and return its ID (the hash of the full text - storing it twice is free)."""
+        raw_plan = plan.encode("utf-8")
+        plan_id = _content_hash(raw_plan)
+        conn = self._connection()
+        with conn:
+            # Already stored: just renew it, so the sweeper keeps it as long as sessions use it
+            if conn.execute("UPDATE plans SET created_at = ? WHERE plan_id = ?", (time.time(), plan_id)).rowcount:
+                return plan_id
+
+        manifest, new_sections, deduplicated, written = [], 0, 0, 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")  # The sweeper can't remove a section between the check and the ref
+            if conn.execute("SELECT 1 FROM plans WHERE plan_id = ?", (plan_id,)).fetchone():
+                return plan_id  # Stored by another process in the meantime
+            for section in parse_plan(plan).sections:
+                raw = section.text.encode("utf-8")
+                section_hash = _content_hash(raw)
+                manifest.append(section_hash)
+                if conn.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (section_hash,)).rowcount:
+                    deduplicated += 1
+                    continue
+                blob = self.encode(section.text)
+                conn.execute("INSERT INTO blobs (hash, raw_size, data, refs) VALUES (?, ?, ?, 1)",
+                             (section_hash, len(raw), blob))
+                new_sections += 1
+                written += len(blob)
+            conn.execute("INSERT INTO plans (plan_id, created_at, raw_size, manifest) VALUES (?, ?, ?, ?)",
+                         (plan_id, time.time(), len(raw_plan), ",".join(manifest)))
+
+        with self._lock:
+            self._stats['plans_written'] += 1
+            self._stats['sections_written'] += new_sections
+            self._stats['sections_deduplicated'] += deduplicated
+            self._stats['bytes_in'] += len(raw_plan)
+            self._stats['bytes_written'] += written
+            should_train = self.train_after > 0 and self._stats['plans_written'] == self.train_after
+        if should_train and self._active_dictionary == BUILTIN_DICTIONARY_ID:
+            # Training reads back and compresses hundreds of plans - never on the saving user's request
+            threading.Thread(target=self._train_in_background, name="plan-dict-trainer", daemon=True).start()
+        return plan_id
+
+    def get(self, plan_id: str) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute("SELECT manifest FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+        if row is None:
+            return None
+        hashes = row[0].split(",") if row[0] else []
+        blobs = dict(conn.execute(
+            f"SELECT hash, data FROM blobs WHERE hash IN ({','.join('?' * len(hashes))})", hashes
+        ).fetchall()) if hashes else {}
+        with self._lock:
+            self._stats['plans_read'] += 1
+        return "".join(self.decode(blobs[section_hash]) for section_hash in hashes)
+
+    def train_dictionary(self, samples: Optional[List[str]] = None) -> int:
+        """Train a new preset dictionary (from recent plans by default); new blobs use it. Returns its id."""
+        if samples is None:
+            rows = self._connection().execute(
+                "SELECT plan_id FROM plans ORDER BY created_at DESC LIMIT 200").fetchall()
+            samples = [self.get(plan_id) for (plan_id,) in rows]
+        if self.codec == "zstd":
+            data = zstandard.train_dictionary(DICTIONARY_SIZE * 4, [s.encode("utf-8") for s in samples]).as_bytes()
+        else:
+            data = train_zlib_dictionary(samples)
+        if not data:
+            return self._active_dictionary
+        with self._connection() as conn:
+            # Allocate under the write lock so two processes training at once get different ids;
+            # trained dictionaries are numbered after the built-in one
+            conn.execute("BEGIN IMMEDIATE")
+            (latest,) = conn.execute("SELECT MAX(dict_id) FROM dictionaries").fetchone()
+            dict_id = max(latest or 0, BUILTIN_DICTIONARY_ID) + 1
+            conn.execute("INSERT INTO dictionaries (dict_id, codec, created_at, data) VALUES (?, ?, ?, ?)",
+                         (dict_id, self.codec, time.time(), data))
+        self._dictionaries[dict_id] = data
+        self._active_dictionary = dict_id
+        return dict_id
+
+    def _load_dictionary(self, dict_id: int) -> None:
+        """Load a dictionary another process trained after this one started."""
+        row = self._connection().execute("SELECT data FROM dictionaries WHERE dict_id = ?", (dict_id,)).fetchone()
+        if row is not None:
+            self._dictionaries[dict_id] = row[0]
+
+    def sweep_expired(self) -> int:
+        """Remove plans not saved within retention_hours, and sections no other plan uses; returns plans removed."""
+        cutoff = time.time() - self.retention_hours * 3600
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute("SELECT plan_id, manifest FROM plans WHERE created_at <= ?", (cutoff,)).fetchall()
+            released = Counter()
+            for _, manifest in expired:
+                released.update(manifest.split(",") if manifest else [])
+            conn.executemany("DELETE FROM plans WHERE plan_id = ?", [(plan_id,) for plan_id, _ in expired])
+            conn.executemany("UPDATE blobs SET refs = refs - ? WHERE hash = ?",
+                             [(count, section_hash) for section_hash, count in released.items()])
+            swept = 0
+            for section_hash in released:
+                swept += conn.execute("DELETE FROM blobs WHERE hash = ? AND refs <= 0", (section_hash,)).rowcount
+        with self._lock:
+            self._stats['plans_expired'] += len(expired)
+            self._stats['sections_swept'] += swept
+        return len(expired)
+
+    def _sweep_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep_expired()
+            except sqlite3.Error:
+                pass  # Database busy - try again next interval
+
+    def _train_in_background(self) -> None:
+        try:
+            self.train_dictionary()
+        except Exception:
+            pass  # Too few samples for zstd, database busy... - keep the current dictionary
+
+    def stats(self) -> Dict[str, Any]:
+        """Compression and dedup counters for this process, plus totals from the database."""
+        with self._lock:
+            stats = dict(self._stats)
+            decode_times = sorted(self._decode_times)
+        conn = self._connection()
+        plans, plan_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(raw_size), 0) FROM plans").fetchone()
+        blobs, blob_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        stats.update(codec=self.codec, dictionary_id=self._active_dictionary, plans=plans, unique_sections=blobs,
+                     plan_bytes=plan_bytes, stored_bytes=blob_bytes,
+                     overall_ratio=round(plan_bytes / blob_bytes, 2) if blob_bytes else None)
+        if decode_times:
+            stats['decode_p50_ms'] = round(decode_times[len(decode_times) // 2] * 1000, 3)
+            stats['decode_max_ms'] = round(decode_times[-1] * 1000, 3)
+        return stats
+
+
+def _zstd_dictionary(dictionary: Optional[bytes], dict_id: int):
+    if not dictionary:
+        return None
+    # The built-in dictionary is plain text; trained ones are real zstd dictionaries
+    dict_type = zstandard.DICT_TYPE_RAWCONTENT if dict_id == BUILTIN_DICTIONARY_ID else zstandard.DICT_TYPE_AUTO
+    return zstandard.ZstdCompressionDict(dictionary, dict_type=dict_type)
+
+
+def encode_blob(text: str, codec: str = "zlib", dict_id: int = BUILTIN_DICTIONARY_ID,
+                dictionary: Optional[bytes] = None) -> bytes:
+    """Compress text into a blob: header (magic, codec, dictionary id) + compressed payload.
+
+    Without an explicit dictionary, dict_id 1 uses the built-in dictionary and 0 uses none.
+    """
+    raw = text.encode("utf-8")
+    if dictionary is None:
+        dictionary = BUILTIN_DICTIONARY if dict_id == BUILTIN_DICTIONARY_ID else None
+        dict_id = BUILTIN_DICTIONARY_ID if dictionary else 0
+    if codec == "zstd" and zstandard is not None:
+        payload = zstandard.ZstdCompressor(level=10, dict_data=_zstd_dictionary(dictionary, dict_id)).compress(raw)
+    elif codec == "raw":
+        payload, dict_id = raw, 0
+    else:
+        codec = "zlib"
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(COMPRESSION_LEVEL)
+        payload = compressor.compress(raw) + compressor.flush()
+    return BLOB_HEADER.pack(BLOB_MAGIC, CODEC_BYTES[codec], dict_id) + payload
+
+
+def decode_blob(blob: bytes, dictionaries: Optional[Dict[int, bytes]] = None) -> str:
+    """Decompress a blob made by encode_blob; dictionaries maps ids to trained dictionaries."""
+    magic, codec_byte, dict_id = BLOB_HEADER.unpack_from(blob)
+    if magic != BLOB_MAGIC:
+        raise ValueError("Not a plan blob")
+    payload = blob[BLOB_HEADER.size:]
+    dictionary = None
+    if dict_id:
+        dictionary = (dictionaries or {}).get(dict_id, BUILTIN_DICTIONARY if dict_id == BUILTIN_DICTIONARY_ID else None)
+        if dictionary is None:
+            raise ValueError(f"Plan blob needs dictionary {dict_id}, which isn't available")
+    codec = CODECS[codec_byte]
+    if codec == "raw":
+        return payload.decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("Plan blob is zstd-compressed but the zstandard package isn't installed")
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dictionary(dictionary, dict_id)).decompress(payload).decode("utf-8")
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+
+
+def encode_plan_for_transfer(plan: str) -> str:
+    """Compact, portable text form of a plan (zlib + built-in dictionary, base64) for remote storage."""
+    return base64.b64encode(encode_blob(plan, "zlib", BUILTIN_DICTIONARY_ID)).decode("ascii")
+
+
+def decode_plan_from_transfer(encoded: str) -> str:
+    return decode_blob(base64.b64decode(encoded))
+
+
+_plan_store = None
+_plan_store_lock = threading.Lock()
+
+
+def get_plan_store() -> PlanStore:
+    """Return the process-wide plan store, creating it on first use."""
+    global _plan_store
+    with _plan_store_lock:
+        if _plan_store is None:
+            _plan_store = PlanStore()
+        return _plan_store
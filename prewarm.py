@@ -0,0 +1,160 @@
+"""Pre-generate plan skeletons for the most common profile buckets before peak hours.
+
+Reads past submissions and counts them by profile bucket (see plan_buckets.py), then
+generates the skeleton for each of the top-N buckets that is not cached yet. Skeletons go
+to the skeleton cache's disk tier, so the app must point FITKIT_SKELETON_CACHE_DIR at the
+same directory (with FITKIT_REUSE_SKELETONS=1) to serve them. Buckets already on disk are
+skipped, so an interrupted run picks up where it stopped when started again.
+
+Inputs can be mixed:
+  *.jsonl  one submission per line - a user_data dict, or a saved session with a
+           'user_data' key; an optional 'count' field weights the line
+  *.csv    a frequency list - one row per combination (any user_data columns, style
+           separated by ';') with an optional 'count' column
+  --sessions PATH  the app's local session store (.fitkit/sessions.db)
+
+Fields missing from an input (e.g. a CSV with only goal, level and days) are taken from
+DEFAULT_PROFILE.
+
+    OPENAI_API_KEY=... python prewarm.py submissions.jsonl --sessions .fitkit/sessions.db --top 50 --concurrency 4
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Tuple
+
+from plan_buckets import (profile_bucket, bucket_label, skeleton_cache_key, SKELETON_CACHE_SIZE, SKELETON_CACHE_TTL,
+                          SKELETON_CACHE_DIR)
+from plan_cache import PlanCache
+from plan_generator import warm_skeleton, MODEL_NAME
+from prompts import PROMPT_TEMPLATE_VERSION
+
+# Stand-in values for intake fields an input does not provide
+DEFAULT_PROFILE = {
+    'name': '', 'age': 30, 'sex': 'Male', 'height': 175, 'weight': 75, 'unit': 'Metric',
+    'goal': 'General health', 'level': 'Beginner', 'days': 3, 'environment': 'Gym', 'diet': 'Omnivore',
+    'issues': '', 'activity': 'Moderately active', 'style': [], 'dislikes': '', 'medical': '',
+    'add_cardio': 'No', 'add_abs': 'No'
+}
+
+NUMERIC_FIELDS = {'age': int, 'days': int, 'height': float, 'weight': float}
+
+
+def _complete_profile(values: Dict[str, Any]) -> Dict[str, Any]:
+    profile = dict(DEFAULT_PROFILE)
+    for field, value in values.items():
+        if field not in DEFAULT_PROFILE or value is None or value == "":
+            continue
+        if field in NUMERIC_FIELDS:
+            value = NUMERIC_FIELDS[field](value)
+        elif field == 'style' and isinstance(value, str):
+            value = [style.strip() for style in value.split(";") if style.strip()]
+        profile[field] = value
+    return profile
+
+
+def read_submissions(paths: List[str], sessions_db: str = None) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """Yield (user_data, count) from JSONL logs, CSV frequency lists and the session store."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if path.endswith(".csv"):
+                for row in csv.DictReader(f):
+                    yield _complete_profile(row), int(row.get('count') or 1)
+            else:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    yield _complete_profile(record.get('user_data', record)), int(record.get('count') or 1)
+    if sessions_db:
+        from session_store import SQLiteSessionStore
+
+        for session_data in SQLiteSessionStore(sessions_db, sweep_interval=0).iter_sessions():
+            if session_data.get('user_data'):
+                yield _complete_profile(session_data['user_data']), 1
+
+
+def rank_buckets(submissions) -> List[Dict[str, Any]]:
+    """Group submissions by profile bucket, most frequent first.
+
+    Each entry has the bucket's label, submission count, skeleton cache key and one
+    submission to generate the skeleton from (any member gives the same skeleton prompt).
+    """
+    buckets = OrderedDict()
+    for user_data, count in submissions:
+        bucket = profile_bucket(user_data)
+        key = skeleton_cache_key(bucket, PROMPT_TEMPLATE_VERSION, MODEL_NAME)
+        entry = buckets.get(key)
+        if entry is None:
+            entry = buckets[key] = {'label': bucket_label(bucket), 'count': 0, 'key': key, 'user_data': user_data}
+        entry['count'] += count
+    return sorted(buckets.values(), key=lambda entry: entry['count'], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate plan skeletons for the most common profile buckets")
+    parser.add_argument("inputs", nargs="*", help="JSONL submission logs and/or CSV frequency lists")
+    parser.add_argument("--sessions", help="Also count submissions from this session store (SQLite)")
+    parser.add_argument("--top", type=int, default=50, help="How many of the most common buckets to warm")
+    parser.add_argument("--concurrency", type=int, default=4, help="Skeletons generated at the same time")
+    parser.add_argument("--cache-dir", default=SKELETON_CACHE_DIR,
+                        help="Skeleton cache directory (default: FITKIT_SKELETON_CACHE_DIR)")
+    parser.add_argument("--dry-run", action="store_true", help="Only show which buckets would be generated")
+    args = parser.parse_args()
+
+    if not args.inputs and not args.sessions:
+        parser.error("give at least one input file or --sessions")
+    if not args.cache_dir:
+        parser.error("set --cache-dir or FITKIT_SKELETON_CACHE_DIR - the app reads pre-warmed skeletons from disk")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key and not args.dry_run:
+        parser.error("OPENAI_API_KEY is not set")
+
+    ranked = rank_buckets(read_submissions(args.inputs, args.sessions))
+    total = sum(entry['count'] for entry in ranked)
+    selected = ranked[:args.top]
+    covered = sum(entry['count'] for entry in selected)
+    print(f"{total} submissions in {len(ranked)} buckets; top {len(selected)} cover "
+          f"{covered / total:.0%} of submissions" if total else "No submissions found")
+
+    skeleton_cache = PlanCache(SKELETON_CACHE_SIZE, SKELETON_CACHE_TTL, args.cache_dir)
+    # Finished buckets are on disk already - that is the checkpoint a rerun resumes from
+    pending = [entry for entry in selected if skeleton_cache.get(entry['key']) is None]
+    print(f"{len(selected) - len(pending)} already cached, {len(pending)} to generate")
+    if args.dry_run:
+        for entry in pending:
+            print(f"  {entry['count']:6d}  {entry['label']}")
+        return
+    if not pending:
+        return
+
+    failures = 0
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {executor.submit(warm_skeleton, entry['user_data'], api_key, skeleton_cache): entry
+                   for entry in pending}
+        for future in as_completed(futures):
+            entry = futures[future]
+            done += 1
+            try:
+                generated = future.result()
+                outcome = "generated" if generated else "already cached"
+            except Exception as e:
+                failures += 1
+                outcome = f"FAILED: {e}"
+            print(f"[{done}/{len(pending)}] {entry['label']} ({entry['count']} submissions): {outcome}")
+
+    elapsed = time.perf_counter() - started
+    print(f"Finished in {elapsed:.1f}s: {len(pending) - failures} warmed, {failures} failed"
+          + (" - run again to retry the failed buckets" if failures else ""))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+from typing import Dict, Any, List, Optional
+
+from nutrition import get_nutrition_profile
+from token_budget import ADAPTIVE_BUDGETS, SKELETON_SECTION_KEYS, request_budget, section_word_targets
+
+# Bump whenever the prompt text changes so cached plans generated from an older prompt are not served
+PROMPT_TEMPLATE_VERSION = "5"
+
+SYSTEM_PROMPT = "You are an elite fitness and transformation coach with expertise in exercise science, nutrition, psychology, and behavioral change. You combine the knowledge of a certified personal trainer, sports nutritionist, sports psychologist, and lifestyle coach. Your goal is to create comprehensive, life-changing transformation guides that address every aspect of health and fitness. Always prioritize safety, evidence-based practices, and long-term sustainability while delivering maximum value and actionable insights."
+
+# Sections of the plan in document order: (key, title, max completion tokens when generated alone with
+# FITKIT_ADAPTIVE_BUDGETS=0 - otherwise token_budget.py sizes each section from the intake)
+PLAN_SECTIONS = [
+    ('greeting', 'Welcome', 600),
+    ('workout', '7-Day Workout Plan', 4000),
+    ('nutrition', '7-Day Nutrition Plan', 3500),
+    ('progression', '4-Week Progression System', 1500),
+    ('lifestyle', 'Lifestyle Optimization', 1500),
+    ('psychology', 'Psychological Mastery', 1500),
+    ('safety', 'Safety & Modifications', 800)
+]
+
+# Everything above the USER PROFILE is static: identical bytes for every user, so the
+# provider's prompt cache can reuse the prefix (system message + instructions) across requests.
+# Never interpolate user data into these constants - it goes in _profile_block at the end.
+
+GREETING_INSTRUCTIONS = """
+    CRITICAL: Start your response with a warm, personal welcome greeting that:
+    - Addresses the user by name (see USER PROFILE)
+    - Acknowledges their specific primary goal
+    - Mentions this plan was created specifically for them
+    - Briefly explains what their personalized plan includes
+    - Sets an encouraging, motivational tone
+    - Transitions smoothly into the detailed plan sections
+"""
+
+SECTION_INSTRUCTIONS = {
+    'workout': """
+    1. COMPLETE 7-DAY WORKOUT PLAN:
+       - MANDATORY: Provide a full week (7 days) of workouts with specific training for each day
+       - CRITICAL: Design all workouts based on the preferred training environment (see USER PROFILE)
+         * If "Gym": Include gym equipment (barbells, dumbbells, machines, cables, etc.)
+         * If "Home": Focus on bodyweight, resistance bands, and minimal equipment exercises
+         * If "Both": Provide alternatives for both gym and home settings
+       - ESSENTIAL: Tailor the entire program to match the specified training style preferences (see USER PROFILE)
+         * If "Bodybuilder (hypertrophy)": Focus on muscle isolation, higher volume, moderate weights, shorter rest
+         * If "Powerlifter (strength)": Emphasize compound movements, heavy weights, lower reps, longer rest
+         * If "CrossFit / functional fitness": Include varied movements, circuits, metabolic conditioning
+         * If "Science-based / periodized": Use evidence-based programming with planned progression
+         * If "Calisthenics / street workout": Focus on bodyweight progressions and skill development
+         * If "Endurance / hybrid": Combine strength training with cardiovascular conditioning
+         * If multiple styles selected: Blend approaches intelligently throughout the week
+       - For each workout day, include:
+         * Complete exercise list with EXACT sets, reps, and rest periods (e.g., "3 sets x 8-10 reps, 90 seconds rest")
+         * Number of exercises should be based on user's training experience (see USER PROFILE)
+         * Specific weight/intensity recommendations when applicable
+         * Exercise alternatives based on environment preference
+         * Training style-specific techniques and methods
+         * Detailed warm-up routine (5-10 minutes) tailored to the workout style
+         * CARDIO INTEGRATION: Only if the profile says Add Cardio: Yes - add 10-30 minutes of cardio to each workout day based on their primary goal. Fat loss goals get more cardio (20-30 min), muscle building gets less (10-15 min). Include specific cardio exercises and intensity. If No, add no additional cardio.
+         * AB CIRCUIT INTEGRATION: Only if the profile says Add Ab Circuit: Yes - add a 5-minute bodyweight ab routine to finish each workout. Include 4-5 ab exercises with specific sets/reps (e.g., planks, crunches, bicycle crunches, leg raises, mountain climbers). If No, add no ab circuit.
+         * Cool-down and stretching routine (5-10 minutes)
+       - For rest days, include active recovery activities that complement the training style
+       - Weekly training split with specific muscle groups/focus for each day aligned with chosen style
+       - Progression guidelines over 4-8 weeks specific to the training methodology
+       - Exercise form cues and safety tips for each movement, emphasizing style-specific techniques
+""",
+    'nutrition': """
+    2. COMPLETE 7-DAY NUTRITION PLAN:
+       - MANDATORY: Provide a full week (7 days) of clean eating meal plans
+       - For each day, include:
+         * Breakfast with exact foods and portions to hit macro targets
+         * Mid-morning snack (if needed)
+         * Lunch with exact foods and portions
+         * Afternoon snack (if needed)
+         * Dinner with exact foods and portions
+         * Evening snack (if needed for goals)
+         * Pre/post workout nutrition for training days
+       - Each meal should specify:
+         * Exact food items and quantities
+         * Approximate calories and macros (protein/carbs/fats)
+         * Preparation method when relevant
+       - Meal timing strategy aligned with workout schedule
+       - Hydration guidelines throughout each day
+       - Supplement recommendations with timing
+       - Meal prep tips and grocery list suggestions
+       - Clean eating focus with whole, unprocessed foods
+""",
+    'progression': """
+    3. COMPREHENSIVE PROGRESSION SYSTEM:
+       - MANDATORY: Provide detailed 4-week progression plan with specific weekly adjustments
+       - Week 1-2: Foundation phase with exact rep/weight increases
+       - Week 3-4: Intensification phase with advanced techniques
+       - Progressive overload strategies (weight, reps, sets, tempo, rest periods)
+       - Deload week planning and implementation
+       - How to transition to intermediate/advanced programming
+       - Plateau-breaking techniques and troubleshooting
+       - Performance benchmarks and testing protocols
+       - Auto-regulation methods for adjusting intensity based on daily readiness
+""",
+    'lifestyle': """
+    4. COMPLETE LIFESTYLE OPTIMIZATION:
+       - MANDATORY: Comprehensive lifestyle integration covering all aspects of health
+       - Sleep optimization: 
+         * Ideal sleep duration and timing for recovery
+         * Sleep hygiene protocols and bedroom environment setup
+         * Pre-sleep routines and supplement timing
+         * How to optimize sleep for workout recovery
+       - Stress management mastery:
+         * Daily stress reduction techniques (breathing, meditation, journaling)
+         * Workout stress vs life stress management
+         * Cortisol optimization strategies
+         * Time management for consistent training
+       - Recovery protocols:
+         * Active recovery activities for rest days
+         * Post-workout recovery routines
+         * Weekly recovery assessments
+         * Mobility and flexibility programming
+       - Social and environmental factors:
+         * How to maintain consistency during travel
+         * Social eating and training strategies
+         * Creating supportive environments
+         * Meal prep and planning systems
+       - Energy and productivity optimization:
+         * Pre-workout nutrition timing and choices
+         * Post-workout recovery nutrition
+         * Daily energy management around training
+         * Supplement timing for performance and recovery
+""",
+    'psychology': """
+    5. PSYCHOLOGICAL MASTERY & MINDSET:
+       - MANDATORY: Comprehensive psychological framework for long-term success
+       - Motivation and habit formation:
+         * Science-based habit stacking techniques
+         * Intrinsic vs extrinsic motivation strategies
+         * Building identity-based habits ("I am someone who...")
+         * Overcoming motivation dips and maintaining consistency
+       - Goal setting and achievement psychology:
+         * SMART goal framework with fitness-specific applications
+         * Process goals vs outcome goals
+         * Celebrating small wins and milestone rewards
+         * Vision boarding and long-term goal visualization
+       - Mental resilience and confidence building:
+         * Overcoming gym intimidation and social anxiety
+         * Building body confidence throughout the transformation
+         * Dealing with plateaus and temporary setbacks
+         * Positive self-talk and internal dialogue management
+       - Behavioral psychology applications:
+         * Understanding your personal triggers and patterns
+         * Environmental design for automatic healthy choices
+         * Social accountability and support system building
+         * Cognitive reframing for challenges and obstacles
+       - Performance psychology:
+         * Pre-workout mental preparation routines
+         * Mind-muscle connection techniques
+         * Visualization for better form and performance
+         * Managing perfectionism and all-or-nothing thinking
+""",
+    'safety': """
+    6. SAFETY & MODIFICATIONS:
+       - Exercise modifications for any mentioned limitations
+       - Warning signs to watch for
+       - When to rest or deload
+       - Injury prevention strategies
+       - Form cues and safety protocols
+"""
+}
+
+CRITICAL_REQUIREMENTS = """
+    CRITICAL REQUIREMENTS:
+    - You MUST provide a complete 7-day workout schedule with every single exercise, set, rep, and rest period specified
+    - You MUST tailor the entire workout program to match the specified training style preferences (see USER PROFILE)
+    - You MUST provide a complete 7-day meal plan with every meal and snack detailed with exact foods and portions
+    - You MUST include a detailed 4-week progression plan with specific weekly adjustments and techniques
+    - You MUST provide comprehensive lifestyle optimization covering sleep, stress, recovery, and social factors
+    - You MUST include an extensive psychological mastery section with motivation, mindset, and behavioral strategies
+    - The training style preferences are PARAMOUNT - every workout should reflect the chosen methodology
+    - Use the calculated nutrition targets as the foundation for all nutrition recommendations
+    - Format the response with clear headers, bullet points, and practical actionable advice
+    - Ensure the meal plans hit the daily calorie and macro targets within 5-10% accuracy
+    - Make every section comprehensive and actionable - this should be a complete transformation guide
+    - Include specific techniques, protocols, and step-by-step instructions for maximum value
+"""
+
+SECTION_REQUIREMENTS = """
+    CRITICAL REQUIREMENTS:
+    - Write ONLY this section, but make it comprehensive and actionable
+    - The training style preferences (see USER PROFILE) are PARAMOUNT
+    - Use the calculated nutrition targets as the foundation for all nutrition recommendations
+    - Format the response with clear headers, bullet points, and practical actionable advice
+"""
+
+# Markdown layout the plan parser (plan_schema.py) relies on
+OUTPUT_FORMAT = """
+    OUTPUT FORMAT (your plan is split into days, exercises and meals automatically - follow this layout exactly):
+    - Start each main section with a level-2 header, e.g. "## 1. Complete 7-Day Workout Plan"
+    - Start each day with a level-3 header "### Day N: <focus>", e.g. "### Day 1: Upper Body Strength"
+    - Put each exercise on its own line as "- <Exercise>: <sets> x <reps>, <rest> rest", e.g. "- Barbell Bench Press: 4 x 8-10, 90 seconds rest"
+    - Put each meal on its own line as "- **<Meal>:** <foods and portions> (~<kcal> kcal, <P>g protein, <C>g carbs, <F>g fat)"
+"""
+
+# Static prefix of the full-plan prompt
+PLAN_PROMPT_PREFIX = (
+    "\n    Create a comprehensive, personalized workout and nutrition plan for the user described in the USER PROFILE at the end of this message.\n"
+    + GREETING_INSTRUCTIONS
+    + "\n    Please provide a detailed plan that includes:\n"
+    + "".join(SECTION_INSTRUCTIONS[key] for key, _, _ in PLAN_SECTIONS if key in SECTION_INSTRUCTIONS)
+    + CRITICAL_REQUIREMENTS
+    + OUTPUT_FORMAT
+)
+
+def _section_prompt_prefix(key: str, title: str) -> str:
+    if key == 'greeting':
+        instructions = GREETING_INSTRUCTIONS.replace(
+            "CRITICAL: Start your response with a warm, personal welcome greeting that:",
+            "Write ONLY a warm, personal welcome greeting (2-3 short paragraphs) that:"
+        )
+    else:
+        instructions = SECTION_INSTRUCTIONS[key]
+    return (
+        f"\n    You are writing ONE section (\"{title}\") of a comprehensive, personalized workout and nutrition plan"
+        " for the user described in the USER PROFILE at the end of this message."
+        "\n    Other sections are written separately - do not repeat them, do not add a greeting or closing remarks,"
+        "\n    and start directly with this section's markdown header.\n"
+        + instructions
+        + SECTION_REQUIREMENTS
+        + OUTPUT_FORMAT
+    )
+
+# Static prefix of each per-section prompt, keyed like PLAN_SECTIONS
+SECTION_PROMPT_PREFIXES = {key: _section_prompt_prefix(key, title) for key, title, _ in PLAN_SECTIONS}
+
+# Skeleton reuse (plan_buckets.py): a template plan per profile bucket plus a short personal pass
+SKELETON_INSTRUCTIONS = """
+    This plan is a TEMPLATE shared by every user in the profile group described in the USER PROFILE.
+    A separate pass adds the greeting, each user's exact calorie and macro targets and their injury,
+    allergy and food adjustments, so:
+    - Do NOT write a greeting or address anyone by name - start directly with the workout section header
+    - Write every meal for the group's nutrition targets; portions are scaled to each user afterwards
+    - Keep the Safety & Modifications section general
+"""
+
+# Static prefix of the skeleton prompt
+SKELETON_PROMPT_PREFIX = (
+    "\n    Create a comprehensive workout and nutrition plan template for the group of users described in the USER PROFILE at the end of this message.\n"
+    + SKELETON_INSTRUCTIONS
+    + "\n    Please provide a detailed plan that includes:\n"
+    + "".join(SECTION_INSTRUCTIONS[key] for key, _, _ in PLAN_SECTIONS if key in SECTION_INSTRUCTIONS)
+    + CRITICAL_REQUIREMENTS
+    + OUTPUT_FORMAT
+)
+
+# Static prefix of the personalization prompt (the text that goes above a reused skeleton)
+PERSONALIZATION_PROMPT_PREFIX = (
+    "\n    A complete workout and nutrition plan TEMPLATE has already been written for the profile group of the user"
+    " described in the USER PROFILE at the end of this message (see TEMPLATE PLAN). Your text is placed directly"
+    " above that template - do not repeat or rewrite it. Write ONLY:\n"
+    + GREETING_INSTRUCTIONS.replace(
+        "CRITICAL: Start your response with a warm, personal welcome greeting that:",
+        "1. A warm, personal welcome greeting (2-3 short paragraphs) that:"
+    )
+    + """
+    2. A section with the header "## Your Personal Adjustments" containing:
+       - Their exact daily calorie and macro targets (see CALCULATED NUTRITION TARGETS) and how to scale the
+         template's meal portions to hit them, using the portion factor from the TEMPLATE PLAN
+       - Exercise substitutions and precautions for their allergies/injuries and medical conditions, naming the
+         template exercises they replace (skip this if none are specified)
+       - Food swaps for their allergies and food dislikes (skip this if none are specified)
+
+    Keep the whole response under 600 words.
+"""
+)
+
+def _bucket_block(bucket: Dict[str, Any]) -> str:
+    """Profile-group variables for a skeleton prompt - ranges instead of one user's exact values."""
+    training_styles = ", ".join(bucket['style']) if bucket['style'] else "No specific style"
+    return f"""
+    USER PROFILE (a group of similar users - do not invent personal details):
+    PERSONAL INFO:
+    - Age: {bucket['age_band']}
+    - Sex: {bucket['sex']}
+    - Weight: {bucket['weight_band']}
+
+    FITNESS GOALS & EXPERIENCE:
+    - Primary Goal: {bucket['goal']}
+    - Training Experience: {bucket['level']}
+    - Training Days per Week: {bucket['days']}
+    - Activity Level: {bucket['activity']}
+    - Add Cardio: {bucket['add_cardio']}
+    - Add Ab Circuit: {bucket['add_abs']}
+
+    CALCULATED NUTRITION TARGETS (group average):
+    - Target Daily Calories: {bucket['target_calories']} calories
+    - Target Protein: {bucket['protein_grams']}g
+    - Target Carbohydrates: {bucket['carb_grams']}g
+    - Target Fat: {bucket['fat_grams']}g
+
+    TRAINING PREFERENCES:
+    - Preferred Training Environment: {bucket['environment']}
+    - Training Style Preferences: {training_styles}
+    - Diet Style: {bucket['diet']}
+
+    LIMITATIONS & CONSIDERATIONS:
+    - Handled per user in a separate pass - write general guidance only
+"""
+
+def _profile_block(user_data: Dict[str, Any]) -> str:
+    """Per-user variables - always the LAST part of a prompt so the static prefix can be cached."""
+    nutrition_data = get_nutrition_profile(user_data)
+    environment = user_data['environment']
+    training_styles = ", ".join(user_data['style']) if user_data['style'] else "No specific style"
+    return f"""
+    USER PROFILE:
+    PERSONAL INFO:
+    - Name: {user_data['name']}
+    - Age: {user_data['age']}
+    - Sex: {user_data['sex']}
+    - Height: {user_data['height']} {'inches' if user_data['unit'] == 'Imperial' else 'cm'}
+    - Weight: {user_data['weight']} {'lbs' if user_data['unit'] == 'Imperial' else 'kg'}
+
+    FITNESS GOALS & EXPERIENCE:
+    - Primary Goal: {user_data['goal']}
+    - Training Experience: {user_data['level']}
+    - Training Days per Week: {user_data['days']}
+    - Activity Level: {user_data['activity']}
+    - Add Cardio: {user_data['add_cardio']}
+    - Add Ab Circuit: {user_data['add_abs']}
+
+    CALCULATED NUTRITION TARGETS:
+    - BMR (Basal Metabolic Rate): {nutrition_data['bmr']} calories/day
+    - TDEE (Total Daily Energy Expenditure): {nutrition_data['tdee']} calories/day
+    - Target Daily Calories: {nutrition_data['target_calories']} calories
+    - Target Protein: {nutrition_data['protein_grams']}g ({nutrition_data['protein_calories']} calories)
+    - Target Carbohydrates: {nutrition_data['carb_grams']}g ({nutrition_data['carb_calories']} calories)
+    - Target Fats: {nutrition_data['fat_grams']}g ({nutrition_data['fat_calories']} calories)
+
+    TRAINING PREFERENCES:
+    - Preferred Training Environment: {environment}
+    - Training Style Preferences: {training_styles}
+    - Diet Style: {user_data['diet']}
+    - Cardio Addition: {user_data['add_cardio']}
+    - Ab Circuit Addition: {user_data['add_abs']}
+
+    LIMITATIONS & CONSIDERATIONS:
+    - Allergies/Injuries: {user_data['issues'] if user_data['issues'] else 'None specified'}
+    - Food Dislikes: {user_data['dislikes'] if user_data['dislikes'] else 'None specified'}
+    - Medical Conditions: {user_data['medical'] if user_data['medical'] else 'None specified'}
+"""
+
+def _length_block(data: Dict[str, Any], keys) -> str:
+    """Target length per section from the token budget, so sections end before the budget cuts them off."""
+    if not ADAPTIVE_BUDGETS:
+        return ""
+    titles = {key: title for key, title, _ in PLAN_SECTIONS}
+    targets = "".join(f"    - {titles[key]}: about {words} words\n" for key, words in section_word_targets(data, keys).items())
+    return f"""
+    LENGTH BUDGET (finish every section within its target - longer output is cut off):
+{targets}"""
+
+def create_workout_prompt(user_data: Dict[str, Any]) -> str:
+    """Create a structured prompt for OpenAI based on user input.
+    
+    The prompt is PLAN_PROMPT_PREFIX (identical for every user) followed by the user profile
+    and the per-section length targets.
+    """
+    return PLAN_PROMPT_PREFIX + _profile_block(user_data) + _length_block(user_data, [key for key, _, _ in PLAN_SECTIONS])
+
+def create_section_prompts(user_data: Dict[str, Any]) -> list:
+    """Split the plan into independent per-section prompts for parallel generation.
+    
+    Returns (key, title, max_tokens, prompt) tuples in document order. Each prompt is the
+    section's static prefix followed by the full profile, so sections can be generated
+    without seeing each other; max_tokens is the section's adaptive budget (or its fixed
+    limit from PLAN_SECTIONS with FITKIT_ADAPTIVE_BUDGETS=0).
+    """
+    profile = _profile_block(user_data)
+    return [
+        (key, title, request_budget(user_data, (key,)) if ADAPTIVE_BUDGETS else max_tokens,
+         SECTION_PROMPT_PREFIXES[key] + profile + _length_block(user_data, (key,)))
+        for key, title, max_tokens in PLAN_SECTIONS
+    ]
+
+def create_skeleton_prompt(bucket: Dict[str, Any]) -> str:
+    """Create the prompt for a profile bucket's shared plan skeleton (see plan_buckets.profile_bucket)."""
+    return SKELETON_PROMPT_PREFIX + _bucket_block(bucket) + _length_block(bucket, SKELETON_SECTION_KEYS)
+
+def create_personalization_prompt(user_data: Dict[str, Any], bucket: Dict[str, Any], portion_factor: float,
+                                  exercises: Optional[List[str]] = None) -> str:
+    """Create the short prompt for the user-specific text placed above a reused skeleton.
+    
+    exercises lists the skeleton's exercise names when it is already known, so injury
+    substitutions can name what they replace.
+    """
+    exercise_list = ", ".join(exercises) if exercises else "Not available - give substitutions by movement pattern"
+    template_block = f"""
+    TEMPLATE PLAN:
+    - Template daily targets: {bucket['target_calories']} calories, {bucket['protein_grams']}g protein, {bucket['carb_grams']}g carbs, {bucket['fat_grams']}g fat
+    - Portion factor for this user: {portion_factor:.2f} (multiply every template meal portion by this)
+    - Template exercises: {exercise_list}
+"""
+    return PERSONALIZATION_PROMPT_PREFIX + template_block + _profile_block(user_data)
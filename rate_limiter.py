@@ -0,0 +1,220 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+
+# OpenAI quota and admission settings - override with environment variables
+RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("FITKIT_MAX_CONCURRENT_GENERATIONS", "8"))
+MAX_QUEUE_LENGTH = int(os.getenv("FITKIT_MAX_QUEUE_LENGTH", "200"))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("FITKIT_MAX_QUEUE_WAIT_SECONDS", "300"))
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("FITKIT_MAX_RATE_LIMIT_RETRIES", "4"))
+
+# Buckets hold at most this fraction of a minute's quota, so bursts can't drain a whole minute at once
+BURST_FRACTION = 1 / 6
+
+
+class QueueFullError(Exception):
+    """Raised when the admission queue is full or a request waited too long."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate units per second."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, per_minute * BURST_FRACTION)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # Oversized requests only need a full bucket
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Admission:
+    """A granted slot; release it (or use it as a context manager) when the generation ends."""
+
+    def __init__(self, scheduler, requests: int, tokens: int, waited: float):
+        self.scheduler = scheduler
+        self.requests = requests
+        self.tokens = tokens
+        self.waited = waited
+        self._released = False
+
+    def release(self, actual_tokens: Optional[int] = None) -> None:
+        if not self._released:
+            self._released = True
+            self.scheduler._release(self, actual_tokens)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class AdmissionScheduler:
+    """Shared FIFO admission control for OpenAI requests across all Streamlit sessions.
+
+    A request is admitted only when it is at the head of the queue, a concurrency slot is
+    free, and both the requests-per-minute and tokens-per-minute buckets can cover it.
+    A 429 pauses admissions for the server's retry-after, so the whole app backs off
+    together instead of every session hammering the API with retries.
+    """
+
+    def __init__(self, rpm: int = RPM_LIMIT, tpm: int = TPM_LIMIT,
+                 max_concurrent: int = MAX_CONCURRENT_GENERATIONS, max_queue: int = MAX_QUEUE_LENGTH):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._request_bucket = TokenBucket(rpm)
+        self._token_bucket = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._active = 0
+        self._paused_until = 0.0
+        self._stats = {
+            'admitted': 0,
+            'rejected': 0,
+            'rate_limited': 0,
+            'max_queue_depth': 0,
+            'total_wait_seconds': 0.0
+        }
+
+    def acquire(self, tokens: int, requests: int = 1,
+                on_wait: Optional[Callable[[int, float], None]] = None,
+                timeout: float = MAX_QUEUE_WAIT_SECONDS) -> Admission:
+        """Block until admitted. on_wait(position, eta_seconds) is called whenever the
+        caller's queue position changes (and about once a second while waiting)."""
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise QueueFullError("Too many plans are being generated right now")
+            self._queue.append(ticket)
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._admission_wait(ticket, tokens, requests, now)
+                    if wait == 0.0:
+                        self._queue.popleft()
+                        self._request_bucket.take(requests, now)
+                        self._token_bucket.take(tokens, now)
+                        self._active += 1
+                        waited = now - started
+                        self._stats['admitted'] += 1
+                        self._stats['total_wait_seconds'] += waited
+                        self._cond.notify_all()
+                        return Admission(self, requests, tokens, waited)
+                    if now - started > timeout:
+                        self._stats['rejected'] += 1
+                        raise QueueFullError("Timed out waiting for a generation slot")
+                    position = self._queue.index(ticket) + 1
+
+                # Report progress outside the lock - callbacks may touch the UI
+                if on_wait:
+                    on_wait(position, wait)
+
+                with self._cond:
+                    self._cond.wait(timeout=min(wait, 1.0) if wait > 0 else 1.0)
+        except BaseException:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+            raise
+
+    def _admission_wait(self, ticket, tokens: int, requests: int, now: float) -> float:
+        # Caller must hold the lock. Returns 0.0 when the ticket can be admitted right now,
+        # otherwise a rough estimate of how long until it might be (-1 if unknown).
+        if self._queue[0] is not ticket or self._active >= self.max_concurrent:
+            return -1.0
+        if now < self._paused_until:
+            return self._paused_until - now
+        return max(self._request_bucket.wait_time(requests, now), self._token_bucket.wait_time(tokens, now))
+
+    def _release(self, admission: Admission, actual_tokens: Optional[int]) -> None:
+        with self._cond:
+            self._active -= 1
+            if actual_tokens is not None and actual_tokens < admission.tokens:
+                # Refund what the estimate over-reserved
+                self._token_bucket.give_back(admission.tokens - actual_tokens, time.monotonic())
+            self._cond.notify_all()
+
+    def backoff(self, retry_after: float) -> None:
+        """Pause all admissions after a 429, honouring the server's retry-after."""
+        with self._cond:
+            self._stats['rate_limited'] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            # The quota is evidently used up - drain the buckets so we don't burst right back
+            self._request_bucket.level = 0.0
+            self._token_bucket.level = 0.0
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._queue)
+            stats['active'] = self._active
+            stats['paused_for_seconds'] = round(max(0.0, self._paused_until - time.monotonic()), 1)
+        stats['total_wait_seconds'] = round(stats['total_wait_seconds'], 2)
+        return stats
+
+
+def retry_after_seconds(error: Exception, attempt: int) -> float:
+    """Read retry-after from a 429 response, falling back to jittered exponential backoff."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    for header in ('retry-after-ms', 'retry-after'):
+        value = headers.get(header)
+        if value:
+            try:
+                seconds = float(value)
+                return seconds / 1000 if header == 'retry-after-ms' else seconds
+            except ValueError:
+                pass
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> AdmissionScheduler:
+    """Return the process-wide admission scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AdmissionScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler: AdmissionScheduler) -> None:
+    """Replace the process-wide scheduler, e.g. with a share of the limits in one of several worker processes."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+from jsonbin_client import get_jsonbin_client
+
+try:
+    import fcntl  # Cross-process locking on POSIX; threads-only locking elsewhere
+except ImportError:
+    fcntl = None
+
+# Review log settings - override with environment variables
+REVIEW_LOG_DIR = os.getenv("FITKIT_REVIEW_LOG_DIR", os.path.join(".fitkit", "reviews"))
+SEGMENT_MAX_RECORDS = int(os.getenv("FITKIT_REVIEW_SEGMENT_SIZE", "1000"))
+FLUSH_BATCH_SIZE = int(os.getenv("FITKIT_REVIEW_FLUSH_BATCH", "20"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("FITKIT_REVIEW_FLUSH_INTERVAL", "30"))
+REMOTE_TIMEOUT_SECONDS = float(os.getenv("FITKIT_REVIEW_REMOTE_TIMEOUT", "10"))
+# A claimed batch not committed within this long (flusher crashed mid-upload) can be claimed again
+CLAIM_LEASE_SECONDS = REMOTE_TIMEOUT_SECONDS * 3
+
+
+class ReviewLog:
+    """Append-only review store: local segment files plus small fixed-size pointers.
+
+    Each review is one JSON line appended to the active segment, so a write costs the
+    same no matter how many reviews exist. Segments roll over after SEGMENT_MAX_RECORDS.
+    An append touches only the active segment and active.json (the active segment's
+    name and counts - constant size). Everything that grows is append-only and written off
+    the append path: segments.jsonl gets one line per finished segment at rollover, and
+    shards.jsonl one line per remote shard. The flush cursor lives in its own constant-size
+    flush.json. Appends hold an exclusive file lock, so concurrent reviewers across threads
+    and processes never overwrite each other.
+
+    If a remote writer is configured, a background thread ships unflushed reviews in
+    batches: each batch becomes its own shard (e.g. a new JSONBin bin), never a
+    read-modify-write of one big array.
+    """
+
+    def __init__(self, directory: str = REVIEW_LOG_DIR, segment_max_records: int = SEGMENT_MAX_RECORDS,
+                 flush_batch_size: int = FLUSH_BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.directory = directory
+        self.segment_max_records = segment_max_records
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval = flush_interval
+        self._active_path = os.path.join(directory, "active.json")
+        self._segments_path = os.path.join(directory, "segments.jsonl")
+        self._cursor_path = os.path.join(directory, "flush.json")
+        self._shards_path = os.path.join(directory, "shards.jsonl")
+        self._lock_path = os.path.join(directory, "index.lock")
+        self._thread_lock = threading.RLock()
+        self._remote = None  # remote(reviews, shard_number) -> shard id; raises on failure
+        self._flush_wakeup = threading.Event()
+        self._flusher = None
+        self._stats = {'appended': 0, 'flushed': 0, 'shards': 0, 'flush_errors': 0}
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self._migrate_index()
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            with open(self._lock_path, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_json(self, path: str, default: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict(default)
+
+    def _write_json(self, path: str, data: Dict[str, Any]) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)  # Atomic - readers never see a torn file
+
+    def _append_line(self, path: str, record: Dict[str, Any]) -> None:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _read_lines(self, path: str) -> List[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.endswith("\n")]  # Skip a torn last line
+        except OSError:
+            return []
+
+    def _read_active(self) -> Dict[str, Any]:
+        return self._read_json(self._active_path, {'number': 0, 'name': None, 'records': 0, 'bytes': 0, 'total': 0})
+
+    def _read_cursor(self) -> Dict[str, Any]:
+        # Next unflushed review: segment number, byte offset and record number within it
+        return self._read_json(self._cursor_path, {'segment': 1, 'offset': 0, 'record': 0, 'flushed': 0, 'shards': 0})
+
+    def _segments(self) -> List[Dict[str, Any]]:
+        """Finished segments plus the active one, in order."""
+        active = self._read_active()
+        return self._read_lines(self._segments_path) + ([active] if active['name'] else [])
+
+    def _migrate_index(self) -> None:
+        """Convert the single index.json of earlier versions (rewritten on every append) to the split files."""
+        index_path = os.path.join(self.directory, "index.json")
+        if not os.path.exists(index_path) or os.path.exists(self._active_path):
+            return
+        index = self._read_json(index_path, {'segments': [], 'shards': []})
+        segments = [{'number': number, 'name': segment['name'], 'records': segment['records'], 'bytes': segment['bytes']}
+                    for number, segment in enumerate(index['segments'], start=1)]
+        for segment in segments[:-1]:
+            self._append_line(self._segments_path, segment)
+        for shard in index.get('shards', []):
+            self._append_line(self._shards_path, shard)
+        cursor = {'segment': 1, 'offset': 0, 'record': 0,
+                  'flushed': sum(s['flushed_records'] for s in index['segments']), 'shards': len(index.get('shards', []))}
+        for number, segment in enumerate(index['segments'], start=1):
+            # First segment with unflushed reviews, or the end of the last one if everything was shipped
+            cursor.update(segment=number, offset=segment['flushed_bytes'], record=segment['flushed_records'])
+            if segment['flushed_records'] < segment['records']:
+                break
+        self._write_json(self._cursor_path, cursor)
+        if segments:
+            self._write_json(self._active_path, dict(segments[-1], total=sum(s['records'] for s in segments)))
+        os.replace(index_path, index_path + ".migrated")
+
+    def append(self, review: Dict[str, Any]) -> Dict[str, Any]:
+        """Append one review and return its location ({'segment', 'record'})."""
+        line = (json.dumps(review, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._locked():
+            active = self._read_active()
+            if not active['name'] or active['records'] >= self.segment_max_records:
+                if active['name']:
+                    self._append_line(self._segments_path, {key: active[key] for key in ('number', 'name', 'records', 'bytes')})
+                number = active['number'] + 1
+                active.update(number=number, name=f"segment-{number:06d}.jsonl", records=0, bytes=0)
+            with open(os.path.join(self.directory, active['name']), "ab") as f:
+                f.write(line)
+            active['records'] += 1
+            active['bytes'] += len(line)
+            active['total'] += 1
+            self._write_json(self._active_path, active)
+            location = {'segment': active['name'], 'record': active['records'] - 1}
+            self._stats['appended'] += 1
+
+        if self._remote and active['total'] % self.flush_batch_size == 0:
+            self._flush_wakeup.set()  # A batch's worth has piled up since the last multiple - the timer catches the rest
+        return location
+
+    def iter_reviews(self) -> Iterator[Dict[str, Any]]:
+        """Yield every stored review in append order."""
+        with self._locked():
+            segments = self._segments()
+        for segment in segments:
+            with open(os.path.join(self.directory, segment['name']), "rb") as f:
+                data = f.read(segment['bytes'])  # Ignore any bytes past the recorded end
+            for line in data.splitlines():
+                if line:
+                    yield json.loads(line)
+
+    def set_remote(self, remote: Callable[[List[Dict[str, Any]], int], Any]) -> None:
+        """Enable background batched flushes through remote(reviews, shard_number)."""
+        with self._thread_lock:
+            self._remote = remote
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="review-flusher", daemon=True)
+                self._flusher.start()
+        self._flush_wakeup.set()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_wakeup.wait(self.flush_interval)
+            self._flush_wakeup.clear()
+            try:
+                while self.flush() >= self.flush_batch_size:
+                    pass  # Keep draining full batches
+            except Exception:
+                self._stats['flush_errors'] += 1
+                time.sleep(min(self.flush_interval, 5.0))
+
+    def _read_batch(self, cursor: Dict[str, Any]):
+        """Up to flush_batch_size unflushed reviews from the cursor on, and the cursor just past them."""
+        segments = {segment['number']: segment for segment in self._segments()}
+        batch = []
+        cursor = dict(cursor)
+        while len(batch) < self.flush_batch_size and cursor['segment'] in segments:
+            segment = segments[cursor['segment']]
+            if cursor['offset'] >= segment['bytes']:
+                if cursor['segment'] + 1 not in segments:
+                    break  # Caught up with the active segment
+                cursor.update(segment=cursor['segment'] + 1, offset=0, record=0)
+                continue
+            with open(os.path.join(self.directory, segment['name']), "rb") as f:
+                f.seek(cursor['offset'])
+                data = f.read(segment['bytes'] - cursor['offset'])
+            for line in data.splitlines(keepends=True):
+                if len(batch) >= self.flush_batch_size:
+                    break
+                batch.append(json.loads(line))
+                cursor['offset'] += len(line)
+                cursor['record'] += 1
+        return batch, cursor
+
+    def flush(self) -> int:
+        """Ship up to one batch of unflushed reviews as a new remote shard. Returns how many were sent.
+
+        The lock is held only to claim the batch and to commit the cursor, never during the
+        remote write, so appends on the request path don't wait on the network. The claim (a
+        lease in flush.json) keeps other flushers off the same reviews until it is committed,
+        released or expired.
+        """
+        if not self._remote:
+            return 0
+        claim_id = uuid.uuid4().hex
+        with self._locked():
+            cursor = self._read_cursor()
+            claim = cursor.get('claim')
+            if claim and claim['expires_at'] > time.time():
+                return 0  # Another flusher is shipping the next batch
+            batch, next_cursor = self._read_batch(cursor)
+            if not batch:
+                return 0
+            shard_number = cursor['shards'] + 1
+            cursor['claim'] = {'id': claim_id, 'expires_at': time.time() + CLAIM_LEASE_SECONDS}
+            self._write_json(self._cursor_path, cursor)
+
+        try:
+            shard_id = self._remote(batch, shard_number)
+        except BaseException:
+            with self._locked():
+                cursor = self._read_cursor()
+                if (cursor.get('claim') or {}).get('id') == claim_id:
+                    cursor.pop('claim')
+                    self._write_json(self._cursor_path, cursor)
+            raise
+
+        with self._locked():
+            cursor = self._read_cursor()
+            if (cursor.get('claim') or {}).get('id') != claim_id:
+                # Our lease expired and another flusher re-shipped the batch - don't move the cursor twice
+                self._stats['flush_errors'] += 1
+                return 0
+            self._append_line(self._shards_path, {'id': shard_id, 'reviews': len(batch), 'flushed_at': time.time()})
+            next_cursor.pop('claim', None)
+            next_cursor.update(flushed=cursor['flushed'] + len(batch), shards=shard_number)
+            self._write_json(self._cursor_path, next_cursor)
+            self._stats['flushed'] += len(batch)
+            self._stats['shards'] += 1
+        return len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._locked():
+            active = self._read_active()
+            cursor = self._read_cursor()
+        stats = dict(self._stats)
+        stats['segments'] = active['number']
+        stats['total_reviews'] = active['total']
+        stats['unflushed'] = active['total'] - cursor['flushed']
+        stats['remote_shards'] = cursor['shards']
+        return stats
+
+
+def jsonbin_shard_writer(master_key: str, collection_id: Optional[str] = None,
+                         timeout: float = REMOTE_TIMEOUT_SECONDS) -> Callable[[List[Dict[str, Any]], int], str]:
+    """Remote writer that stores each batch of reviews as a new JSONBin bin (in the collection if given)."""
+    client = get_jsonbin_client(master_key)
+
+    def write_shard(reviews: List[Dict[str, Any]], shard_number: int) -> str:
+        return client.create_bin({'shard': shard_number, 'reviews': reviews}, name=f"reviews-shard-{shard_number:06d}",
+                                 collection_id=collection_id, deadline=timeout)
+    return write_shard
+
+
+_review_log = None
+_review_log_lock = threading.Lock()
+
+
+def get_review_log() -> ReviewLog:
+    """Return the process-wide review log, creating it on first use."""
+    global _review_log
+    with _review_log_lock:
+        if _review_log is None:
+            _review_log = ReviewLog()
+        return _review_log
@@ -0,0 +1,83 @@
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from streaming import percentile
+
+# Samples kept per scope for the percentiles
+WINDOW = 500
+
+
+class RunTimer:
+    """Server CPU and wall time per Streamlit script run, by scope.
+
+    'app' is a full top-to-bottom script run; fragment scopes are recorded each time the
+    fragment body runs, whether alone (a fragment rerun) or as part of a full run. CPU time
+    is the script thread's own (time.thread_time), so concurrent sessions don't inflate it.
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._samples = {}  # scope -> deque of (cpu_ms, wall_ms)
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def record(self, scope: str, cpu_seconds: float, wall_seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(scope, deque(maxlen=self.window)).append((cpu_seconds * 1000, wall_seconds * 1000))
+            self._runs[scope] = self._runs.get(scope, 0) + 1
+
+    @contextmanager
+    def measure(self, scope: str):
+        cpu_started = time.thread_time()
+        wall_started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Also recorded when the body ends in st.rerun() (which raises)
+            self.record(scope, time.thread_time() - cpu_started, time.perf_counter() - wall_started)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._runs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per scope: run count and CPU/wall milliseconds (p50, p95, mean) over the recent window."""
+        with self._lock:
+            samples = {scope: list(values) for scope, values in self._samples.items()}
+            runs = dict(self._runs)
+        stats = {}
+        for scope, values in samples.items():
+            cpu = sorted(value[0] for value in values)
+            wall = sorted(value[1] for value in values)
+            stats[scope] = {
+                'runs': runs[scope],
+                'cpu_ms_p50': round(percentile(cpu, 50), 2),
+                'cpu_ms_p95': round(percentile(cpu, 95), 2),
+                'cpu_ms_mean': round(sum(cpu) / len(cpu), 2),
+                'wall_ms_p50': round(percentile(wall, 50), 2)
+            }
+        return stats
+
+
+# Process-wide timer shared by every Streamlit session
+_run_timer = RunTimer()
+
+
+def get_run_timer() -> RunTimer:
+    return _run_timer
+
+
+def timed(scope: str):
+    """Decorator recording each call of a fragment function under scope (put it below @st.fragment)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _run_timer.measure(scope):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
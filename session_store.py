@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from jsonbin_client import get_jsonbin_client, DEADLINE_SECONDS
+
+# Session store settings - override with environment variables
+SESSION_DB_PATH = os.getenv("FITKIT_SESSION_DB", os.path.join(".fitkit", "sessions.db"))
+SESSION_TTL_HOURS = float(os.getenv("FITKIT_SESSION_TTL_HOURS", "24"))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("FITKIT_SESSION_SWEEP_INTERVAL", "600"))
+SESSION_COLLECTION_ID = os.getenv("JSONBIN_SESSION_COLLECTION_ID")  # Uncategorized bins unless set
+COMPRESSION_LEVEL = 6
+
+
+def _expires_at_epoch(session_data: Dict[str, Any]) -> float:
+    """Read the session's expires_at (ISO string or epoch seconds), defaulting to now + TTL."""
+    expires_at = session_data.get('expires_at')
+    if isinstance(expires_at, (int, float)):
+        return float(expires_at)
+    if isinstance(expires_at, str):
+        try:
+            return datetime.fromisoformat(expires_at).timestamp()
+        except ValueError:
+            pass
+    return time.time() + SESSION_TTL_HOURS * 3600
+
+
+def session_bin_name(session_id: str) -> str:
+    """The JSONBin bin name a session is saved under, for telling session bins apart in the dashboard."""
+    return f"fitkit-session-{session_id}"
+
+
+class SessionStore(ABC):
+    """Interface for saved-session backends.
+
+    save() stores a session dict (which must contain 'session_id') and returns the key it
+    was stored under; load() returns the session dict, or None if missing or expired.
+    Remote backends need the storage key from save() to find the session again.
+    """
+
+    @abstractmethod
+    def save(self, session_data: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    def load(self, session_id: str, storage_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    def sweep_expired(self) -> int:
+        """Remove expired sessions; returns how many were removed."""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Local session store: one SQLite table in WAL mode with zlib-compressed JSON blobs.
+
+    session_id is the primary key and expires_at is indexed, so restores are a single
+    indexed lookup and the expiry sweep is a range delete. A daemon thread sweeps expired
+    sessions every sweep_interval seconds. Connections are per thread (SQLite objects
+    can't be shared across threads); WAL lets readers proceed while a write is in flight.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, sweep_interval: float = SWEEP_INTERVAL_SECONDS):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'saves': 0, 'loads': 0, 'hits': 0, 'expired': 0, 'swept': 0,
+                       'bytes_raw': 0, 'bytes_stored': 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " data BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+            conn.execute("DROP TABLE IF EXISTS session_keys")  # Former local index of JSONBin bin IDs
+        if sweep_interval > 0:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), name="session-sweeper",
+                             daemon=True).start()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes; fine for 24h sessions
+            self._local.conn = conn
+        return conn
+
+    def save(self, session_data: Dict[str, Any]) -> str:
+        session_id = session_data['session_id']
+        raw = json.dumps(session_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        blob = zlib.compress(raw, COMPRESSION_LEVEL)
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, created_at, expires_at, data) VALUES (?, ?, ?, ?)",
+                (session_id, time.time(), _expires_at_epoch(session_data), blob)
+            )
+        with self._lock:
+            self._stats['saves'] += 1
+            self._stats['bytes_raw'] += len(raw)
+            self._stats['bytes_stored'] += len(blob)
+        return session_id
+
+    def load(self, session_id: str, storage_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT expires_at, data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        with self._lock:
+            self._stats['loads'] += 1
+            if row is None:
+                return None
+            if row[0] <= time.time():
+                self._stats['expired'] += 1  # Left for the sweeper
+                return None
+            self._stats['hits'] += 1
+        return json.loads(zlib.decompress(row[1]))
+
+    def delete(self, session_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def iter_sessions(self):
+        """Yield every stored session (expired ones too, until swept) - for offline jobs such as cache pre-warming."""
+        for (blob,) in self._connection().execute("SELECT data FROM sessions ORDER BY created_at"):
+            yield json.loads(zlib.decompress(blob))
+
+    def sweep_expired(self) -> int:
+        now = time.time()
+        with self._connection() as conn:
+            removed = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+        with self._lock:
+            self._stats['swept'] += removed
+        return removed
+
+    def _sweep_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep_expired()
+            except sqlite3.Error:
+                pass  # Database busy - try again next interval
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['sessions'] = self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        if stats['bytes_raw']:
+            stats['compression_ratio'] = round(stats['bytes_raw'] / stats['bytes_stored'], 2)
+        return stats
+
+
+class JSONBinSessionStore(SessionStore):
+    """Remote session store: one JSONBin bin per saved session; the bin ID is the storage key.
+
+    JSONBin assigns bin IDs and has no lookup by name, so load() needs the bin ID from save() -
+    the app carries it in the Stripe return URL. Bins are still named after the session ID
+    (session_bin_name) so they can be told apart in the JSONBin dashboard.
+    """
+
+    def __init__(self, master_key: str, deadline: float = DEADLINE_SECONDS,
+                 collection_id: Optional[str] = SESSION_COLLECTION_ID):
+        self.client = get_jsonbin_client(master_key)
+        self.deadline = deadline
+        self.collection_id = collection_id
+
+    def save(self, session_data: Dict[str, Any]) -> str:
+        return self.client.create_bin(session_data, name=session_bin_name(session_data['session_id']),
+                                      collection_id=self.collection_id, deadline=self.deadline)
+
+    def load(self, session_id: str, storage_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if not storage_key:
+            return None  # No bin ID - nothing to look up
+        session_data = self.client.read_bin(storage_key, deadline=self.deadline)
+        if not isinstance(session_data, dict) or session_data.get('session_id') != session_id:
+            return None  # A bin ID from the URL that belongs to another session
+        if _expires_at_epoch(session_data) <= time.time():
+            return None
+        return session_data
+
+    def delete(self, session_id: str) -> None:
+        pass  # Bins are left to JSONBin's own retention
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SQLiteSessionStore:
+    """Return the process-wide local session store, creating it on first use."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SQLiteSessionStore()
+        return _session_store
@@ -0,0 +1,115 @@
+"""Cold-start timing for the Streamlit app, checked against a budget.
+
+In the app, record_form_render() is given how long each script run took to reach the
+intake form; the first run in a process is the cold start (module imports included) and is
+reported once on stdout. Run as a script it gives the import-time breakdown of the app's
+top-level imports in a fresh interpreter, and lists heavy dependencies that were loaded
+eagerly:
+
+    python startup.py
+    python startup.py --budget-ms 800 --top 15
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import threading
+from typing import Dict, Any, List, Tuple
+
+# Cold-start budget - override with environment variables
+STARTUP_BUDGET_MS = float(os.getenv("FITKIT_STARTUP_BUDGET_MS", "1500"))
+
+# Dependencies that should only be imported when first used (the intake form needs none of them)
+LAZY_DEPENDENCIES = ('openai', 'httpx', 'requests', 'numpy', 'zstandard')
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+_lock = threading.Lock()
+_renders = {'cold_start_ms': None, 'runs': 0, 'last_ms': None, 'max_warm_ms': 0.0}
+
+
+def record_form_render(seconds: float) -> None:
+    """Record the time from script start to the rendered intake form for one run."""
+    elapsed_ms = round(seconds * 1000, 1)
+    with _lock:
+        _renders['runs'] += 1
+        _renders['last_ms'] = elapsed_ms
+        if _renders['cold_start_ms'] is None:
+            _renders['cold_start_ms'] = elapsed_ms
+            cold = True
+        else:
+            _renders['max_warm_ms'] = max(_renders['max_warm_ms'], elapsed_ms)
+            cold = False
+    if cold:
+        status = "OVER BUDGET" if elapsed_ms > STARTUP_BUDGET_MS else "ok"
+        print(f"FitKit cold start: intake form rendered {elapsed_ms:.0f} ms after script start "
+              f"(budget {STARTUP_BUDGET_MS:.0f} ms, {status})", flush=True)
+
+
+def startup_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_renders)
+    stats['budget_ms'] = STARTUP_BUDGET_MS
+    stats['lazy_dependencies_loaded'] = [name for name in LAZY_DEPENDENCIES if name in sys.modules]
+    return stats
+
+
+def app_imports(script: str = APP_SCRIPT) -> List[str]:
+    """Top-level modules imported by the app script, in order."""
+    with open(script, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), script)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def measure_imports(modules: List[str]) -> Tuple[List[Tuple[str, float]], float, List[str]]:
+    """Import modules in a fresh interpreter with -X importtime.
+
+    Returns ([(module, cumulative ms)] for the modules themselves, total ms, lazy
+    dependencies that ended up imported).
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    code += f"; import sys; print(','.join(m for m in {LAZY_DEPENDENCIES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(APP_SCRIPT), check=True)
+    wanted = set(modules)
+    timings = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue  # Header line
+        raw_name = line.rsplit("|", 1)[1]
+        if raw_name.startswith(" ") and not raw_name.startswith("  "):
+            total_us += int(cumulative)  # Top level: nesting is shown by extra indentation
+            if name in wanted:
+                timings[name] = int(cumulative) / 1000
+    eager = [name for name in result.stdout.strip().split(",") if name]
+    return sorted(timings.items(), key=lambda item: item[1], reverse=True), total_us / 1000, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown of the Streamlit app")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="Fail if imports take longer")
+    parser.add_argument("--top", type=int, default=20, help="How many modules to list")
+    args = parser.parse_args()
+
+    timings, total_ms, eager = measure_imports(app_imports())
+    print(f"App imports: {total_ms:.0f} ms in a fresh interpreter (budget {args.budget_ms:.0f} ms)")
+    for module, cumulative_ms in timings[:args.top]:
+        print(f"  {cumulative_ms:8.1f} ms  {module}")
+    if eager:
+        print(f"Imported eagerly (should load on first use): {', '.join(eager)}")
+    sys.exit(1 if total_ms > args.budget_ms or eager else 0)
+
+
+if __name__ == "__main__":
+    main()
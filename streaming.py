@@ -0,0 +1,256 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Any
+
+# Frame budget for live rendering - render at most this often...
+DEFAULT_MAX_RENDERS_PER_SECOND = 4
+# ...unless this many new characters have piled up since the last render
+DEFAULT_MIN_CHARS_PER_RENDER = 400
+# Force a commit of the live tail once it grows past this, even without a paragraph break
+MAX_TAIL_CHARS = 1500
+
+CURSOR = "▌"
+
+
+class StreamRenderer:
+    """Batch streamed deltas and render them incrementally into a Streamlit placeholder.
+
+    Finished paragraphs are committed once into their own element and never re-sent;
+    only the short unfinished tail is re-rendered on each frame, so the bytes sent over
+    the websocket grow linearly with the plan instead of quadratically.
+    """
+
+    def __init__(self, placeholder, header: str = "**🤖 Your plan is being generated live:**",
+                 max_renders_per_second: float = DEFAULT_MAX_RENDERS_PER_SECOND,
+                 min_chars_per_render: int = DEFAULT_MIN_CHARS_PER_RENDER, height: int = 400):
+        self.min_interval = 1.0 / max_renders_per_second if max_renders_per_second else 0.0
+        self.min_chars_per_render = min_chars_per_render
+        self._box = placeholder.container(height=height, border=True)
+        self._tail_slot = None
+        self._tail = ""      # Rendered text not yet committed
+        self._pending = ""   # Received text not yet rendered
+        self._last_render = 0.0
+        self._stats = {
+            'render_calls': 0,
+            'bytes_sent': 0,
+            'chars_received': 0,
+            'committed_blocks': 0
+        }
+        self._send(self._box, header)
+        self._tail_slot = self._box.empty()
+
+    def feed(self, delta: str) -> None:
+        """Queue a streamed delta and render if the frame budget allows it."""
+        if not delta:
+            return
+        self._pending += delta
+        self._stats['chars_received'] += len(delta)
+        elapsed = time.monotonic() - self._last_render
+        if elapsed >= self.min_interval or len(self._pending) >= self.min_chars_per_render:
+            self.render()
+
+    def render(self, final: bool = False) -> None:
+        """Flush pending text: commit finished paragraphs and redraw the live tail."""
+        text = self._tail + self._pending
+        self._pending = ""
+
+        # Commit everything up to the last paragraph break (or line break if the tail is huge)
+        split_at = text.rfind("\n\n")
+        if split_at == -1 and len(text) > MAX_TAIL_CHARS:
+            split_at = text.rfind("\n")
+        if final:
+            split_at = len(text)
+
+        if split_at > 0:
+            committed, text = text[:split_at], text[split_at:].lstrip("\n")
+            self._send(self._tail_slot, committed)  # The tail slot becomes the frozen block
+            self._stats['committed_blocks'] += 1
+            self._tail_slot = self._box.empty()
+        elif final:
+            self._send(self._tail_slot, "")  # Nothing left to commit - clear the last frame's cursor
+
+        self._tail = text
+        if not final:
+            self._send(self._tail_slot, text + CURSOR)
+        self._last_render = time.monotonic()
+
+    def finish(self) -> Dict[str, Any]:
+        """Render whatever is left without the cursor and return render stats."""
+        self.render(final=True)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return render call and byte counters for this stream."""
+        stats = dict(self._stats)
+        chars = stats['chars_received']
+        stats['bytes_per_char'] = round(stats['bytes_sent'] / chars, 2) if chars else 0.0
+        return stats
+
+    def _send(self, slot, text: str) -> None:
+        slot.markdown(text)
+        self._stats['render_calls'] += 1
+        self._stats['bytes_sent'] += len(text.encode("utf-8"))
+
+
+class ChunkBuffer:
+    """Accumulate streamed chunks in a list and join them only when the text is needed."""
+
+    def __init__(self):
+        self._chunks = []
+        self._length = 0
+        self._joined = None
+
+    def append(self, chunk: str) -> None:
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        self._joined = None
+
+    def text(self) -> str:
+        """Return the accumulated text, joining (and caching the result) at most once per change."""
+        if self._joined is None:
+            self._joined = "".join(self._chunks)
+            self._chunks = [self._joined] if self._joined else []
+        return self._joined
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class StreamStats:
+    """Per-request timing stats for one streamed completion."""
+
+    def __init__(self):
+        self.started_at = None
+        self.first_token_at = None
+        self.last_chunk_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.chars = 0
+        self.completion_tokens = None  # Exact count from the API usage block, when reported
+        self.cached_prompt_tokens = None  # Prompt tokens served from the provider's prefix cache
+        self.gaps = []                 # Seconds between consecutive content chunks
+        self.render = {}               # Render counters from StreamRenderer, if used
+        self.cached = False
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+
+    def record_chunk(self, text: str) -> None:
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        else:
+            self.gaps.append(now - self.last_chunk_at)
+        self.last_chunk_at = now
+        self.chunks += 1
+        self.chars += len(text)
+
+    def finish(self, completion_tokens: int = None, cached_prompt_tokens: int = None) -> None:
+        self.finished_at = time.perf_counter()
+        if completion_tokens is not None:
+            self.completion_tokens = completion_tokens
+        if cached_prompt_tokens is not None:
+            self.cached_prompt_tokens = cached_prompt_tokens
+
+    @property
+    def tokens(self) -> int:
+        # Each streamed delta is roughly one token when the API doesn't report usage
+        return self.completion_tokens if self.completion_tokens is not None else self.chunks
+
+    @property
+    def ttft(self) -> float:
+        if self.started_at is None or self.first_token_at is None:
+            return 0.0
+        return self.first_token_at - self.started_at
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.first_token_at is None or self.last_chunk_at is None:
+            return 0.0
+        generation_time = self.last_chunk_at - self.first_token_at
+        return self.tokens / generation_time if generation_time > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return a flat, log-friendly summary of the stream."""
+        gaps = sorted(self.gaps)
+        return {
+            'cached': self.cached,
+            'ttft_s': round(self.ttft, 3),
+            'duration_s': round(self.duration, 3),
+            'tokens': self.tokens,
+            'chunks': self.chunks,
+            'chars': self.chars,
+            'cached_prompt_tokens': self.cached_prompt_tokens,
+            'tokens_per_s': round(self.tokens_per_second, 1),
+            'gap_p50_ms': round(percentile(gaps, 50) * 1000, 1),
+            'gap_p90_ms': round(percentile(gaps, 90) * 1000, 1),
+            'gap_p99_ms': round(percentile(gaps, 99) * 1000, 1),
+            'gap_max_ms': round(gaps[-1] * 1000, 1) if gaps else 0.0,
+            **{f"render_{k}": v for k, v in self.render.items()}
+        }
+
+
+class _StreamFailure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STREAM_DONE = object()
+
+
+async def merge_streams_in_order(sources, on_delta) -> None:
+    """Run blocking delta streams concurrently and deliver their text in document order.
+
+    Each source is a zero-argument callable returning an iterator of text deltas; it is
+    consumed in a worker thread. on_delta(index, text) is called on the event loop thread,
+    live for the earliest unfinished source and buffered for the ones after it, so later
+    sections appear the moment the sections before them finish. If any source fails, the
+    others are told to stop and the error is re-raised.
+    """
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue() for _ in sources]
+    cancelled = threading.Event()
+
+    def _pump(index, source):
+        queue = queues[index]
+        try:
+            for delta in source():
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, delta)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, _StreamFailure(e))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_DONE)
+
+    workers = [asyncio.create_task(asyncio.to_thread(_pump, i, source)) for i, source in enumerate(sources)]
+    try:
+        for index, queue in enumerate(queues):
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, _StreamFailure):
+                    raise item.error
+                on_delta(index, item)
+    finally:
+        cancelled.set()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,273 @@
+"""Adaptive output-token budgets: per-section allowances derived from the intake.
+
+Each plan section's expected length is a base cost plus a cost per unit of the intake
+features that drive it (training days, cardio and ab finishers, extra training styles).
+A request's max_completion_tokens is the sum of its sections' allowances (expected length
+times BUDGET_HEADROOM) plus the model's hidden reasoning, capped at MAX_COMPLETION_TOKENS.
+
+Every completed request is logged to FITKIT_TOKEN_USAGE_LOG with the model's estimate and
+the tokens each section actually used. Tune the estimator from that log:
+
+    python token_budget.py                                    # per-section fit report
+    python token_budget.py --write .fitkit/budget_calibration.json
+    FITKIT_BUDGET_CALIBRATION=.fitkit/budget_calibration.json streamlit run streamlit_app.py
+"""
+import argparse
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from plan_schema import parse_plan
+from streaming import percentile
+
+# Token budget settings - override with environment variables
+ADAPTIVE_BUDGETS = os.getenv("FITKIT_ADAPTIVE_BUDGETS", "1") == "1"  # 0 restores the fixed limits
+FIXED_MAX_TOKENS = 10000  # The single-request limit used before adaptive budgets - budgets never exceed it
+MAX_COMPLETION_TOKENS = min(FIXED_MAX_TOKENS, int(os.getenv("FITKIT_MAX_COMPLETION_TOKENS", str(FIXED_MAX_TOKENS))))
+BUDGET_HEADROOM = float(os.getenv("FITKIT_BUDGET_HEADROOM", "1.25"))  # Allowance over the expected length
+REASONING_TOKENS = int(os.getenv("FITKIT_REASONING_TOKENS", "1500"))  # o3-mini counts its reasoning in the budget
+CALIBRATION_PATH = os.getenv("FITKIT_BUDGET_CALIBRATION")  # Written by `python token_budget.py --write`
+USAGE_LOG_PATH = os.getenv("FITKIT_TOKEN_USAGE_LOG", os.path.join(".fitkit", "token_usage.jsonl"))  # Empty disables
+
+WORDS_PER_TOKEN = 0.75
+
+# Expected visible tokens per section (keys as in prompts.PLAN_SECTIONS): base + cost per unit of each feature.
+# These are the uncalibrated starting point; the per-section scales fitted from the usage log
+# (`python token_budget.py --write`, loaded from FITKIT_BUDGET_CALIBRATION) set the real sizes
+SECTION_TOKEN_MODEL = {
+    'greeting': {'base': 200},
+    'workout': {'base': 200, 'training_days': 280, 'rest_days': 30, 'cardio_days': 50, 'abs_days': 60,
+                'extra_style_days': 20},
+    'nutrition': {'base': 2100},
+    'progression': {'base': 500, 'training_days': 40, 'extra_styles': 60},
+    'lifestyle': {'base': 600},
+    'psychology': {'base': 600},
+    'safety': {'base': 300, 'limitations': 100},
+    # Not a plan section: the short personal pass written above a reused skeleton (plan_buckets.py)
+    'personalization': {'base': 400, 'limitations': 100}
+}
+PLAN_SECTION_KEYS = ('greeting', 'workout', 'nutrition', 'progression', 'lifestyle', 'psychology', 'safety')
+SKELETON_SECTION_KEYS = tuple(key for key in PLAN_SECTION_KEYS if key != 'greeting')
+PERSONALIZATION_SECTION_KEYS = ('personalization',)
+
+
+def load_calibration(path: Optional[str]) -> Tuple[Dict[str, float], int]:
+    """Per-section scale factors and the reasoning allowance from a calibration file (defaults if unset)."""
+    if not path or not os.path.exists(path):
+        return {}, REASONING_TOKENS
+    with open(path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    return calibration.get('scales', {}), int(calibration.get('reasoning_tokens', REASONING_TOKENS))
+
+
+SECTION_SCALES, REASONING_ALLOWANCE = load_calibration(CALIBRATION_PATH)
+
+
+def intake_features(user_data: Dict[str, Any]) -> Dict[str, int]:
+    """The intake features section lengths depend on; works on a user_data dict or a profile bucket."""
+    days = int(user_data['days'])
+    extra_styles = max(0, len(user_data.get('style') or []) - 1)
+    return {
+        'base': 1,
+        'training_days': days,
+        'rest_days': max(0, 7 - days),
+        'cardio_days': days if user_data.get('add_cardio') == "Yes" else 0,
+        'abs_days': days if user_data.get('add_abs') == "Yes" else 0,
+        'extra_styles': extra_styles,
+        'extra_style_days': days * extra_styles,
+        'limitations': sum(1 for field in ('issues', 'medical') if user_data.get(field))
+    }
+
+
+def model_section_tokens(features: Dict[str, int], sections: Iterable[str] = PLAN_SECTION_KEYS) -> Dict[str, int]:
+    """Uncalibrated expected tokens per section."""
+    return {key: sum(cost * features.get(feature, 0) for feature, cost in SECTION_TOKEN_MODEL[key].items())
+            for key in sections}
+
+
+def estimate_section_tokens(user_data: Dict[str, Any], sections: Iterable[str] = PLAN_SECTION_KEYS) -> Dict[str, int]:
+    """Expected tokens per section for this intake, with the calibration applied."""
+    raw = model_section_tokens(intake_features(user_data), sections)
+    return {key: int(round(tokens * SECTION_SCALES.get(key, 1.0))) for key, tokens in raw.items()}
+
+
+def request_budget(user_data: Dict[str, Any], sections: Iterable[str] = PLAN_SECTION_KEYS) -> int:
+    """max_completion_tokens for one request that writes these sections."""
+    if not ADAPTIVE_BUDGETS:
+        return FIXED_MAX_TOKENS
+    allowance = sum(math.ceil(tokens * BUDGET_HEADROOM) for tokens in estimate_section_tokens(user_data, sections).values())
+    return min(MAX_COMPLETION_TOKENS, allowance + REASONING_ALLOWANCE)
+
+
+def section_word_targets(user_data: Dict[str, Any], sections: Iterable[str] = PLAN_SECTION_KEYS) -> Dict[str, int]:
+    """Expected length per section in words (what the prompt asks for - models don't count tokens)."""
+    return {key: max(50, int(round(tokens * WORDS_PER_TOKEN, -1)))
+            for key, tokens in estimate_section_tokens(user_data, sections).items()}
+
+
+def attribute_section_tokens(text: str, visible_tokens: int, sections: Tuple[str, ...]) -> Dict[str, int]:
+    """Split a request's visible completion tokens across the sections it wrote, by share of characters."""
+    if len(sections) == 1:
+        return {sections[0]: visible_tokens}
+    chars = {}
+    for section in parse_plan(text).sections:
+        if section.key in sections:
+            chars[section.key] = chars.get(section.key, 0) + len(section.text)
+    total_chars = sum(chars.values())
+    if not total_chars:
+        return {}
+    return {key: int(round(visible_tokens * count / total_chars)) for key, count in chars.items()}
+
+
+class TokenUsageLog:
+    """Actual vs estimated tokens per section for every completed request, appended to a JSONL log.
+
+    Each line is one API request: its mode, intake features, budget, completion and reasoning
+    tokens, whether it hit the budget (finish_reason 'length'), and per section the model's
+    uncalibrated estimate and the tokens actually used.
+    """
+
+    def __init__(self, path: Optional[str] = USAGE_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sections = {}  # key -> {'requests', 'actual', 'estimate'}
+        self._stats = {'requests': 0, 'truncated': 0, 'budget_tokens': 0, 'completion_tokens': 0}
+
+    def record(self, mode: str, user_data: Dict[str, Any], sections: Tuple[str, ...], budget: int, text: str,
+               completion_tokens: int, reasoning_tokens: int = 0, truncated: bool = False) -> Dict[str, Any]:
+        features = intake_features(user_data)
+        model = model_section_tokens(features, sections)
+        estimates = estimate_section_tokens(user_data, sections)
+        actual = attribute_section_tokens(text, max(0, completion_tokens - reasoning_tokens), sections)
+        entry = {
+            'at': datetime.now().isoformat(timespec="seconds"),
+            'mode': mode,
+            'features': features,
+            'budget': budget,
+            'completion_tokens': completion_tokens,
+            'reasoning_tokens': reasoning_tokens,
+            'truncated': truncated,
+            'sections': {key: {'model': model[key], 'actual': actual.get(key, 0)} for key in sections}
+        }
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['truncated'] += int(truncated)
+            self._stats['budget_tokens'] += budget
+            self._stats['completion_tokens'] += completion_tokens
+            for key in sections:
+                totals = self._sections.setdefault(key, {'requests': 0, 'actual': 0, 'estimate': 0})
+                totals['requests'] += 1
+                totals['actual'] += actual.get(key, 0)
+                totals['estimate'] += estimates[key]
+            if self.path:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        """Budget use across requests and mean actual vs estimated tokens per section."""
+        with self._lock:
+            stats = dict(self._stats)
+            sections = {key: dict(totals) for key, totals in self._sections.items()}
+        stats['budget_used'] = round(stats['completion_tokens'] / stats['budget_tokens'], 3) if stats['budget_tokens'] else 0.0
+        stats['sections'] = {
+            key: {'requests': totals['requests'],
+                  'mean_actual': round(totals['actual'] / totals['requests']),
+                  'mean_estimate': round(totals['estimate'] / totals['requests'])}
+            for key, totals in sections.items()
+        }
+        return stats
+
+
+_usage_log = None
+_usage_log_lock = threading.Lock()
+
+
+def get_token_usage_log() -> TokenUsageLog:
+    """Return the process-wide token usage log, creating it on first use."""
+    global _usage_log
+    with _usage_log_lock:
+        if _usage_log is None:
+            _usage_log = TokenUsageLog()
+        return _usage_log
+
+
+def fit_calibration(entries: List[Dict[str, Any]], quantile: float = 90) -> Dict[str, Any]:
+    """Fit per-section scales so `quantile`% of sections fit within their (scaled) estimate.
+
+    Requests cut off at their budget are left out of the fit - their actual length is only
+    a lower bound - and counted as truncated. The reasoning allowance is the same percentile
+    of reasoning tokens per request.
+    """
+    ratios = {}
+    truncated = {}
+    reasoning = []
+    for entry in entries:
+        reasoning.append(entry.get('reasoning_tokens') or 0)
+        for key, section in entry['sections'].items():
+            if entry.get('truncated'):
+                truncated[key] = truncated.get(key, 0) + 1
+            elif section['model'] and section['actual']:
+                ratios.setdefault(key, []).append(section['actual'] / section['model'])
+    report = {}
+    for key in SECTION_TOKEN_MODEL:
+        values = sorted(ratios.get(key, []))
+        report[key] = {
+            'samples': len(values),
+            'truncated': truncated.get(key, 0),
+            'ratio_p50': round(percentile(values, 50), 3),
+            'scale': round(percentile(values, quantile), 3) if values else SECTION_SCALES.get(key, 1.0)
+        }
+    return {
+        'sections': report,
+        'scales': {key: section['scale'] for key, section in report.items()},
+        'reasoning_tokens': int(percentile(sorted(reasoning), quantile)) if any(reasoning) else REASONING_ALLOWANCE
+    }
+
+
+def read_usage_log(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # Torn last line
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit per-section token budget scales from the usage log")
+    parser.add_argument("--log", default=USAGE_LOG_PATH, help="Token usage log (default: FITKIT_TOKEN_USAGE_LOG)")
+    parser.add_argument("--quantile", type=float, default=90, help="Percentile of sections the estimate should cover")
+    parser.add_argument("--write", metavar="PATH", help="Write the calibration here (use as FITKIT_BUDGET_CALIBRATION)")
+    args = parser.parse_args()
+
+    if not args.log or not os.path.exists(args.log):
+        parser.error(f"no usage log at {args.log!r}")
+    entries = read_usage_log(args.log)
+    calibration = fit_calibration(entries, args.quantile)
+    truncated = sum(1 for entry in entries if entry.get('truncated'))
+    print(f"{len(entries)} requests, {truncated} cut off at their budget; "
+          f"reasoning allowance p{args.quantile:g}: {calibration['reasoning_tokens']} tokens")
+    print(f"  {'section':12s} {'samples':>8s} {'truncated':>10s} {'actual/model p50':>17s} {'scale':>7s}")
+    for key, section in calibration['sections'].items():
+        print(f"  {key:12s} {section['samples']:8d} {section['truncated']:10d} {section['ratio_p50']:17.2f} "
+              f"{section['scale']:7.2f}")
+    if args.write:
+        directory = os.path.dirname(args.write)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.write, "w", encoding="utf-8") as f:
+            json.dump({'scales': calibration['scales'], 'reasoning_tokens': calibration['reasoning_tokens']}, f, indent=2)
+        print(f"Calibration written to {args.write}")
+
+
+if __name__ == "__main__":
+    main()